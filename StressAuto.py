@@ -5,11 +5,30 @@ import datetime
 import logging
 import os
 import signal
-import progress_bar
+import math
+import multiprocessing
+from proc_stat import ProcStat, ProcessCpu
+from controller import PidController, ConvergenceStats, ControlLoop, Ticker, \
+    monotonic
+from duty_cycle import DutyCyclePool
+from cgroup import CgroupLimit, CgroupCpu
+from affinity import parse_cpu_list, set_affinity
+from profiles import clamp_load, parse_profile, PERCENT, TrackingRecord
+from trace_replay import TraceProfile
+from memory import MemoryStress, MemInfo, MEGABYTE
+from disk import DiskStress
+from network import NetworkStress
+from metrics import MetricsRecorder
+from exporter import MetricsServer
+from phase_trace import PhaseTracer, NULL_PHASE
+from supervisor import Supervisor
+from latency import LatencyProbe
+from telemetry import Telemetry
+from dashboard import Dashboard
 import argparse
 import sys
 
-processes = []
+FORKED_PATTERN = re.compile(r'\[[0-9]*\]?.forked')
 
 
 def remove_multiple_strings(words, text):
@@ -24,7 +43,7 @@ def remove_multiple_strings(words, text):
 
     # use these three lines to do the replacement
     replace_escaped = dict((re.escape(k), v)
-                           for k, v in to_replace.iteritems())
+                           for k, v in to_replace.items())
     pattern = re.compile("|".join(replace_escaped.keys()))
     for sentence in text:
         final_text.append(pattern.sub(
@@ -47,8 +66,10 @@ class DebugLogPrint(object):
         A class that either prints/logs/both/supress messages
         Replaces print and log calls
     """
-    __choices__ = None
+    __choices__ = ()
     __log_path__ = '.'
+    # Dashboard drawn on the terminal, printed messages go above it
+    dashboard = None
 
     def __init__(self, print_choice='', log_path=__log_path__):
         """
@@ -144,77 +165,24 @@ class DebugLogPrint(object):
         """
         if level is 'DEBUG' and 'debug' in self.choices:
             self.dlog(message, level)
-            self.dprint(message, level)
+            self.console_print(message, level)
         elif level is not 'DEBUG':
-            self.dprint(message, level) if 'print' in self.choices else None
+            self.console_print(message, level) \
+                if 'print' in self.choices else None
             self.dlog(message, level) if 'log' in self.choices else None
 
-
-class TopGrep():
-    """
-        Runs a top and greps the result
-        We call two lines top, because -n 1 always returns a cached result
-    """
-    top_configuration = ['top', '-n', '2' '-b']
-    grep = ['grep']
-
-    def __init__(self, process_name, show_lines_before=None, exclude=None):
-        """
-        Filter by process name
-        Select number of lines to show before grep
-        Exclude specific string
-        :param process_name: str
-        :param show_lines_before: int
-        :param exclude: str
-        """
-        self.grep.extend(('-B', show_lines_before)) \
-            if show_lines_before else None
-
-        self.grep.extend(('-v', '\'', exclude, '\'')) if exclude else None
-
-        if process_name not in self.grep:
-            self.grep.append(process_name)
-
-    @property
-    def get_configuration(self):
-        """
-        Return the flag configuration of top and grep as tuple
-        :return: tuple
-        """
-        return self.top_configuration, self.grep
-
-    def run(self):
-        """
-        Opens a subprocess based on the configuration set up
-        :return: subprocess
-        """
-        topconf, grepconf = self.get_configuration
-
-        top = subprocess.Popen(topconf, stdout=subprocess.PIPE)
-        topgrep = subprocess.Popen(grepconf, stdin=top.stdout,
-                                   stdout=subprocess.PIPE)
-
-        return topgrep
-
-    @staticmethod
-    def get_clear_percent(top_strip):
+    def console_print(self, message, level):
         """
-        Strips unwanted chars from string and returns the percent value
-        :param top_strip: str
-        :return: str
-        """
-        clear_percent = (''.join(x for x in top_strip
-                                 if (x.isdigit() or x == '.')))
-        return clear_percent
-
-    def get_cpuload(self, top_grep_cpu_proc):
-        """
-        cpu percent load
-        :param top_grep_cpu_proc: subprocess
-        :return: str
+        Print, or queue above the dashboard while one is drawn, so the
+        caller never waits on the terminal
+        :param message: str
+        :param level: str
         """
-        return self.get_clear_percent(
-            top_strip=top_grep_cpu_proc.stdout.readlines()[1].split()[1])
+        if self.dashboard and self.dashboard.drawing:
+            self.dashboard.message('[{0}] {1}'.format(level, message)
+                                   if level != 'INFO' else message)
+        else:
+            self.dprint(message, level)
 
 
 class SubProc():
@@ -224,9 +192,7 @@ class SubProc():
     process_name : process name
     switches : dict { switch_name : (enabled, switch_flag, value) }
     """
-    process_configuration = {'location': '',
-                             'process_name': '',
-                             'switches': {}}
+    process_configuration = None
     __process__ = None
 
     def __init__(self, process_name, location=None, switches=None):
@@ -237,13 +203,16 @@ class SubProc():
         :param location: str
         :param switches: dict
         """
-        self.process_configuration['process_name'] = process_name
+        # every process gets its own copy, switches are set per run
+        self.process_configuration = {
+            'location': '', 'process_name': process_name,
+            'switches': dict((name, list(switch)) for name, switch
+                             in (switches or {}).items())}
         if location:
             try:
                 self.location = location
             except ValueError:
                 exit(1)
-        self.process_configuration['switches'] = switches
 
     @property
     def process_name(self):
@@ -390,40 +359,257 @@ class CpuLimit(SubProc):
         SubProc.__set_switch_value__(self, 'limit', limit)
 
     def get_cpu_limit_configuration(self):
-        return self.switches
+        return self.process_configuration['switches']
+
+
+class StressUnit(object):
+    """
+        A single worker stress process with its own cpulimit
+        The pid controller adds, removes and retunes these one by one
+    """
+
+    def __init__(self, stress, pid):
+        """
+        :param stress: Stress
+        :param pid: str pid of the forked worker
+        """
+        self.stress = stress
+        self.pid = pid
+        self.cpulimit = None
+        self.limit = 100
+        self.core = None
+        self.alive = True
+
+    def exited(self, *_):
+        """
+        Called by the supervisor once the worker is gone
+        """
+        self.alive = False
+
+    def pin(self, core):
+        """
+        :param core: int
+        """
+        set_affinity(int(self.pid), (core,))
+        self.core = core
+
+    def park(self):
+        """
+        Stop the worker without its cpulimit, it keeps its process but
+        takes no cpu until resumed
+        """
+        self.release_limit()
+        os.kill(int(self.pid), signal.SIGSTOP)
+
+    def resume(self):
+        os.kill(int(self.pid), signal.SIGCONT)
+
+    def release_limit(self):
+        """
+        Kill the cpulimit of the worker, if any
+        """
+        if self.cpulimit:
+            self.cpulimit.kill()
+            self.cpulimit = None
+        self.limit = 100
+
+    def kill(self):
+        """
+        Kill the cpulimit, the forked worker and its stress parent
+        """
+        self.release_limit()
+        try:
+            os.kill(int(self.pid), signal.SIGKILL)
+        except OSError:
+            pass
+        self.stress.kill()
 
 
 class LimitedStress(object):
-    __subprocess_stack__ = []
     __tool_location__ = dict
     __limit__ = 1
     # __cpulimit_limit__ = 1
     __timeout__ = None
+    # seconds between status messages while holding
+    __hold_report__ = 10.0
+    # seconds the load is left to settle before it is checked
+    __stabilize__ = 1.0
     __old_load__ = __new_load__ = None
     stress_types = None
+    # the stress workers only ever load the cpu, memory, disk and network
+    # stress have engines of their own
+    unit_types = ('cpu',)
     # workers = 1
-    topgrep = None
+    sampler = None
     dprint = None
 
+    modes = ('velocity', 'pid')
+    load_targets = ('total', 'added')
+    measures = ('host', 'cgroup', 'auto')
+    engines = ('stress', 'native')
+    limiters = ('cpulimit', 'cgroup')
+    # tools and time the load is generated with, replaced by the benchmark
+    stress_tool = Stress
+    cpulimit_tool = CpuLimit
+    clock = staticmethod(monotonic)
+    sleep = staticmethod(time.sleep)
+
     def __init__(self, stress_types=('cpu',), limit=1, timeout=None,
-                 tool_location=dict, verbosity=None):
+                 tool_location=dict, verbosity=None, sample_interval=0.1,
+                 mode='velocity', controller=None, control_period=0.5,
+                 tolerance=1.0, engine='stress', limiter='cpulimit',
+                 cpuset=None, core_limits=None, profile=None,
+                 tracking_output=None, per_core_profile=False,
+                 resource=None, targets=None, resources=None, metrics=None,
+                 metrics_output=None, metrics_format='csv', exporter=None,
+                 tracer=None, trace_output=None, trace_format='chrome',
+                 warm_workers=0, hold=False, load_target='total',
+                 measure='host', pid_timeout=10.0, latency_probe=None,
+                 telemetry=None, telemetry_output=None, dashboard=None,
+                 converge_timeout=60.0):
+        if mode not in self.modes:
+            raise NotImplementedError('This mode is not supported!')
+        if load_target not in self.load_targets:
+            raise NotImplementedError('This load target is not supported!')
+        if measure not in self.measures:
+            raise NotImplementedError('This measure is not supported!')
+        if engine not in self.engines:
+            raise NotImplementedError('This engine is not supported!')
+        if limiter not in self.limiters:
+            raise NotImplementedError('This limiter is not supported!')
         self.__workers__ = 1
         self.__tool_location__ = tool_location
+        # tool runs and the pids they forked
+        self.__subprocess_stack__ = []
+        self.__forked__ = []
+        # drains the output of the tools and notices dead workers
+        self.supervisor = Supervisor()
+        self.pid_timeout = pid_timeout
         self.__limit__ = self.__cpulimit_limit__ = limit
         self.__timeout__ = timeout
-        self.topgrep = TopGrep('Cpu')
         self.stress_types = stress_types
         self.dprint = DebugLogPrint(print_choice=verbosity)
-
-    @staticmethod
-    def get_stack():
-        global processes
-        return processes
+        # cgroup usage has no per core split
+        self.sampler = self.setup_sampler(
+            'host' if core_limits or per_core_profile else measure,
+            sample_interval)
+        # cpus the controller output is a percent of
+        self.capacity = self.sampler.cores \
+            if isinstance(self.sampler, CgroupCpu) \
+            else multiprocessing.cpu_count()
+        self.mode = mode
+        self.controller = controller if controller else PidController()
+        self.control_period = control_period
+        self.tolerance = tolerance
+        self.converge_timeout = converge_timeout
+        self.__units__ = []
+        self.__demand__ = 0
+        # stopped stress workers kept ready, so scaling up does not wait
+        # on starting stress
+        self.warm_workers = warm_workers
+        self.__warm__ = []
+        # keep controlling for the timeout once the target is reached
+        self.hold = hold
+        # the limit is either the total host load or the load added by
+        # the processes of StressAuto, sampled with every load sample
+        self.load_target = load_target
+        self.own_cpu = ProcessCpu(self.own_pids)
+        self.own_cpu.cpus = self.capacity
+        # cpu of the resource workers, fed forward to the cpu loop, in
+        # the same percent as the setpoint
+        self.interference = ProcessCpu(self.resource_pids)
+        self.interference.cpus = self.capacity
+        self.__interfering__ = 0.0
+        self.__generated__ = self.__foreign__ = self.__targeted__ = 0.0
+        self.engine = engine
+        self.core_limits = core_limits if core_limits else {}
+        self.profile = profile
+        self.tracking_output = tracking_output
+        self.per_core_profile = per_core_profile
+        # MetricsRecorder exported to metrics_output on exit and on SIGUSR1
+        self.metrics = metrics
+        self.metrics_output = metrics_output
+        self.metrics_format = metrics_format
+        # MetricsServer serving the state of the loop while running
+        self.exporter = exporter
+        self.__iteration_start__ = None
+        # PhaseTracer timing the loop phases, summarised on exit
+        self.tracer = tracer
+        self.trace_output = trace_output
+        self.trace_format = trace_format
+        # LatencyProbe measuring wakeup latency on every plateau
+        self.latency_probe = latency_probe
+        # Telemetry of frequencies, temperatures and pressure stalls,
+        # sampled with every recorded sample
+        self.telemetry = telemetry
+        self.telemetry_output = telemetry_output
+        if telemetry is not None:
+            telemetry.cpus = self.capacity
+        # Dashboard redrawn from every recorded sample
+        self.dashboard = dashboard
+        self.dprint.dashboard = dashboard
+        # multi resource runs: {stress type: limit}, {stress type: resource}
+        self.targets = targets if targets else {}
+        self.resources = resources if resources else {}
+        # memory, disk or network stress held by its own pid loop
+        self.resource = resource if resource else \
+            MemoryStress() if 'vm' in stress_types and not self.targets \
+            else None
+        # cores held at 0 stay idle, without a worker waking on them
+        cores = range(profile.cores) if per_core_profile \
+            else sorted(x for x, limit in self.core_limits.items()
+                        if limit > 0)
+        self.pool = DutyCyclePool(cores=cores or None) \
+            if engine == 'native' else None
+        self.cgroup = self.setup_cgroup(cpuset) \
+            if limiter == 'cgroup' and not self.pool else None
+
+    def setup_cgroup(self, cpuset=None):
+        """
+        One cgroup limits all the workers, fall back to one cpulimit
+        per worker when cgroups are not writable
+        :param cpuset: str
+        :return: CgroupLimit or None
+        """
+        cgroup = CgroupLimit(cpuset=cpuset)
+        try:
+            cgroup.create()
+        except OSError as exc:
+            self.dprint.debuglogprint('{0}\nFalling back to cpulimit'
+                                      .format(exc), level='WARNING')
+            return None
+        return cgroup
+
+    def setup_sampler(self, measure, interval):
+        """
+        The host load from /proc/stat, or the load of the cgroup of
+        StressAuto as a percent of its quota, when it has one (auto) or
+        when asked for
+        :param measure: str host, cgroup or auto
+        :param interval: float
+        :return: ProcStat or CgroupCpu
+        """
+        if measure != 'host':
+            try:
+                cgroup_cpu = CgroupCpu.detect(interval=interval)
+            except (IOError, OSError, ValueError, KeyError):
+                cgroup_cpu = None
+            if cgroup_cpu and (cgroup_cpu.quota or measure == 'cgroup'):
+                self.dprint.debuglogprint(
+                    'Measuring the load of the cgroup, in percent of '
+                    '{0:.2f} cpus'.format(cgroup_cpu.cores))
+                return cgroup_cpu
+            if measure == 'cgroup':
+                self.dprint.debuglogprint('No cgroup found\nMeasuring the '
+                                          'host load', level='WARNING')
+        return ProcStat(interval=interval)
+
+    def get_stack(self):
+        return self.__forked__
 
     def add_pid_to_stack(self, pid):
         if pid not in self.get_stack():
-            global processes
-            processes.append(pid)
+            self.__forked__.append(pid)
 
     def add_process_to_stack(self, proc):
         self.__subprocess_stack__.append(proc)
@@ -432,97 +618,212 @@ class LimitedStress(object):
         return self.__tool_location__.get(tool, '')
 
     def run_stress(self):
-        stress = Stress(location=self.get_location('stress'))
-        stress.__enable_process_switches__(self.stress_types)
-        for stype in self.stress_types:
+        stress = self.stress_tool(location=self.get_location('stress'))
+        stress.__enable_process_switches__(self.unit_types)
+        for stype in self.unit_types:
             stress.__set_switch_value__(stype, self.workers)
 
         stress_run = stress.run()
         self.add_process_to_stack(stress)
         return stress_run
 
-    @staticmethod
-    def get_stress_pid(stress_run, workers_count=1):
-        total_count = 0
-        matches = []
-        while total_count < workers_count:
-            output = stress_run.stdout.readline()
-            if re.search('\[[0-9]*\]?.forked', output):
-                total_count += 1
-                matches.append(re.search('\[[0-9]*\]?.forked', output).group())
+    def get_stress_pid(self, stress_run, workers_count=1):
+        """
+        The output of stress is read by the supervisor, which keeps on
+        draining it once the pids are found
+        :param stress_run: subprocess.Popen
+        :param workers_count: int
+        :return: generator of str pids
+        :raise OSError: stress did not fork them within the pid timeout
+        """
+        self.supervisor.watch(stress_run)
+        matches = self.supervisor.wait_for(stress_run, FORKED_PATTERN,
+                                           workers_count, self.pid_timeout)
         pid = (x.strip() for x in
                remove_multiple_strings(('[', ']', 'forked'), matches))
         return pid
 
     def fork_to_cpulimit(self, pid):
-        cpulimit = CpuLimit(location=self.get_location('cpulimit'))
+        self.__demand__ += self.__cpulimit_limit__
+        if self.cgroup:
+            self.cgroup.add_pid(pid)
+            self.cgroup.set_limit(self.cgroup.limit +
+                                  self.__cpulimit_limit__)
+            return
+        cpulimit = self.cpulimit_tool(location=self.get_location('cpulimit'))
         cpulimit.set_cpulimit_pid_limit(pid=pid, limit=self.__cpulimit_limit__)
-        cpulimit.run()
+        self.supervisor.watch(cpulimit.run())
         self.add_process_to_stack(cpulimit)
 
     def limit_pid(self, stress_run):
-        pids_forked = self.get_stress_pid(stress_run, self.workers)
+        with self.phase('get_stress_pid'):
+            pids_forked = list(self.get_stress_pid(stress_run, self.workers))
         for pid in pids_forked:
-            global processes
-            if pid not in processes:
+            if pid not in self.get_stack():
                 self.add_pid_to_stack(pid)
-                self.fork_to_cpulimit(pid)
+                with self.phase('fork_to_cpulimit'):
+                    self.fork_to_cpulimit(pid)
             else:
                 raise RuntimeError('Trying to fork pid '
                                    'that is already forked!')
 
     def stress(self):
         self.update_load('old')
-        stress_run = self.run_stress()
-        self.add_process_to_stack(stress_run)
-        # find the pid that stress forks and limit it
-        self.limit_pid(stress_run)
+        if self.pool:
+            # the native engine adds the load a new stress run would add
+            self.set_demand(self.demand + self.workers * self.cpulimit_limit)
+        elif self.__warm__:
+            self.resume_units()
+        else:
+            with self.phase('run_stress'):
+                stress_run = self.run_stress()
+            self.add_process_to_stack(stress_run)
+            # find the pid that stress forks and limit it
+            self.limit_pid(stress_run)
         self.update_load('new')
+        self.warm_up()
+
+    def resume_units(self):
+        """
+        Add the load of a new stress run from the warm workers
+        """
+        for _ in range(self.workers):
+            unit = self.take_unit()
+            self.__units__.append(unit)
+            with self.phase('fork_to_cpulimit'):
+                self.fork_to_cpulimit(unit.pid)
 
     def update_load(self, load_choice):
         # time.sleep(1)
-        load = self.get_load(self.topgrep)
+        with self.phase('update_load'):
+            load = self.get_load(self.sampler)
         if load_choice == 'new':
             self.__new_load__ = load
         else:
             self.__old_load__ = load
 
-    @staticmethod
-    def get_load(tgrep):
-        tgrep_proc = tgrep.run()
-        return float(tgrep.get_cpuload(tgrep_proc))
+    def get_load(self, sampler):
+        """
+        Total host load or the load StressAuto adds, by the load target
+        Both are kept, along with the foreign load of other processes
+        :param sampler: ProcStat
+        :return: float
+        """
+        with self.phase('get_load'):
+            total = sampler.get_cpuload()
+            generated = self.own_cpu.sample()
+        self.__generated__ = generated
+        self.__foreign__ = max(0.0, total - generated)
+        self.__targeted__ = generated if self.load_target == 'added' \
+            else total
+        return self.__targeted__
+
+    def own_pids(self):
+        """
+        StressAuto and every process it started: workers, stress parents,
+        limiters, the native pool and the resource workers
+        :return: set of int
+        """
+        pids = set([os.getpid()])
+        pids.update(int(x) for x in self.get_stack())
+        for process in self.__subprocess_stack__:
+            # stress and cpulimit runs, or the Popen of a stress run
+            process = getattr(process, '__process__', process)
+            if process:
+                pids.add(process.pid)
+        for unit in self.__units__:
+            pids.add(int(unit.pid))
+            if unit.stress.__process__:
+                pids.add(unit.stress.__process__.pid)
+            if unit.cpulimit and unit.cpulimit.__process__:
+                pids.add(unit.cpulimit.__process__.pid)
+        if self.pool:
+            pids.update(self.pool.pids)
+        if self.resource:
+            pids.update(self.resource.pids)
+        pids.update(self.resource_pids())
+        if self.latency_probe:
+            pids.update(self.latency_probe.pids)
+        return pids
+
+    @property
+    def generated_load(self):
+        """
+        Host percent of StressAuto and its processes at the latest sample
+        """
+        return self.__generated__
+
+    @property
+    def targeted_load(self):
+        """
+        Load held to the limit at the latest sample, by the load target
+        """
+        return self.__targeted__
+
+    @property
+    def foreign_load(self):
+        """
+        Host percent of every other process at the latest sample
+        """
+        return self.__foreign__
+
+    def load_message(self, load):
+        """
+        :param load: float
+        :return: str
+        """
+        return 'Cpu load is currently at {0} ({1:.1f} generated, {2:.1f} ' \
+               'foreign)'.format(load, self.generated_load, self.foreign_load)
 
-    def stabilization_check(self, topgrep):
+    def stabilization_check(self, sampler):
         stabilize_msg = 'Waiting to stabilize load'
-        progress_bar.progress_bar(text=stabilize_msg,
-                                  toolbar_width=20)
-        progress_bar.progress_bar(text='.' * len(stabilize_msg),
-                                  placeholder='.',
-                                  toolbar_width=20,
-                                  delimiters=(' ', ' '))
-        load = self.get_load(topgrep)
-        self.dprint.debuglogprint('\nTotal load: {0}'.format(load))
+        if self.dashboard:
+            self.dashboard.count_down(None, stabilize_msg)
+        else:
+            self.dprint.debuglogprint(stabilize_msg, level='DEBUG')
+        self.sleep(self.__stabilize__)
+        load = self.get_load(sampler)
+        self.dprint.debuglogprint('Total load: {0}'.format(load))
         return load
 
     def kill_normal_processes(self):
         kill_stack_processes(self.__subprocess_stack__)
 
     def kill_forked_processes(self):
-        global processes
-        for fork_process in processes:
+        for fork_process in self.get_stack():
             self.dprint.debuglogprint('Killing fork process with pid {0}'
                                       .format(fork_process), level='DEBUG')
             os.kill(int(fork_process), signal.SIGKILL)
 
+    def kill_units(self):
+        while self.__units__:
+            self.__units__.pop().kill()
+        while self.__warm__:
+            self.__warm__.pop().kill()
+        if self.pool:
+            self.pool.stop()
+
     def kill_everything(self):
         self.dprint.debuglogprint('Exiting', level='WARNING')
+        self.kill_units()
         self.kill_normal_processes()
         self.kill_forked_processes()
+        if self.cgroup:
+            try:
+                self.cgroup.remove()
+            except OSError as exc:
+                self.dprint.debuglogprint(str(exc), level='WARNING')
+        if self.resource:
+            self.resource.stop()
+        for resource in self.resources.values():
+            resource.stop()
 
     def timeout_sleep(self):
         self.dprint.debuglogprint('Timeout is on\nSleeping {0} seconds'.format(
             self.__timeout__), 'WARNING')
-        time.sleep(self.__timeout__)
+        self.count_down(self.__timeout__, 'Timeout')
+        with self.plateau():
+            self.sleep(self.__timeout__)
 
     @property
     def cpulimit_limit(self):
@@ -579,31 +880,838 @@ class LimitedStress(object):
         self.limits = new_limit
 
     def run_and_keep_the_limit(self):
-        while self.get_load(self.topgrep) + 2 < self.__limit__:
-            self.dprint.debuglogprint('Cpu load is currently at {0}'.format(
-                self.get_load(self.topgrep)))
-            self.adjust_velocity(current_velocity=self.calculate_velocity())
+        self.begin_iteration()
+        while self.get_load(self.sampler) + 2 < self.__limit__:
+            self.dprint.debuglogprint(self.load_message(
+                self.get_load(self.sampler)))
+            with self.phase('adjust_velocity'):
+                self.adjust_velocity(
+                    current_velocity=self.calculate_velocity())
             try:
-                self.stress()
+                with self.phase('stress'):
+                    self.stress()
             except ValueError:
                 break
             except OSError as exc:
                 self.kill_everything()
                 self.dprint.debuglogprint(exc.message, level='ERROR')
                 sys.exit(1)
+            self.record_metrics(self.__limit__, self.targeted_load)
+            self.begin_iteration()
 
         else:
             if 'debug' in self.dprint.choices:
-                self.stabilization_check(self.topgrep)
+                self.stabilization_check(self.sampler)
             else:
-                time.sleep(1)
-            self.dprint.debuglogprint('Cpu load is currently at {0}'.format(
-                self.get_load(self.topgrep)))
+                self.sleep(1)
+            self.begin_iteration()
+            self.dprint.debuglogprint(self.load_message(
+                self.get_load(self.sampler)))
+            self.record_metrics(self.__limit__, self.targeted_load)
+
+        try:
+            if self.hold:
+                self.hold_pid(self.hand_over())
+            elif self.__timeout__:
+                self.timeout_sleep()
+            self.dprint.debuglogprint('Target achieved')
+        except OSError as exc:
+            self.dprint.debuglogprint(str(exc), level='ERROR')
+            sys.exit(1)
+        finally:
+            self.kill_everything()
+
+    def hand_over(self):
+        """
+        Continue a velocity run with the pid loop: its stress runs are
+        replaced by units at the load they were asked for, and the
+        controller is primed with it
+        :return: ControlLoop
+        """
+        demand = self.__demand__
+        stack, forked = list(self.__subprocess_stack__), list(self.get_stack())
+        del self.__subprocess_stack__[:]
+        del self.get_stack()[:]
+        units, self.__units__ = self.__units__, []
+        loop = self.resource_loop(
+            stats=ConvergenceStats(tolerance=self.tolerance))
+        loop.start(self.__limit__)
+        self.controller.reset(output=demand / self.capacity,
+                              error=self.__limit__ - loop.measurement)
+        self.set_demand(demand)
+        kill_stack_processes(stack)
+        for pid in forked:
+            try:
+                os.kill(int(pid), signal.SIGKILL)
+            except OSError:
+                pass
+        for unit in units:
+            unit.kill()
+        return loop
+
+    def hold_target(self, step, wait, status, loop=None):
+        """
+        Keep the loops acting for the timeout, forever without one, so
+        load is shed when other load appears and added back once it is
+        gone
+        :param step: callable, one control step
+        :param wait: callable, waits for the next control period
+        :param status: callable returning the status message
+        :param loop: ControlLoop whose tracking is reported at the end
+        """
+        self.dprint.debuglogprint('Holding the target for {0}'.format(
+            '{0} seconds'.format(self.__timeout__) if self.__timeout__
+            else 'ever'), 'WARNING')
+        self.count_down(self.__timeout__, 'Holding the target')
+        tracking = TrackingRecord()
+        start = reported = self.clock()
+        with self.plateau():
+            while not self.__timeout__ or \
+                    self.clock() - start < self.__timeout__:
+                step()
+                now = self.clock()
+                if loop:
+                    tracking.record(now - start, loop.setpoint,
+                                    loop.measurement)
+                if now - reported >= self.__hold_report__:
+                    self.dprint.debuglogprint(status())
+                    reported = now
+                wait()
+        if loop:
+            self.dprint.debuglogprint('Held {0}'.format(tracking.report()))
+
+    def pid_step(self, loop):
+        self.begin_iteration()
+        with self.phase('tick'):
+            loop.tick()
+        self.record_metrics(loop.setpoint, loop.measurement)
+
+    def hold_pid(self, loop):
+        self.hold_target(lambda: self.pid_step(loop), loop.wait,
+                         lambda: self.status_message(loop), loop=loop)
+
+    @property
+    def units(self):
+        return tuple(self.__units__)
 
-        if self.__timeout__:
-            self.timeout_sleep()
-        self.dprint.debuglogprint('Target achieved')
-        self.kill_everything()
+    @property
+    def demand(self):
+        """
+        Cpu percent requested from the workers, 100 per full core
+        """
+        return self.__demand__
+
+    def count_down(self, seconds, status):
+        """
+        Show the time left of the run on the dashboard, if drawn
+        :param seconds: float, None when there is no end
+        :param status: str
+        """
+        if self.dashboard:
+            self.dashboard.count_down(seconds, status)
+
+    def phase(self, name):
+        """
+        :param name: str
+        :return: context manager timing its block, if traced
+        """
+        return self.tracer.phase(name) if self.tracer else NULL_PHASE
+
+    def plateau(self, name=None):
+        """
+        :param name: str, defaults to the limits of the run
+        :return: context manager probing the wakeup latency of its
+        block, if probed
+        """
+        if not self.latency_probe:
+            return NULL_PHASE
+        if name is None:
+            name = 'cores {0}'.format(','.join(
+                '{0}={1:g}'.format(*x) for x in sorted(
+                    self.core_limits.items()))) if self.core_limits \
+                else 'limit {0:g}'.format(self.__limit__)
+        return self.latency_probe.plateau(name)
+
+    def follow_plateau(self, current, name):
+        """
+        Close the plateau of the previous segment of the run and open the
+        one of the current segment, when the segment changed
+        :param current: tuple (str name, plateau) or None
+        :param name: str of the current segment, None while the setpoint
+        moves
+        :return: tuple (str name, plateau) or None
+        """
+        if current and current[0] == name:
+            return current
+        if current:
+            current[1].__exit__(None, None, None)
+        if name is None:
+            return None
+        plateau = self.plateau(name)
+        plateau.__enter__()
+        return name, plateau
+
+    def start_unit(self):
+        """
+        :return: StressUnit of a new single worker stress
+        """
+        stress = self.stress_tool(location=self.get_location('stress'))
+        stress.__enable_process_switches__(self.unit_types)
+        for stype in self.unit_types:
+            stress.__set_switch_value__(stype, 1)
+        with self.phase('spawn_unit'):
+            stress_run = stress.run()
+            unit = StressUnit(stress, next(self.get_stress_pid(stress_run)))
+        self.watch_unit(unit)
+        return unit
+
+    def watch_unit(self, unit):
+        """
+        :param unit: StressUnit marked dead by the supervisor once its
+        worker exits
+        """
+        self.supervisor.watch_pid(int(unit.pid), unit.exited)
+
+    def reap_units(self):
+        """
+        Drop the units whose worker died, the reconciliation that follows
+        respawns their load
+        """
+        for unit in [x for x in self.__units__ + self.__warm__
+                     if not x.alive]:
+            self.dprint.debuglogprint('Worker {0} died, respawning'.format(
+                unit.pid), level='WARNING')
+            if unit in self.__units__:
+                self.__units__.remove(unit)
+            else:
+                self.__warm__.remove(unit)
+            unit.kill()
+
+    def take_unit(self):
+        """
+        :return: StressUnit resumed from the warm workers, or a new one
+        """
+        if not self.__warm__:
+            return self.start_unit()
+        unit = self.__warm__.pop()
+        unit.resume()
+        return unit
+
+    def retire_unit(self, unit):
+        """
+        Park the unit with the warm workers, if there is room, else kill it
+        Pinned units are killed, their affinity would follow them
+        """
+        if unit.core is None and len(self.__warm__) < self.warm_workers:
+            unit.park()
+            self.__warm__.append(unit)
+        else:
+            unit.kill()
+
+    def warm_up(self):
+        """
+        Start stopped workers until there are warm workers ready
+        Called after acting, so starting them never delays a step
+        """
+        while len(self.__warm__) < self.warm_workers:
+            unit = self.start_unit()
+            unit.park()
+            self.__warm__.append(unit)
+
+    def spawn_unit(self, limit, core=None):
+        unit = self.take_unit()
+        self.__units__.append(unit)
+        if core is not None:
+            unit.pin(core)
+        elif self.cgroup:
+            self.cgroup.add_pid(unit.pid)
+        self.limit_unit(unit, limit)
+        return unit
+
+    def limit_unit(self, unit, limit):
+        """
+        cpulimit can not be retuned live, so restart it on a new limit
+        A worker at 100 needs no cpulimit at all, nor does any worker
+        when the cgroup quota limits them together
+        """
+        if unit.limit == limit or (self.cgroup and unit.core is None):
+            return
+        with self.phase('limit_unit'):
+            unit.release_limit()
+            if limit < 100:
+                cpulimit = self.cpulimit_tool(
+                    location=self.get_location('cpulimit'))
+                cpulimit.set_cpulimit_pid_limit(pid=unit.pid, limit=limit)
+                self.supervisor.watch(cpulimit.run())
+                unit.cpulimit = cpulimit
+                unit.limit = limit
+
+    def set_demand(self, demand):
+        """
+        Reconcile the workers with the demand: full workers plus one
+        partially limited worker, so only one cpulimit restarts when
+        the demand moves within a core
+        :param demand: float cpu percent, 100 per full core
+        """
+        if self.pool:
+            self.__demand__ = self.pool.set_demand(demand)
+            return
+        self.reap_units()
+        count = int(math.ceil(demand / 100.0)) if demand >= 1 else 0
+        limits = [100] * count
+        if count:
+            limits[-1] = max(1, int(round(demand - 100 * (count - 1))))
+        while len(self.__units__) > count:
+            self.retire_unit(self.__units__.pop())
+        for unit, limit in zip(self.__units__, limits):
+            self.limit_unit(unit, limit)
+        for limit in limits[len(self.__units__):]:
+            self.spawn_unit(limit)
+        self.__demand__ = sum(limits)
+        if self.cgroup:
+            self.cgroup.set_limit(self.__demand__)
+        if count:
+            self.__workers__ = count
+            self.__cpulimit_limit__ = limits[-1]
+        self.warm_up()
+
+    def apply_output(self, output):
+        """
+        The controller output is the load to generate in host percent,
+        the workers are limited in percent of a single core
+        :param output: float
+        """
+        self.set_demand(output * self.capacity)
+
+    def resource_loop(self, stats=None, resource=None, controller=None):
+        """
+        Pid loop on the stressed resource or the cpu load
+        :param stats: ConvergenceStats
+        :param resource: defaults to the resource of the run
+        :param controller: PidController, defaults to the one of the run
+        :return: ControlLoop
+        """
+        resource = resource if resource else self.resource
+        controller = controller if controller else self.controller
+        if resource:
+            measure, actuate = resource.measure, resource.actuate
+            controller.output_limits = resource.output_limits
+        else:
+            # measure over whole control periods
+            self.sampler.interval = self.control_period
+            measure, actuate = lambda: self.get_load(self.sampler), \
+                self.apply_output
+        if self.tracer:
+            measure = self.tracer.traced('measure', measure)
+            actuate = self.tracer.traced('actuate', actuate)
+        return ControlLoop(controller, measure=measure,
+                           actuate=actuate, period=self.control_period,
+                           stats=stats, clock=self.clock, sleep=self.sleep)
+
+    def status_message(self, loop, resource=None):
+        resource = resource if resource else self.resource
+        if resource:
+            return resource.status(loop.measurement)
+        return '{0}, demand {1}'.format(self.load_message(loop.measurement),
+                                        self.demand)
+
+    def converged(self, loops, start):
+        """
+        Whether the loops are done converging
+        A load that stays out of the tolerance, e.g. because /proc/stat
+        is too coarse for it, gives up after converge_timeout seconds
+        :param loops: list of ControlLoop
+        :param start: float, clock time when converging started
+        :return: bool
+        """
+        if all(x.stats.converged for x in loops):
+            return True
+        if self.converge_timeout and \
+                self.clock() - start >= self.converge_timeout:
+            self.dprint.debuglogprint(
+                'Not converged within {0:g}% in {1:g} seconds, going '
+                'on'.format(self.tolerance, self.converge_timeout),
+                level='WARNING')
+            return True
+        return False
+
+    def run_pid(self):
+        loop = self.resource_loop(
+            stats=ConvergenceStats(tolerance=self.tolerance))
+        try:
+            loop.start(self.__limit__)
+            start = self.clock()
+            while not self.converged([loop], start):
+                self.pid_step(loop)
+                self.dprint.debuglogprint(self.status_message(loop))
+                loop.wait()
+            self.dprint.debuglogprint(loop.stats.report())
+            if self.hold:
+                self.hold_pid(loop)
+            elif self.__timeout__:
+                self.timeout_sleep()
+            self.dprint.debuglogprint('Target achieved')
+        except OSError as exc:
+            self.dprint.debuglogprint(str(exc), level='ERROR')
+            sys.exit(1)
+        finally:
+            self.kill_everything()
+        return loop.stats
+
+    def core_load(self, core):
+        """
+        Load of a core from the latest sample
+        :param core: int
+        :return: float
+        """
+        return self.sampler.last_load.per_core[core]
+
+    def set_core_demand(self, core, demand):
+        """
+        Load the core with a single worker pinned to it
+        :param core: int
+        :param demand: float cpu percent of the core
+        """
+        if self.pool:
+            self.pool.set_core_ratio(core, demand / 100.0)
+            return
+        limit = int(round(min(100, demand)))
+        self.reap_units()
+        unit = next((x for x in self.__units__ if x.core == core), None)
+        if limit < 1:
+            if unit:
+                self.__units__.remove(unit)
+                unit.kill()
+        elif unit:
+            self.limit_unit(unit, limit)
+        else:
+            self.spawn_unit(limit, core=core)
+
+    def core_loops(self, cores):
+        """
+        :param cores: iterable of int
+        :return: dict {core: ControlLoop}
+        """
+        loops = {}
+        for core in cores:
+            loops[core] = ControlLoop(
+                self.controller.clone(),
+                measure=lambda core=core: self.core_load(core),
+                actuate=lambda output, core=core:
+                self.set_core_demand(core, output),
+                period=self.control_period,
+                stats=ConvergenceStats(tolerance=self.tolerance),
+                clock=self.clock, sleep=self.sleep)
+        return loops
+
+    @staticmethod
+    def host_setpoint(loops):
+        """
+        Setpoint of per core loops as a host percent
+        :param loops: dict {core: ControlLoop}
+        :return: float
+        """
+        return sum(x.setpoint for x in loops.values()) / \
+            multiprocessing.cpu_count()
+
+    @staticmethod
+    def core_loads_message(loops):
+        return 'Core loads are currently at {0}'.format(
+            ', '.join('{0}: {1:.1f}'.format(core, loop.measurement)
+                      for core, loop in sorted(loops.items())))
+
+    def log_core_loads(self, loops):
+        self.dprint.debuglogprint(self.core_loads_message(loops))
+
+    def run_cores(self):
+        """
+        One pid loop per targeted core, all measured from a single
+        /proc/stat sample every control period
+        Cores targeted at 0 never get a worker pinned on them
+        """
+        self.sampler.interval = self.control_period
+        ticker = Ticker(self.control_period, clock=self.clock,
+                        sleep=self.sleep)
+        loops = self.core_loops(core for core, limit in
+                                self.core_limits.items() if limit > 0)
+
+        def step():
+            self.begin_iteration()
+            self.sampler.sample()
+            for loop in loops.values():
+                loop.tick()
+            self.record_metrics(self.host_setpoint(loops))
+
+        try:
+            self.sampler.sample()
+            for core, loop in loops.items():
+                loop.start(self.core_limits[core])
+            ticker.start()
+            start = self.clock()
+            while not self.converged(loops.values(), start):
+                step()
+                self.log_core_loads(loops)
+                ticker.wait()
+            for core, loop in sorted(loops.items()):
+                self.dprint.debuglogprint('Core {0}: {1}'.format(
+                    core, loop.stats.report()))
+            if self.hold:
+                self.hold_target(step, ticker.wait,
+                                 lambda: self.core_loads_message(loops))
+            elif self.__timeout__:
+                self.timeout_sleep()
+            self.dprint.debuglogprint('Target achieved')
+        except OSError as exc:
+            self.dprint.debuglogprint(str(exc), level='ERROR')
+            sys.exit(1)
+        finally:
+            self.kill_everything()
+        return dict((core, loop.stats) for core, loop in loops.items())
+
+    def profile_setpoint(self, elapsed):
+        """
+        Setpoint of the profile, capped at 100 for loads in percent
+        :param elapsed: float seconds
+        :return: float
+        """
+        limits = self.resource.setpoint_limits if self.resource \
+            else PERCENT
+        return clamp_load(self.profile.setpoint(elapsed), limits)
+
+    def run_profile(self):
+        """
+        Pid loop on a setpoint fed by the profile every control period,
+        until the profile ends
+        """
+        loop = self.resource_loop()
+        tracking = TrackingRecord()
+        plateau = None
+        try:
+            start = loop.clock()
+            loop.start(self.profile_setpoint(0))
+            self.count_down(self.profile.duration, 'Following the profile')
+            elapsed = 0
+            while not self.profile.finished(elapsed):
+                plateau = self.follow_plateau(plateau,
+                                              self.profile.segment(elapsed))
+                self.begin_iteration()
+                loop.tick(self.profile_setpoint(elapsed))
+                tracking.record(elapsed, loop.setpoint, loop.measurement)
+                self.record_metrics(loop.setpoint, loop.measurement)
+                self.dprint.debuglogprint('{0}, setpoint {1:.1f}'.format(
+                    self.status_message(loop), loop.setpoint))
+                loop.wait()
+                elapsed = loop.clock() - start
+            self.follow_plateau(plateau, None)
+            self.dprint.debuglogprint(tracking.report())
+            if self.tracking_output:
+                tracking.to_csv(self.tracking_output)
+        except OSError as exc:
+            self.dprint.debuglogprint(str(exc), level='ERROR')
+            sys.exit(1)
+        finally:
+            self.kill_everything()
+        return tracking
+
+    def run_core_profile(self):
+        """
+        Per core pid loops fed by the per core setpoints of the profile,
+        e.g. a trace recorded per core, until the profile ends
+        """
+        self.sampler.interval = self.control_period
+        ticker = Ticker(self.control_period, clock=self.clock,
+                        sleep=self.sleep)
+        loops = self.core_loops(range(self.profile.cores))
+        tracking = dict((core, TrackingRecord()) for core in loops)
+        try:
+            self.sampler.sample()
+            for core, loop in loops.items():
+                loop.start(self.profile.core_setpoint(0, core))
+            start = ticker.clock()
+            ticker.start()
+            self.count_down(self.profile.duration, 'Following the profile')
+            elapsed = 0
+            while not self.profile.finished(elapsed):
+                self.begin_iteration()
+                self.sampler.sample()
+                for core, loop in loops.items():
+                    loop.tick(self.profile.core_setpoint(elapsed, core))
+                    tracking[core].record(elapsed, loop.setpoint,
+                                          loop.measurement)
+                self.record_metrics(self.host_setpoint(loops))
+                self.log_core_loads(loops)
+                ticker.wait()
+                elapsed = ticker.clock() - start
+            for core, record in sorted(tracking.items()):
+                self.dprint.debuglogprint('Core {0}: {1}'.format(
+                    core, record.report()))
+        except OSError as exc:
+            self.dprint.debuglogprint(str(exc), level='ERROR')
+            sys.exit(1)
+        finally:
+            self.kill_everything()
+        return tracking
+
+    def resource_pids(self):
+        """
+        Worker pids of the memory, disk and network stress
+        :return: tuple
+        """
+        return sum((x.pids for x in self.resources.values()), ())
+
+    def multi_loops(self, targets=None):
+        """
+        One pid loop per resource, started on its target
+        :param targets: dict {stress type: limit}, defaults to the targets
+        of the run
+        :return: dict {stress type: ControlLoop}
+        """
+        targets = targets if targets else self.targets
+        loops = {}
+        for stype, limit in sorted(targets.items()):
+            loops[stype] = self.resource_loop(
+                stats=ConvergenceStats(tolerance=self.tolerance),
+                resource=self.resources.get(stype),
+                controller=self.controller.clone())
+        for stype, loop in loops.items():
+            loop.start(targets[stype])
+        self.interference.sample()
+        self.__interfering__ = 0.0
+        return loops
+
+    def multi_tick(self, loops, setpoints=None):
+        """
+        Tick every loop once
+        Cpu used by the memory, disk and network workers is fed forward
+        to the cpu loop, which sheds as much load as they take, before
+        the feedback has to catch the interference
+        :param loops: dict {stress type: ControlLoop}
+        :param setpoints: dict {stress type: limit} to move the loops to
+        """
+        setpoints = setpoints if setpoints else {}
+        self.begin_iteration()
+        if 'cpu' in loops:
+            used = self.interference.sample()
+            loops['cpu'].controller.shift(self.__interfering__ - used)
+            self.__interfering__ = used
+        for stype, loop in loops.items():
+            loop.tick(setpoints.get(stype))
+        if 'cpu' in loops:
+            self.record_metrics(loops['cpu'].setpoint,
+                                loops['cpu'].measurement)
+        self.dprint.debuglogprint('; '.join(
+            self.status_message(loop, self.resources.get(stype))
+            for stype, loop in sorted(loops.items())))
+
+    def run_multi(self):
+        """
+        One pid loop per resource, all ticked by a single scheduler tick
+        The loops keep holding their targets for the timeout
+        """
+        ticker = Ticker(self.control_period, clock=self.clock,
+                        sleep=self.sleep)
+        loops = {}
+        plateau = None
+        try:
+            loops = self.multi_loops()
+            ticker.start()
+            start = self.clock()
+            hold_until = None
+            while hold_until is None or ticker.clock() < hold_until:
+                self.multi_tick(loops)
+                if hold_until is None and \
+                        self.converged(loops.values(), start):
+                    for stype, loop in sorted(loops.items()):
+                        self.dprint.debuglogprint('{0}: {1}'.format(
+                            stype, loop.stats.report()))
+                    hold_until = ticker.clock() + (self.__timeout__ or 0)
+                    plateau = self.follow_plateau(None, ' '.join(
+                        '{0}={1:g}'.format(*x)
+                        for x in sorted(self.targets.items())))
+                ticker.wait()
+            self.follow_plateau(plateau, None)
+            self.dprint.debuglogprint('Target achieved')
+        except OSError as exc:
+            self.dprint.debuglogprint(str(exc), level='ERROR')
+            sys.exit(1)
+        finally:
+            self.kill_everything()
+        return dict((stype, loop.stats) for stype, loop in loops.items())
+
+    @property
+    def worker_count(self):
+        """
+        :return: int load generating processes
+        """
+        if self.pool:
+            return len(self.pool.pids)
+        if self.__units__:
+            return len(self.__units__)
+        return len(self.get_stack())
+
+    @property
+    def limiter_count(self):
+        """
+        :return: int cpulimit processes, or 1 for a cgroup
+        """
+        if self.cgroup:
+            return 1
+        if self.__units__:
+            return sum(1 for x in self.__units__ if x.cpulimit)
+        return sum(1 for x in self.__subprocess_stack__
+                   if isinstance(x, CpuLimit))
+
+    def begin_iteration(self):
+        """
+        Mark the start of a control loop iteration, before its measurement
+        """
+        self.__iteration_start__ = monotonic()
+
+    def record_metrics(self, setpoint, load=None):
+        """
+        Record the latest cpu sample, if metrics are kept, and publish it
+        to the exporter, once per control loop iteration, after actuating
+        The exported iteration time runs from begin_iteration to here,
+        without the wait for the next control period
+        :param setpoint: float host percent
+        :param load: float, defaults to the total of the latest sample
+        """
+        start = self.__iteration_start__
+        iteration = monotonic() - start if start is not None else 0.0
+        last_load = self.sampler.last_load
+        if load is None and not last_load:
+            return
+        load = last_load.total if load is None else load
+        if self.metrics is not None:
+            self.metrics.record(
+                time.time(), setpoint, load,
+                per_core=last_load.per_core if last_load else (),
+                workers=self.worker_count, limit=self.demand)
+        if self.telemetry is not None:
+            with self.phase('telemetry'):
+                self.telemetry.sample(time.time(), load,
+                                      self.generated_load, self.worker_count)
+        if self.dashboard:
+            self.dashboard.update(
+                setpoint, load,
+                per_core=last_load.per_core if last_load else None,
+                workers=self.worker_count, limiters=self.limiter_count)
+        if self.exporter:
+            self.exporter.state.update(
+                setpoint=setpoint, load=load, error=setpoint - load,
+                workers=self.worker_count, limiters=self.limiter_count,
+                limit=self.demand, generated=self.generated_load,
+                foreign=self.foreign_load,
+                iteration_seconds=iteration)
+
+    def export_metrics(self, *_):
+        """
+        Write the recorded metrics out, also the SIGUSR1 handler
+        """
+        if self.metrics is None or not self.metrics_output:
+            return
+        self.metrics.export(self.metrics_output, self.metrics_format)
+        self.dprint.debuglogprint('Metrics of {0} samples written to {1}'
+                                  .format(len(self.metrics),
+                                          self.metrics_output))
+
+    def dispatch(self):
+        if self.targets:
+            return self.run_multi()
+        if self.profile and self.per_core_profile:
+            return self.run_core_profile()
+        if self.profile:
+            return self.run_profile()
+        if self.core_limits:
+            return self.run_cores()
+        if self.mode == 'pid' or self.resource:
+            return self.run_pid()
+        return self.run_and_keep_the_limit()
+
+    def report_trace(self):
+        """
+        Print the per phase durations and write the trace out
+        """
+        if not self.tracer:
+            return
+        self.dprint.debuglogprint(self.tracer.summary())
+        if self.trace_output:
+            self.tracer.export(self.trace_output, self.trace_format)
+            self.dprint.debuglogprint('Phase trace written to {0}'.format(
+                self.trace_output))
+
+    def report_latency(self):
+        """
+        Stop the latency probe and print the latency of every plateau
+        """
+        if not self.latency_probe:
+            return
+        self.latency_probe.stop()
+        if self.latency_probe.priority and not self.latency_probe.realtime:
+            self.dprint.debuglogprint('The latency probe could not run '
+                                      'under SCHED_FIFO, latencies are of '
+                                      'normal priority', level='WARNING')
+        if not self.latency_probe.plateaus:
+            self.dprint.debuglogprint('No plateau was held, latencies are '
+                                      'only probed while a setpoint is '
+                                      'constant: a timeout, a hold, a step '
+                                      'or a schedule segment',
+                                      level='WARNING')
+        self.dprint.debuglogprint(self.latency_probe.summary())
+
+    def report_telemetry(self):
+        """
+        Print when throttling started and write the telemetry out
+        """
+        if self.telemetry is None:
+            return
+        self.dprint.debuglogprint(self.telemetry.summary())
+        if self.telemetry_output:
+            self.telemetry.to_csv(self.telemetry_output)
+            self.dprint.debuglogprint('Telemetry written to {0}'.format(
+                self.telemetry_output))
+
+    def start_exporter(self):
+        """
+        :raise socket.error: the port can not be bound
+        """
+        address, port = self.exporter.start()
+        self.dprint.debuglogprint('Serving metrics on http://{0}:{1}/metrics'
+                                  .format(address, port))
+
+    def run(self):
+        if self.metrics is not None:
+            signal.signal(signal.SIGUSR1, self.export_metrics)
+        if self.exporter:
+            try:
+                self.start_exporter()
+            except (IOError, OSError) as exc:
+                self.dprint.debuglogprint(str(exc), level='ERROR')
+                sys.exit(1)
+        if self.latency_probe:
+            self.latency_probe.start()
+        if self.dashboard:
+            self.dashboard.start()
+        if self.warm_workers and self.engine == 'stress' and \
+                not self.resource:
+            try:
+                self.warm_up()
+            except OSError as exc:
+                self.kill_everything()
+                self.dprint.debuglogprint(str(exc), level='ERROR')
+                sys.exit(1)
+        try:
+            return self.dispatch()
+        finally:
+            if self.dashboard:
+                self.dashboard.stop()
+            self.export_metrics()
+            self.report_trace()
+            self.report_latency()
+            self.report_telemetry()
+            if self.exporter:
+                self.exporter.stop()
+            self.supervisor.stop()
 
 
 def location_crafter(*args):
@@ -616,13 +1724,92 @@ def location_crafter(*args):
     return __locations__
 
 
+def core_limit_crafter(specs):
+    """
+    Per core limits from specs like '0-3:90', a cpu list and its limit
+    :param specs: list of str
+    :return: dict {core: limit}
+    """
+    core_limits = dict()
+    for spec in specs if specs else ():
+        cpus, limit = spec.rsplit(':', 1)
+        for cpu in parse_cpu_list(cpus):
+            core_limits[cpu] = int(limit)
+    return core_limits
+
+
+stress_type_aliases = dict(c='cpu', vm='vm', mem='vm', hdd='hdd', hd='hdd',
+                           net='net', n='net')
+
+
+def resource_crafter(parser, args, stype=None):
+    """
+    Memory, disk or network stress of the chosen stress type
+    Limits given as MemAvailable are turned into used memory limits
+    :param parser: argparse.ArgumentParser
+    :param args: argparse.Namespace
+    :param stype: str, defaults to the stress type of the arguments
+    :return: MemoryStress, DiskStress, NetworkStress or None for cpu
+    """
+    stype = stype if stype else args.stype
+    if stype in ('vm', 'mem'):
+        if args.mem_available is not None:
+            args.limit = MemInfo().used_percent_for_available(
+                args.mem_available * MEGABYTE)
+        return MemoryStress(chunk_size=args.chunk * MEGABYTE,
+                            dirty_rate=args.dirty_rate * MEGABYTE)
+    if stype in ('hdd', 'hd'):
+        try:
+            return DiskStress(args.io_path, device=args.device,
+                              unit=args.io_unit,
+                              block_size=args.block_size * 1024,
+                              read_ratio=args.read_ratio, direct=args.direct,
+                              file_size=args.io_size * MEGABYTE,
+                              max_workers=args.io_workers,
+                              force=args.io_force)
+        except (ValueError, OSError) as exc:
+            parser.error(str(exc))
+    if stype in ('net', 'n'):
+        target = None
+        if args.net_target:
+            host, port = args.net_target.rsplit(':', 1)
+            target = (host, int(port))
+        return NetworkStress(protocol=args.protocol, target=target,
+                             interface=args.interface, unit=args.net_unit,
+                             packet_size=args.packet_size,
+                             max_workers=args.net_workers)
+    return None
+
+
+def target_crafter(parser, args):
+    """
+    Limits and resources of a multi resource run, from specs like cpu=70
+    :param parser: argparse.ArgumentParser
+    :param args: argparse.Namespace
+    :return: tuple (dict {stress type: limit}, dict {stress type: resource})
+    """
+    targets, resources = dict(), dict()
+    for spec in args.target if args.target else ():
+        stype, _, limit = spec.partition('=')
+        if stype not in stress_type_aliases and stype != 'cpu':
+            parser.error('No such stress type: {0}'.format(stype))
+        stype = stress_type_aliases.get(stype, stype)
+        targets[stype] = float(limit)
+        if stype == 'vm' and args.mem_available is not None:
+            parser.error('--mem-available can not be combined with --target')
+        resource = resource_crafter(parser, args, stype)
+        if resource:
+            resources[stype] = resource
+    return targets, resources
+
+
 def args_crafter():
 
     parser = argparse.ArgumentParser(prog='StressAuto',
                                      description='Simple stress tool wrapper',
                                      usage='%(prog)s [options]')
     parser.add_argument('-l', '--limit', help='Limit of load to reach',
-                        type=int, required=True)
+                        type=int)
     parser.add_argument('-t', '--timeout', help='Seconds after reaching '
                                                 'target to quit',
                         type=int, default=0)
@@ -632,27 +1819,315 @@ def args_crafter():
     parser.add_argument('-cl', '--clocation', metavar='cpulimit Location',
                         help='Absolute path to cpulimit location',
                         default='', type=str)
-    parser.add_argument('-st', '--stype', help='Type of stress c(pu) / hd(d)',
-                        default='cpu', choices=('cpu', 'c', 'hdd', 'hd'))
+    parser.add_argument('-st', '--stype', help='Type of stress c(pu) / hd(d) '
+                                               '/ v(m) / n(et), the limit of '
+                                               'vm is the used memory '
+                                               'percent, of hdd the MB/s or '
+                                               'iops, of net the Mbit/s or '
+                                               'packets per second',
+                        default='cpu',
+                        choices=('cpu', 'c', 'hdd', 'hd', 'vm', 'mem',
+                                 'net', 'n'))
 
     parser.add_argument('-v', '--verbose', help='Verbosity level',
                         default='',
                         choices=('print', 'log', 'all', 'pdebug'))
+    parser.add_argument('-i', '--interval', help='Minimum seconds of every '
+                                                 '/proc/stat load sample',
+                        type=float, default=0.1)
+    parser.add_argument('-m', '--mode', help='Controller keeping the limit',
+                        default='velocity', choices=LimitedStress.modes)
+    parser.add_argument('-kp', '--kp', help='Pid proportional gain',
+                        type=float, default=0.4)
+    parser.add_argument('-ki', '--ki', help='Pid integral gain (per second)',
+                        type=float, default=0.8)
+    parser.add_argument('-kd', '--kd', help='Pid derivative gain (seconds)',
+                        type=float, default=0.0)
+    parser.add_argument('-p', '--period', help='Seconds between pid '
+                                               'control steps',
+                        type=float, default=0.5)
+    parser.add_argument('-tol', '--tolerance', help='Load percent around '
+                                                    'the limit that counts '
+                                                    'as converged',
+                        type=float, default=1.0)
+    parser.add_argument('-cv', '--converge-timeout',
+                        help='Seconds to converge before going on anyway '
+                             '(0 waits forever)',
+                        type=float, default=60.0, dest='converge_timeout')
+    parser.add_argument('-e', '--engine', help='Load generator: external '
+                                               'stress/cpulimit or native '
+                                               'duty cycle workers',
+                        default='stress', choices=LimitedStress.engines)
+    parser.add_argument('-lm', '--limiter', help='Throttle the stress workers '
+                                                 'with one cpulimit each or '
+                                                 'with a single cgroup v2',
+                        default='cpulimit', choices=LimitedStress.limiters)
+    parser.add_argument('-cs', '--cpuset', help='Cpus the cgroup limited '
+                                                'workers may run on, '
+                                                'e.g. 0-3',
+                        default=None, type=str)
+    parser.add_argument('-co', '--core-limit', help='Limit of load to reach '
+                                                    'on a cpu list, e.g. '
+                                                    '0-3:90 (repeatable)',
+                        action='append', dest='core_limit')
+    parser.add_argument('-pr', '--profile', help='Time varying limit: '
+                                                 'ramp:START:END:SECONDS, '
+                                                 'step:L1,L2,..:SECONDS, '
+                                                 'sine:MEAN:AMPLITUDE:PERIOD'
+                                                 ':SECONDS or file:PATH',
+                        default=None, type=str)
+    parser.add_argument('-to', '--tracking-output', help='CSV file to write '
+                                                         'setpoint versus '
+                                                         'achieved load to',
+                        default=None, type=str, dest='tracking_output')
+    parser.add_argument('-rp', '--replay', help='Csv or binary trace of '
+                                                'timestamp,load[,per core] '
+                                                'to replay',
+                        default=None, type=str)
+    parser.add_argument('-sp', '--speed', help='Replay speed, 2 replays the '
+                                               'trace twice as fast',
+                        default=1.0, type=float)
+    parser.add_argument('-rc', '--replay-cores', help='Replay the per core '
+                                                      'loads of the trace',
+                        action='store_true', dest='replay_cores')
+    parser.add_argument('-ma', '--mem-available', help='Target MemAvailable '
+                                                       'in MB instead of a '
+                                                       'used memory limit',
+                        default=None, type=int, dest='mem_available')
+    parser.add_argument('-ch', '--chunk', help='MB of memory allocated or '
+                                               'freed at once',
+                        default=64, type=int)
+    parser.add_argument('-dr', '--dirty-rate', help='MB per second of held '
+                                                    'memory to re-dirty',
+                        default=0, type=float, dest='dirty_rate')
+    parser.add_argument('-ip', '--io-path', help='Test file for disk stress, '
+                                                 'on the device to stress',
+                        default='./stressauto.io', dest='io_path')
+    parser.add_argument('-dv', '--device', help='Block device to measure, '
+                                                'defaults to the one of the '
+                                                'test file',
+                        default=None, type=str)
+    parser.add_argument('-iu', '--io-unit', help='Unit of the disk limit',
+                        default='mbps', choices=('mbps', 'iops'),
+                        dest='io_unit')
+    parser.add_argument('-bs', '--block-size', help='KB of every disk '
+                                                    'operation',
+                        default=4, type=int, dest='block_size')
+    parser.add_argument('-rr', '--read-ratio', help='Share of disk reads, '
+                                                    'the rest are writes',
+                        default=0.5, type=float, dest='read_ratio')
+    parser.add_argument('-di', '--direct', help='Bypass the page cache '
+                                                'with O_DIRECT',
+                        action='store_true')
+    parser.add_argument('-fo', '--io-force', help='Write over an existing '
+                                                  'test file, which is '
+                                                  'then left in place',
+                        action='store_true', dest='io_force')
+    parser.add_argument('-is', '--io-size', help='MB of the test file',
+                        default=256, type=int, dest='io_size')
+    parser.add_argument('-iw', '--io-workers', help='Maximum concurrent '
+                                                    'disk workers',
+                        default=16, type=int, dest='io_workers')
+    parser.add_argument('-pt', '--protocol', help='Network stress protocol',
+                        default='tcp', choices=('tcp', 'udp'))
+    parser.add_argument('-nt', '--net-target', help='HOST:PORT of a running '
+                                                    'sink, e.g. in a network '
+                                                    'namespace, instead of a '
+                                                    'local one',
+                        default=None, type=str, dest='net_target')
+    parser.add_argument('-if', '--interface', help='Interface to measure '
+                                                   'network traffic on',
+                        default='lo', type=str)
+    parser.add_argument('-nu', '--net-unit', help='Unit of the network limit',
+                        default='mbit', choices=('mbit', 'pps'),
+                        dest='net_unit')
+    parser.add_argument('-ps', '--packet-size', help='Bytes of every '
+                                                     'network send',
+                        default=1400, type=int, dest='packet_size')
+    parser.add_argument('-nw', '--net-workers', help='Maximum concurrent '
+                                                     'network senders',
+                        default=4, type=int, dest='net_workers')
+    parser.add_argument('-mo', '--metrics-output',
+                        help='Record every sample and write them to this '
+                             'file on exit and on SIGUSR1',
+                        default=None, dest='metrics_output')
+    parser.add_argument('-mf', '--metrics-format',
+                        help='Format of the metrics output',
+                        choices=MetricsRecorder.formats, default='csv',
+                        dest='metrics_format')
+    parser.add_argument('-mc', '--metrics-capacity',
+                        help='Samples kept, the oldest are dropped once full '
+                             '(default: 24 hours at 2 Hz)',
+                        default=MetricsRecorder.__capacity__, type=int,
+                        dest='metrics_capacity')
+    parser.add_argument('-ep', '--exporter-port',
+                        help='Serve the loop state as Prometheus metrics on '
+                             'this port',
+                        default=None, type=int, dest='exporter_port')
+    parser.add_argument('-ea', '--exporter-address',
+                        help='Address the metrics are served on, 0.0.0.0 '
+                             'to be scraped from other hosts',
+                        default='127.0.0.1', dest='exporter_address')
+    parser.add_argument('-tr', '--trace',
+                        help='Time every phase of the control loop, print '
+                             'their p50/p99 on exit and write the trace to '
+                             'this file',
+                        default=None, dest='trace')
+    parser.add_argument('-tf', '--trace-format',
+                        help='chrome (chrome://tracing, Perfetto) or json '
+                             'lines',
+                        choices=PhaseTracer.formats, default='chrome',
+                        dest='trace_format')
+    parser.add_argument('-ww', '--warm-workers',
+                        help='Stress workers kept started and stopped, so '
+                             'adding load resumes one instead of starting '
+                             'stress',
+                        default=0, type=int, dest='warm_workers')
+    parser.add_argument('-hl', '--hold',
+                        help='Keep controlling once the target is reached, '
+                             'for the timeout or until interrupted, shedding '
+                             'and adding load as other load comes and goes',
+                        action='store_true', dest='hold')
+    parser.add_argument('-lt', '--load-target',
+                        help='Whether the limit is the total host load or '
+                             'the load added by StressAuto',
+                        choices=LimitedStress.load_targets, default='total',
+                        dest='load_target')
+    parser.add_argument('-ms', '--measure',
+                        help='Measure the host load, or the load of the '
+                             'cgroup of StressAuto as a percent of its cpu '
+                             'quota, e.g. in a container; auto picks the '
+                             'cgroup when it has a quota',
+                        choices=LimitedStress.measures, default='auto',
+                        dest='measure')
+    parser.add_argument('-pw', '--pid-timeout',
+                        help='Seconds stress has to report the pids of its '
+                             'workers before the run fails',
+                        default=10.0, type=float, dest='pid_timeout')
+    parser.add_argument('-lp', '--latency-probe',
+                        help='Measure the scheduler wakeup latency with a '
+                             'timer waking every this many microseconds, '
+                             'reported per plateau',
+                        default=None, type=float, dest='latency_probe')
+    parser.add_argument('-lpr', '--latency-priority',
+                        help='SCHED_FIFO priority of the latency probe, 1 '
+                             'to 99',
+                        default=None, type=int, dest='latency_priority')
+    parser.add_argument('-lpc', '--latency-core',
+                        help='Core to pin the latency probe to',
+                        default=None, type=int, dest='latency_core')
+    parser.add_argument('-te', '--telemetry',
+                        help='Sample cpu frequencies, thermal zones, '
+                             'throttling and pressure stalls with the load '
+                             'and report when throttling started',
+                        action='store_true', dest='telemetry')
+    parser.add_argument('-teo', '--telemetry-output',
+                        help='Write the telemetry samples to this csv '
+                             'file, implies --telemetry',
+                        default=None, dest='telemetry_output')
+    parser.add_argument('-ds', '--dashboard',
+                        help='Draw a live view of the setpoint, the load, '
+                             'the per core loads, the workers and the time '
+                             'left on the terminal',
+                        action='store_true', dest='dashboard')
+    parser.add_argument('-dsr', '--dashboard-rate',
+                        help='Dashboard redraws per second',
+                        default=Dashboard.__rate__, type=float,
+                        dest='dashboard_rate')
+    parser.add_argument('-tg', '--target', help='TYPE=LIMIT of one resource '
+                                                'of a multi resource run, '
+                                                'e.g. cpu=70 vm=60 hdd=200 '
+                                                '(repeatable)',
+                        action='append')
     return parser
 
 if __name__ == '__main__':
     parse = args_crafter()
 
     args_parse = parse.parse_args()
+    targets, resources = target_crafter(parse, args_parse)
+    resource = None if targets else resource_crafter(parse, args_parse)
+    if args_parse.limit is None and not args_parse.core_limit \
+            and not args_parse.profile and not args_parse.replay \
+            and not targets:
+        parse.error('one of --limit, --core-limit, --profile, --replay or '
+                    '--target is required')
+    try:
+        if args_parse.replay:
+            profile = TraceProfile.from_file(args_parse.replay,
+                                             speed=args_parse.speed)
+        else:
+            profile = parse_profile(args_parse.profile) \
+                if args_parse.profile else None
+    except (ValueError, IOError) as exc:
+        parse.error(str(exc))
+    if args_parse.replay_cores and not (profile and
+                                        getattr(profile, 'cores', 0)):
+        parse.error('--replay-cores needs a trace with per core loads')
+
+    metrics = MetricsRecorder(capacity=args_parse.metrics_capacity,
+                              cores=multiprocessing.cpu_count()) \
+        if args_parse.metrics_output else None
+
+    exporter = MetricsServer(port=args_parse.exporter_port,
+                             address=args_parse.exporter_address) \
+        if args_parse.exporter_port is not None else None
 
     locations = location_crafter(args_parse.slocation, args_parse.clocation)
     # todo add multiple types as tuple
-    lstress = LimitedStress(('cpu',),
+    stress_types = tuple(sorted(targets)) if targets else \
+        (stress_type_aliases.get(args_parse.stype, 'cpu'),)
+    lstress = LimitedStress(stress_types,
                             limit=args_parse.limit, timeout=args_parse.timeout,
                             tool_location=locations,
-                            verbosity=args_parse.verbose)
-
-    lstress.run_and_keep_the_limit()
+                            verbosity=args_parse.verbose,
+                            sample_interval=args_parse.interval,
+                            mode=args_parse.mode,
+                            controller=PidController(kp=args_parse.kp,
+                                                     ki=args_parse.ki,
+                                                     kd=args_parse.kd),
+                            control_period=args_parse.period,
+                            tolerance=args_parse.tolerance,
+                            converge_timeout=args_parse.converge_timeout,
+                            engine=args_parse.engine,
+                            limiter=args_parse.limiter,
+                            cpuset=args_parse.cpuset,
+                            core_limits=core_limit_crafter(
+                                args_parse.core_limit),
+                            profile=profile,
+                            tracking_output=args_parse.tracking_output,
+                            per_core_profile=args_parse.replay_cores,
+                            resource=resource, targets=targets,
+                            resources=resources, metrics=metrics,
+                            metrics_output=args_parse.metrics_output,
+                            metrics_format=args_parse.metrics_format,
+                            exporter=exporter,
+                            tracer=PhaseTracer() if args_parse.trace
+                            else None,
+                            trace_output=args_parse.trace,
+                            trace_format=args_parse.trace_format,
+                            warm_workers=args_parse.warm_workers,
+                            hold=args_parse.hold,
+                            load_target=args_parse.load_target,
+                            measure=args_parse.measure,
+                            pid_timeout=args_parse.pid_timeout,
+                            latency_probe=LatencyProbe(
+                                args_parse.latency_probe / 1e6,
+                                priority=args_parse.latency_priority,
+                                core=args_parse.latency_core)
+                            if args_parse.latency_probe else None,
+                            telemetry=Telemetry()
+                            if args_parse.telemetry or
+                            args_parse.telemetry_output else None,
+                            telemetry_output=args_parse.telemetry_output,
+                            dashboard=Dashboard(
+                                rate=args_parse.dashboard_rate)
+                            if args_parse.dashboard else None)
+
+    try:
+        lstress.run()
+    except KeyboardInterrupt:
+        pass
 
 
 
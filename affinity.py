@@ -0,0 +1,66 @@
+import ctypes
+import ctypes.util
+import os
+
+
+def parse_cpu_list(cpu_list):
+    """
+    Cpu list in the kernel format, e.g. '0-3,6'
+    :param cpu_list: str
+    :return: tuple of int
+    :raise ValueError: malformed list
+    """
+    cpus = set()
+    for part in cpu_list.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    if not cpus:
+        raise ValueError('Empty cpu list!')
+    return tuple(sorted(cpus))
+
+
+def set_affinity(pid, cpus):
+    """
+    Pin a process to the given cpus
+    Falls back to calling libc where os.sched_setaffinity is missing
+    :param pid: int, 0 for the calling process
+    :param cpus: iterable of int
+    :raise OSError: the kernel refused the mask
+    """
+    cpus = tuple(cpus)
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(pid, cpus)
+        return
+    bits = 8 * ctypes.sizeof(ctypes.c_ulong)
+    mask = (ctypes.c_ulong * (max(cpus) // bits + 1))()
+    for cpu in cpus:
+        mask[cpu // bits] |= 1 << (cpu % bits)
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if libc.sched_setaffinity(pid, ctypes.sizeof(mask), mask) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def set_realtime(pid, priority):
+    """
+    Run a process under SCHED_FIFO at the given priority
+    Falls back to calling libc where os.sched_setscheduler is missing
+    :param pid: int, 0 for the calling process
+    :param priority: int 1 to 99
+    :raise OSError: not permitted, e.g. without CAP_SYS_NICE
+    """
+    if hasattr(os, 'sched_setscheduler'):
+        os.sched_setscheduler(pid, os.SCHED_FIFO, os.sched_param(priority))
+        return
+    # SCHED_FIFO and struct sched_param {int sched_priority;} of linux
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if libc.sched_setscheduler(pid, 1, ctypes.byref(
+            ctypes.c_int(priority))) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
@@ -0,0 +1,455 @@
+import argparse
+import collections
+import csv
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+from controller import Ticker
+from disk import DiskStress
+from latency import LatencyProbe
+from memory import MemoryStress
+from network import NetworkStress
+from StressAuto import LimitedStress, stress_type_aliases
+
+PhaseResult = collections.namedtuple(
+    'PhaseResult', ('name', 'targets', 'seconds', 'loads', 'hook_exit',
+                    'hook_output', 'latency'))
+
+resource_factories = {'vm': MemoryStress, 'hdd': DiskStress,
+                      'net': NetworkStress}
+
+
+def load_statistics(values):
+    """
+    :param values: list of float
+    :return: tuple (mean, standard deviation), None without values
+    """
+    if not values:
+        return None
+    mean = sum(values) / len(values)
+    return mean, math.sqrt(sum((x - mean) ** 2 for x in values) /
+                           len(values))
+
+
+def read_scenario_file(path):
+    """
+    JSON, or TOML where the python has tomllib (3.11 and later)
+    :param path: str
+    :return: dict
+    :raise ValueError: malformed file, or TOML without tomllib
+    """
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError('TOML scenarios need python 3.11 or later, '
+                             'use JSON')
+        with open(path, 'rb') as scenario:
+            return tomllib.load(scenario)
+    with open(path) as scenario:
+        return json.load(scenario)
+
+
+class BatchPhase(object):
+    """
+        A plateau of the scenario: targets held for the duration, the
+        hook run once they settled
+    """
+
+    def __init__(self, name, targets, duration, hook=None):
+        """
+        :param name: str
+        :param targets: dict {stress type: limit}
+        :param duration: float seconds, longer if the hook runs longer
+        :param hook: str shell command, or None
+        """
+        self.name = name
+        self.targets = targets
+        self.duration = duration
+        self.hook = hook
+
+    @classmethod
+    def from_dict(cls, data, index, hook=None):
+        """
+        Targets are given as targets {type: limit}, or limit for cpu
+        :param data: dict
+        :param index: int position, names unnamed phases
+        :param hook: str default hook of the scenario
+        :return: BatchPhase
+        :raise ValueError: malformed phase
+        """
+        targets = dict(data.get('targets', {}))
+        if 'limit' in data:
+            targets['cpu'] = data['limit']
+        if not targets:
+            raise ValueError('Phase {0} has no targets'.format(index + 1))
+        for stype in list(targets):
+            if stype != 'cpu' and stype not in stress_type_aliases:
+                raise ValueError('No such stress type: {0}'.format(stype))
+            targets[stress_type_aliases.get(stype, stype)] = \
+                float(targets.pop(stype))
+        try:
+            duration = float(data['duration'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Phase {0} needs a duration in seconds'.format(
+                index + 1))
+        name = data.get('name', ', '.join(
+            '{0}={1:g}'.format(*x) for x in sorted(targets.items())))
+        return cls(name, targets, duration, data.get('hook', hook))
+
+
+class BatchScenario(object):
+    """
+        Phases run back to back on the same workers, from a scenario
+        file like:
+        {"settle": 10, "hook": "./latency.sh",
+         "settings": {"warm_workers": 4},
+         "resources": {"hdd": {"path": "/var/tmp/stress"}},
+         "phases": [{"limit": 20, "duration": 60},
+                    {"targets": {"cpu": 50, "vm": 60}, "duration": 60}],
+         "sweep": {"from": 10, "to": 90, "step": 10, "duration": 60},
+         "latency": {"interval": 1000, "priority": 80}}
+        A sweep appends one cpu phase per step, latency probes the wakeup
+        latency of every phase, waking every interval microseconds
+    """
+    settings = ('engine', 'limiter', 'load_target', 'measure', 'cpuset',
+                'warm_workers', 'control_period', 'tolerance',
+                'sample_interval')
+
+    def __init__(self, phases, settle=5.0, settings=None, resources=None,
+                 hook_timeout=None, latency=None):
+        """
+        :param phases: list of BatchPhase
+        :param settle: float seconds before a phase is measured and its
+        hook run
+        :param settings: dict of LimitedStress arguments in settings
+        :param resources: dict {stress type: dict of resource arguments}
+        :param hook_timeout: float seconds a hook may run, None for ever
+        :param latency: dict of the latency probe, interval microseconds,
+        priority and core, None not to probe
+        :raise ValueError: no phases, a phase shorter than the settling
+        or an unknown setting
+        """
+        if not phases:
+            raise ValueError('A scenario needs phases')
+        for phase in phases:
+            if phase.duration <= settle:
+                raise ValueError('Phase {0} ends before it settles'.format(
+                    phase.name))
+        unknown = sorted(set(settings or {}) - set(self.settings))
+        if unknown:
+            raise ValueError('Unknown settings: {0}'.format(
+                ', '.join(unknown)))
+        self.phases = phases
+        self.settle = settle
+        self.settings = dict(settings or {})
+        self.resources = dict(resources or {})
+        self.hook_timeout = hook_timeout
+        self.latency = latency
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        :param data: dict
+        :return: BatchScenario
+        :raise ValueError: malformed scenario
+        """
+        hook = data.get('hook')
+        phases = [BatchPhase.from_dict(x, index, hook)
+                  for index, x in enumerate(data.get('phases', ()))]
+        sweep = data.get('sweep')
+        if sweep:
+            try:
+                level, last, step = (float(sweep[x])
+                                     for x in ('from', 'to', 'step'))
+                duration = float(sweep['duration'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError('A sweep needs from, to, step and duration')
+            if step <= 0:
+                raise ValueError('The step of a sweep must be positive')
+            while level <= last + 1e-9:
+                phases.append(BatchPhase('cpu={0:g}'.format(level),
+                                         {'cpu': level}, duration,
+                                         sweep.get('hook', hook)))
+                level += step
+        return cls(phases, settle=float(data.get('settle', 5.0)),
+                   settings=data.get('settings'),
+                   resources=data.get('resources'),
+                   hook_timeout=data.get('hook_timeout'),
+                   latency=data.get('latency'))
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        :param path: str JSON or TOML file
+        :return: BatchScenario
+        :raise ValueError: malformed scenario
+        :raise IOError: unreadable file
+        """
+        return cls.from_dict(read_scenario_file(path))
+
+    @property
+    def stress_types(self):
+        """
+        :return: tuple of every stress type of the phases
+        """
+        return tuple(sorted(set(stype for phase in self.phases
+                                for stype in phase.targets)))
+
+    def setpoints(self, phase):
+        """
+        Types the phase leaves out are brought down to 0
+        :param phase: BatchPhase
+        :return: dict {stress type: limit}
+        """
+        return dict((stype, phase.targets.get(stype, 0.0))
+                    for stype in self.stress_types)
+
+    def build_resources(self):
+        """
+        :return: dict {stress type: resource} of the memory, disk and
+        network stress types
+        :raise ValueError: wrong resource arguments
+        """
+        resources = {}
+        for stype in self.stress_types:
+            if stype not in resource_factories:
+                continue
+            try:
+                resources[stype] = resource_factories[stype](
+                    **self.resources.get(stype, {}))
+            except TypeError as exc:
+                raise ValueError('Arguments of {0}: {1}'.format(stype, exc))
+        return resources
+
+    def build_latency_probe(self):
+        """
+        :return: LatencyProbe, or None when not probed
+        """
+        if self.latency is None:
+            return None
+        return LatencyProbe(float(self.latency.get('interval', 1000)) / 1e6,
+                            priority=self.latency.get('priority'),
+                            core=self.latency.get('core'))
+
+
+class BatchRunner(object):
+    """
+        Runs the phases of a scenario on a single LimitedStress, whose
+        loops move from one target to the next, so workers are reused
+        instead of restarted for every phase
+    """
+
+    def __init__(self, scenario, verbosity='print', tool_location=None):
+        """
+        :param scenario: BatchScenario
+        :param verbosity: str
+        :param tool_location: dict {tool: location}
+        :raise ValueError: wrong resource arguments
+        """
+        self.scenario = scenario
+        # the stress types of the scenario only pick the resource loops,
+        # from its targets, the stress workers load the cpu
+        self.stress = LimitedStress(
+            ('cpu',),
+            tool_location=tool_location if tool_location else {},
+            verbosity=verbosity,
+            targets=scenario.setpoints(scenario.phases[0]),
+            resources=scenario.build_resources(),
+            latency_probe=scenario.build_latency_probe(),
+            **scenario.settings)
+        self.results = []
+
+    def start_hook(self, phase, output):
+        """
+        :param phase: BatchPhase
+        :param output: file the hook writes to
+        :return: subprocess.Popen
+        """
+        environment = dict(os.environ)
+        environment['STRESSAUTO_PHASE'] = phase.name
+        for stype, limit in phase.targets.items():
+            environment['STRESSAUTO_{0}'.format(stype.upper())] = \
+                '{0:g}'.format(limit)
+        self.stress.dprint.debuglogprint('Running hook of {0}: {1}'.format(
+            phase.name, phase.hook))
+        return subprocess.Popen(phase.hook, shell=True, stdout=output,
+                                stderr=subprocess.STDOUT, env=environment)
+
+    def run_phase(self, phase, loops, ticker):
+        """
+        Hold the targets of the phase for its duration, and as long as
+        its hook runs; loads are measured once they settled
+        :param phase: BatchPhase
+        :param loops: dict {stress type: ControlLoop}
+        :param ticker: Ticker
+        :return: PhaseResult
+        """
+        self.stress.dprint.debuglogprint('Phase {0}'.format(phase.name),
+                                         level='WARNING')
+        measurements = dict((stype, []) for stype in loops)
+        probe = self.stress.latency_probe
+        hook = latency = None
+        start = ticker.clock()
+        setpoints = self.scenario.setpoints(phase)
+        output = tempfile.TemporaryFile()
+        try:
+            while True:
+                elapsed = ticker.clock() - start
+                settled = elapsed >= self.scenario.settle
+                if settled and probe and latency is None:
+                    latency = probe.snapshot()
+                if settled and phase.hook and hook is None:
+                    hook = self.start_hook(phase, output)
+                    hook_start = ticker.clock()
+                if hook and hook.poll() is None and \
+                        self.scenario.hook_timeout is not None and \
+                        ticker.clock() - hook_start > \
+                        self.scenario.hook_timeout:
+                    self.stress.dprint.debuglogprint(
+                        'Hook of {0} timed out'.format(phase.name),
+                        level='WARNING')
+                    hook.kill()
+                if elapsed >= phase.duration and \
+                        (hook is None or hook.poll() is not None):
+                    break
+                self.stress.multi_tick(loops, setpoints)
+                setpoints = None
+                if settled:
+                    for stype, loop in loops.items():
+                        measurements[stype].append(loop.measurement)
+                ticker.wait()
+        finally:
+            if hook and hook.poll() is None:
+                hook.kill()
+                hook.wait()
+        output.seek(0)
+        hook_output = output.read().decode('utf-8', 'replace').strip()
+        output.close()
+        if probe:
+            latency = probe.histogram(phase.name, latency)
+            probe.plateaus.append(latency)
+        return PhaseResult(
+            phase.name, phase.targets, ticker.clock() - start,
+            dict((stype, load_statistics(x))
+                 for stype, x in measurements.items()),
+            hook.returncode if hook else None, hook_output, latency)
+
+    def run(self):
+        """
+        :return: list of PhaseResult
+        """
+        stress = self.stress
+        ticker = Ticker(stress.control_period, clock=stress.clock,
+                        sleep=stress.sleep)
+        try:
+            if stress.latency_probe:
+                stress.latency_probe.start()
+            loops = stress.multi_loops()
+            ticker.start()
+            for phase in self.scenario.phases:
+                self.results.append(self.run_phase(phase, loops, ticker))
+        except OSError as exc:
+            stress.dprint.debuglogprint(str(exc), level='ERROR')
+            sys.exit(1)
+        finally:
+            stress.kill_everything()
+            stress.supervisor.stop()
+            stress.report_latency()
+        return self.results
+
+    def columns(self):
+        """
+        :return: list of str, target, mean and standard deviation of
+        every stress type
+        """
+        columns = sum((['{0} target'.format(x), '{0} mean'.format(x),
+                        '{0} sd'.format(x)]
+                       for x in self.scenario.stress_types), [])
+        if self.stress.latency_probe:
+            columns += ['p50 us', 'p99 us', 'p99.9 us', 'max us']
+        return columns
+
+    def rows(self):
+        """
+        :return: generator of lists of str, one per phase
+        """
+        for result in self.results:
+            row = [result.name, '{0:.1f}'.format(result.seconds)]
+            for stype in self.scenario.stress_types:
+                target = result.targets.get(stype, 0.0)
+                load = result.loads.get(stype)
+                row.extend(['{0:.1f}'.format(target)] +
+                           (['{0:.2f}'.format(x) for x in load] if load
+                            else ['', '']))
+            if self.stress.latency_probe:
+                latency = result.latency
+                row.extend(['{0:.0f}'.format(latency.percentile(x))
+                            if latency and latency.wakeups else ''
+                            for x in (50, 99, 99.9, 100)])
+            row.append('' if result.hook_exit is None
+                       else str(result.hook_exit))
+            yield row
+
+    def to_csv(self, path):
+        """
+        Every phase with the full output of its hook
+        :param path: str
+        """
+        with open(path, 'w') as output:
+            writer = csv.writer(output)
+            writer.writerow(['phase', 'seconds'] + self.columns() +
+                            ['hook exit', 'hook output'])
+            for row, result in zip(self.rows(), self.results):
+                writer.writerow(row + [result.hook_output])
+
+    def report(self):
+        """
+        :return: str table, with the last line the hook printed
+        """
+        header = ['phase', 'seconds'] + self.columns() + ['hook exit',
+                                                          'hook output']
+        rows = [row + [result.hook_output.splitlines()[-1]
+                       if result.hook_output else '']
+                for row, result in zip(self.rows(), self.results)]
+        widths = [max(len(x) for x in column)
+                  for column in zip(header, *rows)]
+        return '\n'.join('  '.join(x.ljust(width)
+                                   for x, width in zip(row, widths)).rstrip()
+                         for row in [header] + rows)
+
+
+def args_crafter():
+    parser = argparse.ArgumentParser(
+        prog='batch', description='Run the phases of a scenario file on '
+                                  'the same workers and tabulate the '
+                                  'measured load of every phase')
+    parser.add_argument('scenario', help='JSON, or TOML, scenario file')
+    parser.add_argument('-o', '--output', help='Write the results, with '
+                                               'the full hook output, to '
+                                               'this csv file',
+                        default=None)
+    parser.add_argument('-v', '--verbose', help='Verbosity of the run',
+                        default='print',
+                        choices=('print', 'log', 'all', 'debug'))
+    return parser
+
+
+if __name__ == '__main__':
+    parse = args_crafter()
+    args_parse = parse.parse_args()
+    try:
+        runner = BatchRunner(BatchScenario.from_file(args_parse.scenario),
+                             verbosity=args_parse.verbose)
+    except (ValueError, IOError, OSError) as exc:
+        parse.error(str(exc))
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        pass
+    print(runner.report())
+    if args_parse.output:
+        runner.to_csv(args_parse.output)
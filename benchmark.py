@@ -0,0 +1,436 @@
+import argparse
+import functools
+import itertools
+import math
+import multiprocessing
+import random
+import time
+from proc_stat import CpuLoad
+from controller import PidController
+from StressAuto import LimitedStress, Stress, CpuLimit
+
+
+class SimulationTimeout(Exception):
+    """
+        The simulated run went on longer than its scenario allows
+    """
+    pass
+
+
+class SimulatedPlant(object):
+    """
+        Model of how the cpu load of a host responds to the workers: the
+        load they generate reaches the measured load through a first order
+        lag, on top of a background load
+        Time only moves when the plant is advanced, so a run of minutes
+        simulates in well under a second
+    """
+    # beyond any pid_max, so a stray kill can never hit a real process
+    __first_pid__ = 1 << 30
+
+    def __init__(self, cpus=None, lag=1.0, background=None, step=0.05,
+                 max_time=600.0):
+        """
+        :param cpus: int, defaults to the cpus of the host, as the load
+        the controllers ask for is scaled by it
+        :param lag: float seconds, time constant of the load response
+        :param background: callable seconds -> percent of other load
+        :param step: float seconds of a simulation step
+        :param max_time: float seconds the plant may be advanced to
+        """
+        self.cpus = cpus if cpus else multiprocessing.cpu_count()
+        self.lag = lag
+        self.background = background if background else lambda now: 0.0
+        self.step = step
+        self.max_time = max_time
+        self.now = 0.0
+        self.load = self.background(0.0)
+        self.busy = 0.0
+        self.workers = {}
+        self.limits = {}
+        self.spawned_workers = 0
+        self.spawned_limiters = 0
+        self.trajectory = []
+        self.__pids__ = itertools.count(self.__first_pid__)
+
+    def clock(self):
+        """
+        :return: float simulated seconds
+        """
+        return self.now
+
+    def spawn(self):
+        """
+        :return: int pid of a new worker at a full core
+        """
+        pid = next(self.__pids__)
+        self.workers[pid] = 100.0
+        self.spawned_workers += 1
+        return pid
+
+    def limit(self, pid, limit):
+        """
+        :param pid: int
+        :param limit: float percent of a core
+        """
+        self.limits[pid] = limit
+        self.spawned_limiters += 1
+
+    def unlimit(self, pid):
+        self.limits.pop(pid, None)
+
+    def kill(self, pid):
+        self.workers.pop(pid, None)
+        self.limits.pop(pid, None)
+
+    @property
+    def demand(self):
+        """
+        :return: float cpu percent of the workers, 100 per full core
+        """
+        return sum(min(limit, self.limits.get(pid, limit))
+                   for pid, limit in self.workers.items())
+
+    def target(self):
+        """
+        :return: float host percent the load is heading to
+        """
+        return min(100.0, self.background(self.now) +
+                   self.demand / self.cpus)
+
+    def advance(self, seconds):
+        """
+        Also the sleep of the simulated run
+        :param seconds: float
+        :raise SimulationTimeout: advanced past max time
+        """
+        end = self.now + max(0.0, seconds)
+        while self.now < end:
+            delta = min(self.step, end - self.now)
+            self.load += (self.target() - self.load) * \
+                (1 - math.exp(-delta / self.lag))
+            self.now += delta
+            self.busy += self.load * delta
+            self.trajectory.append((self.now, self.load))
+        if self.now > self.max_time:
+            raise SimulationTimeout('Run did not finish in {0} seconds'
+                                    .format(self.max_time))
+
+
+class SimulatedProcStat(object):
+    """
+        ProcStat reading the plant: the load over the window since the
+        previous sample, with measurement noise
+    """
+
+    def __init__(self, plant, interval=0.1, noise=1.0, seed=0):
+        """
+        :param plant: SimulatedPlant
+        :param interval: float minimum window seconds
+        :param noise: float standard deviation percent
+        :param seed: int
+        """
+        self.plant = plant
+        self.interval = interval
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.last_load = None
+        self.__last_time__ = None
+        self.__last_busy__ = None
+
+    def reset(self):
+        self.__last_time__, self.__last_busy__ = self.plant.now, \
+            self.plant.busy
+
+    def sample(self):
+        if self.__last_time__ is None or \
+                self.plant.now - self.__last_time__ > 2 * self.interval:
+            self.reset()
+        self.plant.advance(self.interval -
+                           (self.plant.now - self.__last_time__))
+        load = (self.plant.busy - self.__last_busy__) / \
+            (self.plant.now - self.__last_time__)
+        load = min(100.0, max(0.0, load + self.random.gauss(0, self.noise)))
+        self.reset()
+        self.last_load = CpuLoad(load, dict(
+            (core, load) for core in range(self.plant.cpus)))
+        return self.last_load
+
+    def get_cpuload(self):
+        return self.sample().total
+
+
+class FakeProcess(object):
+    """
+        Stands in for the Popen of a tool
+    """
+
+    def __init__(self, pid, lines=(), on_kill=None):
+        """
+        :param pid: int
+        :param lines: iterable of str output of the tool
+        :param on_kill: callable
+        """
+        self.pid = pid
+        self.lines = list(lines)
+        self.on_kill = on_kill
+        self.stdout = self
+
+    def readline(self):
+        return self.lines.pop(0) if self.lines else ''
+
+    def kill(self):
+        if self.on_kill:
+            self.on_kill()
+
+
+class FakeStress(Stress):
+    """
+        stress that forks its workers in the plant
+    """
+
+    def __init__(self, plant, process_name='stress', location=None,
+                 switches=None):
+        Stress.__init__(self, process_name, location, switches)
+        self.plant = plant
+
+    def process_open(self, switches):
+        workers = int(switches[switches.index('-c') + 1]) \
+            if '-c' in switches else 1
+        pids = [self.plant.spawn() for _ in range(workers)]
+        self.__process__ = FakeProcess(
+            pids[0], ['stress: dbug: [{0}] forked\n'.format(x) for x in pids],
+            on_kill=lambda: [self.plant.kill(x) for x in pids])
+
+
+class FakeCpuLimit(CpuLimit):
+    """
+        cpulimit that limits a worker of the plant
+    """
+
+    def __init__(self, plant, process_name='cpulimit', location=None,
+                 switches=None):
+        CpuLimit.__init__(self, process_name, location, switches)
+        self.plant = plant
+
+    def process_open(self, switches):
+        pid = int(switches[switches.index('-p') + 1])
+        self.plant.limit(pid, float(switches[switches.index('-l') + 1]))
+        self.__process__ = FakeProcess(
+            pid, on_kill=lambda: self.plant.unlimit(pid))
+
+
+class SimulatedStress(LimitedStress):
+    """
+        LimitedStress on the plant: fake tools, simulated /proc/stat and
+        simulated time
+    """
+
+    def __init__(self, plant, noise=1.0, seed=0, **kwargs):
+        """
+        :param plant: SimulatedPlant
+        :param noise: float measurement noise percent
+        :param seed: int
+        :param kwargs: of LimitedStress
+        """
+        kwargs.setdefault('tool_location', {})
+        LimitedStress.__init__(self, **kwargs)
+        self.plant = plant
+        self.stress_tool = functools.partial(FakeStress, plant)
+        self.cpulimit_tool = functools.partial(FakeCpuLimit, plant)
+        self.clock, self.sleep = plant.clock, plant.advance
+        self.sampler = SimulatedProcStat(plant, self.sampler.interval,
+                                         noise=noise, seed=seed)
+
+    def watch_unit(self, unit):
+        # workers of the plant only exit when killed
+        pass
+
+    def kill_forked_processes(self):
+        for pid in self.get_stack():
+            self.plant.kill(int(pid))
+        del self.get_stack()[:]
+
+
+class Scenario(object):
+    """
+        Target and plant conditions a controller is benchmarked on
+    """
+
+    def __init__(self, name, limit, background=None, lag=1.0, noise=1.0,
+                 description=''):
+        """
+        :param name: str
+        :param limit: float target host percent
+        :param background: callable seconds -> percent of other load
+        :param lag: float seconds
+        :param noise: float measurement noise percent
+        :param description: str
+        """
+        self.name = name
+        self.limit = limit
+        self.background = background
+        self.lag = lag
+        self.noise = noise
+        self.description = description
+
+
+def noisy_background(level, amplitude, seed=0):
+    """
+    Background load wandering around the level
+    :param level: float percent
+    :param amplitude: float percent
+    :param seed: int
+    :return: callable seconds -> percent
+    """
+    phases = random.Random(seed)
+    periods = [(phases.uniform(3, 30), phases.uniform(0, 2 * math.pi))
+               for _ in range(4)]
+    return lambda now: max(0.0, level + amplitude / len(periods) * sum(
+        math.sin(2 * math.pi * now / period + phase)
+        for period, phase in periods))
+
+
+scenarios = (
+    Scenario('step', 60.0, description='Step from idle to 60'),
+    Scenario('ramp', 70.0, background=lambda now: min(30.0, now),
+             description='70 while the background ramps to 30 over 30s'),
+    Scenario('noisy', 60.0, background=noisy_background(20.0, 15.0),
+             noise=3.0, description='60 over a wandering background'),
+)
+
+
+class BenchmarkResult(object):
+    """
+        How a run tracked its target, from the load trajectory of the plant
+    """
+
+    def __init__(self, scenario, mode, plant, band=2.0, hold=20.0,
+                 finished=True, wall_time=0.0):
+        """
+        :param scenario: Scenario
+        :param mode: str
+        :param plant: SimulatedPlant after the run
+        :param band: float percent around the target counted as settled
+        :param hold: float seconds at the end the steady state error is
+        computed on
+        :param finished: bool the run ended by itself
+        :param wall_time: float seconds the simulation took
+        """
+        self.scenario = scenario
+        self.mode = mode
+        self.band = band
+        self.finished = finished
+        self.wall_time = wall_time
+        self.workers = plant.spawned_workers
+        self.limiters = plant.spawned_limiters
+        trajectory = plant.trajectory
+        limit = scenario.limit
+        self.duration = trajectory[-1][0] if trajectory else 0.0
+        self.settling_time = None
+        for now, load in reversed(trajectory):
+            if abs(load - limit) > band:
+                break
+            self.settling_time = now
+        self.overshoot = max([0.0] + [load - limit
+                                      for _, load in trajectory])
+        steady = [abs(load - limit) for now, load in trajectory
+                  if now >= self.duration - hold]
+        self.steady_state_error = sum(steady) / len(steady) if steady \
+            else None
+
+    @staticmethod
+    def header():
+        return '{0:<8} {1:<9} {2:>9} {3:>10} {4:>10} {5:>8} {6:>9}'.format(
+            'scenario', 'mode', 'settle s', 'overshoot', 'ss error',
+            'workers', 'limiters')
+
+    def row(self):
+        settling = 'never' if self.settling_time is None \
+            else '{0:.1f}'.format(self.settling_time)
+        steady = '-' if self.steady_state_error is None \
+            else '{0:.2f}'.format(self.steady_state_error)
+        return '{0:<8} {1:<9} {2:>9} {3:>10.2f} {4:>10} {5:>8} {6:>9}{7}'\
+            .format(self.scenario.name, self.mode, settling, self.overshoot,
+                    steady, self.workers, self.limiters,
+                    '' if self.finished else '  (timed out)')
+
+
+def run_scenario(scenario, mode='velocity', controller=None, hold_time=20.0,
+                 band=2.0, max_time=300.0, seed=0, **kwargs):
+    """
+    :param scenario: Scenario
+    :param mode: str velocity or pid
+    :param controller: PidController
+    :param hold_time: float seconds the target is held once reached
+    :param band: float percent
+    :param max_time: float simulated seconds a run may take
+    :param seed: int
+    :param kwargs: of LimitedStress
+    :return: BenchmarkResult
+    """
+    plant = SimulatedPlant(lag=scenario.lag, background=scenario.background,
+                           max_time=max_time + hold_time)
+    stress = SimulatedStress(plant, noise=scenario.noise, seed=seed,
+                             limit=scenario.limit, timeout=hold_time,
+                             mode=mode, tolerance=band,
+                             controller=controller.clone() if controller
+                             else None, verbosity='', **kwargs)
+    start = time.time()
+    finished = True
+    try:
+        stress.run()
+    except SimulationTimeout:
+        finished = False
+    return BenchmarkResult(scenario, mode, plant, band=band, hold=hold_time,
+                           finished=finished,
+                           wall_time=time.time() - start)
+
+
+def args_crafter():
+    parser = argparse.ArgumentParser(
+        prog='benchmark', description='Benchmark the controllers of '
+                                      'StressAuto on a simulated cpu')
+    parser.add_argument('-m', '--mode', help='Controllers to benchmark',
+                        choices=LimitedStress.modes, nargs='+',
+                        default=list(LimitedStress.modes))
+    parser.add_argument('-sc', '--scenario', help='Scenarios to run',
+                        choices=[x.name for x in scenarios], nargs='+',
+                        default=[x.name for x in scenarios])
+    parser.add_argument('-kp', help='Proportional gain', default=0.4,
+                        type=float)
+    parser.add_argument('-ki', help='Integral gain', default=0.8, type=float)
+    parser.add_argument('-kd', help='Derivative gain', default=0.0,
+                        type=float)
+    parser.add_argument('-p', '--period', help='Control period in seconds',
+                        default=0.5, type=float)
+    parser.add_argument('-hd', '--hold', help='Seconds the target is held '
+                                              'once reached',
+                        default=20.0, type=float)
+    parser.add_argument('-b', '--band', help='Percent around the target '
+                                             'counted as settled',
+                        default=2.0, type=float)
+    parser.add_argument('-hl', '--hold-control',
+                        help='Keep controlling while holding the target',
+                        action='store_true', dest='hold_control')
+    parser.add_argument('-s', '--seed', help='Seed of the noise',
+                        default=0, type=int)
+    return parser
+
+
+if __name__ == '__main__':
+    args_parse = args_crafter().parse_args()
+    controller = PidController(kp=args_parse.kp, ki=args_parse.ki,
+                               kd=args_parse.kd)
+    print(BenchmarkResult.header())
+    for scenario in scenarios:
+        if scenario.name not in args_parse.scenario:
+            continue
+        for mode in args_parse.mode:
+            result = run_scenario(scenario, mode=mode, controller=controller,
+                                  hold_time=args_parse.hold,
+                                  band=args_parse.band,
+                                  seed=args_parse.seed,
+                                  control_period=args_parse.period,
+                                  hold=args_parse.hold_control)
+            print(result.row())
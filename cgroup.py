@@ -0,0 +1,472 @@
+import errno
+import multiprocessing
+import os
+import time
+from proc_stat import CpuLoad
+
+PROC_MOUNTS = '/proc/self/mounts'
+PROC_CGROUP = '/proc/self/cgroup'
+
+
+def write_value(path, value):
+    """
+    :param path: str
+    :param value: str
+    """
+    with open(path, 'w') as target:
+        target.write(value)
+
+
+def cgroup2_mount(mounts=PROC_MOUNTS):
+    """
+    Mount point of the cgroup v2 hierarchy
+    :param mounts: str
+    :return: str or None
+    """
+    with open(mounts) as mount_table:
+        for line in mount_table:
+            fields = line.split()
+            if len(fields) > 2 and fields[2] == 'cgroup2':
+                return fields[1]
+    return None
+
+
+def own_cgroup(cgroup_file=PROC_CGROUP):
+    """
+    Path of the cgroup v2 this process belongs to, relative to the mount
+    :param cgroup_file: str
+    :return: str or None
+    """
+    with open(cgroup_file) as cgroups:
+        for line in cgroups:
+            if line.startswith('0::'):
+                return line.strip()[3:]
+    return None
+
+
+def cgroup1_mount(controller, mounts=PROC_MOUNTS):
+    """
+    Mount point of the cgroup v1 hierarchy of a controller
+    :param controller: str e.g. cpu or cpuacct
+    :param mounts: str
+    :return: str or None
+    """
+    with open(mounts) as mount_table:
+        for line in mount_table:
+            fields = line.split()
+            if len(fields) > 3 and fields[2] == 'cgroup' and \
+                    controller in fields[3].split(','):
+                return fields[1]
+    return None
+
+
+def own_cgroup1(controller, cgroup_file=PROC_CGROUP):
+    """
+    Path of the cgroup v1 of a controller this process belongs to
+    :param controller: str
+    :param cgroup_file: str
+    :return: str or None
+    """
+    with open(cgroup_file) as cgroups:
+        for line in cgroups:
+            fields = line.strip().split(':', 2)
+            if len(fields) == 3 and controller in fields[1].split(','):
+                return fields[2]
+    return None
+
+
+def read_value(path):
+    """
+    :param path: str
+    :return: str or None if the file does not exist
+    """
+    try:
+        with open(path) as source:
+            return source.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def allowed_cpus():
+    """
+    :return: int cpus this process may run on
+    """
+    getaffinity = getattr(os, 'sched_getaffinity', None)
+    return len(getaffinity(0)) if getaffinity else \
+        multiprocessing.cpu_count()
+
+
+class CgroupCpu(object):
+    """
+        Cpu load of the cgroup of this process, in percent of its quota
+        Stands in for ProcStat where the host is not what the load is
+        limited by, e.g. in a container: 50 is half the quota, whatever
+        the cpus of the node
+        Reads cpu.stat and cpu.max on cgroup v2, cpuacct.usage and the
+        cfs quota on v1, the quota is the lowest one up to the root
+    """
+    __interval__ = 0.1
+
+    def __init__(self, usage_path, usage_scale, quota=None,
+                 interval=__interval__):
+        """
+        :param usage_path: str cpu.stat (v2) or cpuacct.usage (v1)
+        :param usage_scale: float seconds of a usage unit
+        :param quota: float cores, None for no quota
+        :param interval: float minimum window seconds
+        """
+        self.usage_path = usage_path
+        self.usage_scale = usage_scale
+        self.quota = quota
+        self.cores = min(quota, allowed_cpus()) if quota else allowed_cpus()
+        self.interval = interval
+        self.__last_usage__ = None
+        self.__last_time__ = None
+        self.__last_load__ = None
+
+    @classmethod
+    def detect(cls, interval=__interval__, mounts=PROC_MOUNTS,
+               cgroup_file=PROC_CGROUP):
+        """
+        The cgroup of this process, v1 where the cpu controllers are
+        mounted and it is in their hierarchy, as in hybrid hierarchies,
+        v2 otherwise
+        :param interval: float
+        :param mounts: str
+        :param cgroup_file: str
+        :return: CgroupCpu or None if there is none
+        """
+        cpu, cpuacct = cgroup1_mount('cpu', mounts), \
+            cgroup1_mount('cpuacct', mounts)
+        own_cpu, own_cpuacct = own_cgroup1('cpu', cgroup_file), \
+            own_cgroup1('cpuacct', cgroup_file)
+        if cpu and cpuacct and own_cpu is not None and \
+                own_cpuacct is not None:
+            usage = os.path.join(cpuacct, own_cpuacct.lstrip('/'),
+                                 'cpuacct.usage')
+            return cls(usage, 1e-9, interval=interval, quota=cls.lowest_quota(
+                cpu, own_cpu, cls.cfs_quota))
+        mount, own = cgroup2_mount(mounts), own_cgroup(cgroup_file)
+        if mount is None or own is None:
+            return None
+        usage = os.path.join(mount, own.lstrip('/'), 'cpu.stat')
+        return cls(usage, 1e-6, interval=interval, quota=cls.lowest_quota(
+            mount, own, cls.cpu_max))
+
+    @staticmethod
+    def cfs_quota(path):
+        """
+        :param path: str cgroup v1 directory
+        :return: float cores or None
+        """
+        quota = read_value(os.path.join(path, 'cpu.cfs_quota_us'))
+        period = read_value(os.path.join(path, 'cpu.cfs_period_us'))
+        if quota is None or period is None or int(quota) < 0:
+            return None
+        return float(quota) / int(period)
+
+    @staticmethod
+    def cpu_max(path):
+        """
+        :param path: str cgroup v2 directory
+        :return: float cores or None
+        """
+        value = read_value(os.path.join(path, 'cpu.max'))
+        if not value or value.split()[0] == 'max':
+            return None
+        quota, period = value.split()
+        return float(quota) / int(period)
+
+    @staticmethod
+    def lowest_quota(mount, own, quota_of):
+        """
+        :param mount: str
+        :param own: str cgroup path relative to the mount
+        :param quota_of: callable directory -> cores or None
+        :return: float cores or None
+        """
+        quotas = []
+        path = own.strip('/')
+        while True:
+            quota = quota_of(os.path.join(mount, path))
+            if quota:
+                quotas.append(quota)
+            if not path:
+                break
+            path = os.path.dirname(path)
+        return min(quotas) if quotas else None
+
+    @property
+    def interval(self):
+        """
+        :return: float
+        """
+        return self.__interval__
+
+    @interval.setter
+    def interval(self, value):
+        """
+        :param value: float
+        :raise ValueError: if interval is not positive
+        """
+        if value <= 0:
+            raise ValueError('Sampling interval must be positive!')
+        self.__interval__ = float(value)
+
+    @property
+    def last_load(self):
+        """
+        :return: CpuLoad or None
+        """
+        return self.__last_load__
+
+    def read_usage(self):
+        """
+        :return: float cpu seconds used by the cgroup
+        """
+        with open(self.usage_path) as usage:
+            if self.usage_path.endswith('cpu.stat'):
+                fields = dict(x.split() for x in usage if x.strip())
+                return int(fields['usage_usec']) * self.usage_scale
+            return int(usage.read()) * self.usage_scale
+
+    def reset(self):
+        self.__last_usage__ = self.read_usage()
+        self.__last_time__ = time.time()
+
+    def sample(self):
+        """
+        Load over the window since the previous reading, windows are
+        kept as ProcStat keeps them
+        There is no per core split of cgroup usage
+        :return: CpuLoad
+        """
+        now = time.time()
+        if self.__last_time__ is None or \
+                now - self.__last_time__ > 2 * self.interval:
+            self.reset()
+            now = self.__last_time__
+        remaining = self.interval - (now - self.__last_time__)
+        if remaining > 0:
+            time.sleep(remaining)
+        usage, last_time = self.__last_usage__, self.__last_time__
+        self.reset()
+        elapsed = self.__last_time__ - last_time
+        load = 100.0 * (self.__last_usage__ - usage) / elapsed / self.cores \
+            if elapsed > 0 else 0.0
+        self.__last_load__ = CpuLoad(load, {})
+        return self.__last_load__
+
+    def get_cpuload(self):
+        """
+        Percent of the quota used
+        :return: float
+        """
+        return self.sample().total
+
+
+class CgroupLimit(object):
+    """
+        Transient cgroup v2 holding every stress worker
+        The kernel enforces cpu.max on all of them at once, so no cpulimit
+        process has to poll and signal each worker
+        Only leaf cgroups may hold processes once a controller is enabled
+        for the children of a cgroup, so when the cgroup of this process
+        holds processes, e.g. a user session or a container, they are
+        moved into a leaf of their own first, next to the one of the
+        workers, and moved back once it is removed
+    """
+    __period__ = 100000
+    # seconds the killed workers are waited for to leave the cgroup
+    __removal_timeout__ = 2.0
+    control_name = 'stressauto-ctl'
+    # filesystem calls, replaced by the tests
+    write = staticmethod(write_value)
+    rmdir = staticmethod(os.rmdir)
+    sleep = staticmethod(time.sleep)
+
+    def __init__(self, name=None, cpuset=None, period=__period__):
+        """
+        :param name: str cgroup directory name
+        :param cpuset: str cpus the workers may run on, e.g. '0-3'
+        :param period: int cpu.max period in microseconds
+        """
+        self.name = name if name else 'stressauto-{0}'.format(os.getpid())
+        self.cpuset = cpuset
+        self.period = period
+        self.path = None
+        self.parent = None
+        # leaf the processes of the parent were moved to, if they were
+        self.control = None
+        # controllers enabled for the children of the parent by create
+        self.enabled = ()
+        self.__limit__ = 0
+
+    @property
+    def limit(self):
+        """
+        :return: float cpu percent, 100 per full core
+        """
+        return self.__limit__
+
+    @staticmethod
+    def own_path():
+        """
+        :return: str directory of the cgroup v2 of this process
+        :raise OSError: cgroup v2 is not mounted
+        """
+        mount, own = cgroup2_mount(), own_cgroup()
+        if mount is None or own is None:
+            raise OSError('cgroup v2 is not mounted')
+        return os.path.join(mount, own.lstrip('/'))
+
+    @staticmethod
+    def procs(path):
+        """
+        :param path: str cgroup directory
+        :return: list of str pids of the processes in the cgroup
+        """
+        return (read_value(os.path.join(path, 'cgroup.procs')) or '').split()
+
+    def move_processes(self, source, destination):
+        """
+        Processes that exit meanwhile or can not be moved, like kernel
+        threads, are left behind
+        :param source: str cgroup directory
+        :param destination: str cgroup directory
+        """
+        for pid in self.procs(source):
+            try:
+                self.write(os.path.join(destination, 'cgroup.procs'), pid)
+            except (IOError, OSError):
+                pass
+
+    def enable_controllers(self, controllers):
+        """
+        :param controllers: tuple of str
+        :raise IOError: the cgroup holds processes (EBUSY) or is not
+        writable
+        """
+        enabled = (read_value(os.path.join(
+            self.parent, 'cgroup.subtree_control')) or '').split()
+        missing = tuple(x for x in controllers if x not in enabled)
+        if missing:
+            self.write(os.path.join(self.parent, 'cgroup.subtree_control'),
+                       ' '.join('+' + x for x in missing))
+        self.enabled = missing
+
+    def create(self):
+        """
+        Create the cgroup under the one of this process
+        :raise OSError: cgroup v2 is not available or not writable
+        """
+        controllers = ('cpu', 'cpuset') if self.cpuset else ('cpu',)
+        try:
+            self.parent = self.own_path()
+            try:
+                self.enable_controllers(controllers)
+            except (IOError, OSError) as exc:
+                if exc.errno != errno.EBUSY:
+                    raise
+                self.control = os.path.join(self.parent, self.control_name)
+                os.mkdir(self.control)
+                self.move_processes(self.parent, self.control)
+                self.enable_controllers(controllers)
+            path = os.path.join(self.parent, self.name)
+            os.mkdir(path)
+            self.path = path
+            if self.cpuset:
+                self.write(os.path.join(path, 'cpuset.cpus'), self.cpuset)
+        except (IOError, OSError) as exc:
+            try:
+                self.remove()
+            except OSError:
+                pass
+            raise OSError('cgroup v2 cpu controller is not writable: '
+                          '{0}'.format(exc))
+        self.set_limit(0)
+
+    def add_pid(self, pid):
+        """
+        :param pid: int or str
+        """
+        self.write(os.path.join(self.path, 'cgroup.procs'), str(pid))
+
+    def pids(self):
+        """
+        :return: tuple of str
+        """
+        return tuple(self.procs(self.path))
+
+    def set_limit(self, limit):
+        """
+        Quota for the whole cgroup, at least 1% of a core
+        :param limit: float cpu percent, 100 per full core
+        """
+        if limit >= 100 * multiprocessing.cpu_count():
+            quota = 'max'
+        else:
+            quota = str(max(1000, int(limit * self.period / 100.0)))
+        self.write(os.path.join(self.path, 'cpu.max'),
+                   '{0} {1}'.format(quota, self.period))
+        self.__limit__ = limit
+
+    def stat(self):
+        """
+        :return: dict of cpu.stat counters
+        """
+        with open(os.path.join(self.path, 'cpu.stat')) as stat:
+            return dict((x.split()[0], int(x.split()[1])) for x in stat)
+
+    def populated(self, path):
+        """
+        :param path: str cgroup directory
+        :return: bool whether a process is still in the cgroup
+        """
+        events = read_value(os.path.join(path, 'cgroup.events')) or ''
+        return 'populated 1' in events
+
+    def remove_directory(self, path):
+        """
+        Killed processes leave the cgroup asynchronously, so it is waited
+        for to be empty
+        :param path: str cgroup directory
+        :raise OSError: it is still busy after the removal timeout
+        """
+        deadline = time.time() + self.__removal_timeout__
+        while True:
+            if not self.populated(path):
+                try:
+                    self.rmdir(path)
+                    return
+                except OSError as exc:
+                    if exc.errno == errno.ENOENT:
+                        return
+                    if exc.errno != errno.EBUSY or time.time() > deadline:
+                        raise
+            elif time.time() > deadline:
+                raise OSError(errno.EBUSY, 'cgroup {0} still has processes'
+                              .format(path))
+            self.sleep(0.01)
+
+    def remove(self):
+        """
+        Remove the cgroup, once its killed workers are gone, and put the
+        processes moved aside back where they were
+        :raise OSError: a cgroup could not be removed
+        """
+        try:
+            if self.path:
+                self.remove_directory(self.path)
+                self.path = None
+            if self.enabled:
+                self.write(os.path.join(self.parent,
+                                        'cgroup.subtree_control'),
+                           ' '.join('-' + x for x in self.enabled))
+                self.enabled = ()
+            if self.control:
+                self.move_processes(self.control, self.parent)
+                self.remove_directory(self.control)
+                self.control = None
+        except (IOError, OSError) as exc:
+            raise OSError('cgroup could not be removed: {0}'.format(exc))
@@ -0,0 +1,595 @@
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+try:
+    import Queue as queue
+    import SocketServer as socketserver
+except ImportError:
+    import queue
+    import socketserver
+from metrics import MetricsRecorder
+from profiles import parse_profile
+from StressAuto import LimitedStress
+
+AGENT_PORT = 9465
+
+
+class AgentError(Exception):
+    """
+        Error reported by an agent, or a broken connection to it
+    """
+
+
+def send_message(connection, message):
+    """
+    Messages are json objects, one per line
+    :param connection: socket.socket
+    :param message: dict
+    """
+    connection.sendall((json.dumps(message) + '\n').encode('utf-8'))
+
+
+def read_message(stream):
+    """
+    :param stream: binary file of the connection
+    :return: dict, or None once the connection is closed
+    :raise ValueError: the line is not a json object
+    """
+    line = stream.readline()
+    if not line:
+        return None
+    message = json.loads(line.decode('utf-8'))
+    if not isinstance(message, dict):
+        raise ValueError('Messages must be json objects!')
+    return message
+
+
+def parse_address(address):
+    """
+    :param address: str HOST:PORT, or HOST on the default agent port
+    :return: tuple (str, int)
+    :raise ValueError: malformed port
+    """
+    host, _, port = address.rpartition(':')
+    if not host:
+        return port, AGENT_PORT
+    try:
+        return host, int(port)
+    except ValueError:
+        raise ValueError('Malformed agent address: {0}'.format(address))
+
+
+class AgentHandler(socketserver.StreamRequestHandler):
+    """
+        A coordinator connection, one request and its response per line
+    """
+
+    def handle(self):
+        while True:
+            try:
+                message = read_message(self.rfile)
+            except ValueError as exc:
+                send_message(self.request, {'ok': False, 'error': str(exc)})
+                continue
+            if message is None:
+                return
+            send_message(self.request, self.server.agent.handle(message))
+
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class StressAgent(object):
+    """
+        Runs LimitedStress for a coordinator
+        The protocol is served on daemon threads and the runs on the
+        thread calling serve_forever, so a run is interrupted as from the
+        command line, and cleans up the same way
+        Runs keep their samples until the next prepare, to be collected
+        after they finish
+    """
+    settings = ('stress_types', 'limit', 'timeout', 'mode', 'engine',
+                'limiter', 'control_period', 'tolerance', 'sample_interval',
+                'hold', 'load_target', 'measure', 'warm_workers', 'profile')
+    # an hour of samples at 10 Hz
+    __capacity__ = 36000
+
+    def __init__(self, port=AGENT_PORT, address='127.0.0.1',
+                 verbosity='print', tool_location=None,
+                 stress_factory=LimitedStress):
+        """
+        :param port: int, 0 binds any free port
+        :param address: str, 0.0.0.0 to be reached from other hosts
+        :param verbosity: str of the runs
+        :param tool_location: dict {tool: location}
+        :param stress_factory: callable building the LimitedStress
+        """
+        self.port = port
+        self.address = address
+        self.verbosity = verbosity
+        self.tool_location = tool_location if tool_location else {}
+        self.stress_factory = stress_factory
+        self.stress = None
+        self.state = 'idle'
+        self.error = None
+        self.__starts__ = queue.Queue()
+        self.__stopping__ = False
+        self.__lock__ = threading.Lock()
+        self.__server__ = None
+
+    def handle(self, message):
+        """
+        :param message: dict request, its command and arguments
+        :return: dict response, ok or the error
+        """
+        handlers = {'status': self.status, 'prepare': self.prepare,
+                    'start': self.start, 'samples': self.samples,
+                    'stop': self.stop}
+        command = message.pop('command', None)
+        if command not in handlers:
+            return {'ok': False,
+                    'error': 'This command is not supported!'}
+        try:
+            response = handlers[command](**message)
+        except (TypeError, ValueError, NotImplementedError, AgentError,
+                IOError, OSError) as exc:
+            return {'ok': False, 'error': str(exc)}
+        response['ok'] = True
+        return response
+
+    def status(self):
+        """
+        :return: dict, with the time of the agent for clock offsets
+        """
+        return {'host': socket.gethostname(),
+                'cores': multiprocessing.cpu_count(), 'time': time.time(),
+                'state': self.state, 'error': self.error}
+
+    def prepare(self, settings):
+        """
+        :param settings: dict of LimitedStress arguments in settings,
+        the profile as its command line spec
+        :raise ValueError: unknown setting or malformed profile
+        :raise AgentError: a run is in progress
+        """
+        unknown = sorted(set(settings) - set(self.settings))
+        if unknown:
+            raise ValueError('Unknown settings: {0}'.format(
+                ', '.join(unknown)))
+        settings = dict(settings)
+        settings['stress_types'] = tuple(settings.get('stress_types',
+                                                      ('cpu',)))
+        if settings.get('profile'):
+            settings['profile'] = parse_profile(settings['profile'])
+        with self.__lock__:
+            if self.state in ('waiting', 'running'):
+                raise AgentError('A run is in progress')
+            self.stress = self.stress_factory(
+                tool_location=self.tool_location, verbosity=self.verbosity,
+                metrics=MetricsRecorder(capacity=self.__capacity__,
+                                        cores=multiprocessing.cpu_count()),
+                **settings)
+            self.state, self.error = 'prepared', None
+        return {}
+
+    def start(self, at):
+        """
+        :param at: float time of the agent to start the run at
+        :raise AgentError: no run is prepared
+        """
+        with self.__lock__:
+            if self.state != 'prepared':
+                raise AgentError('No run is prepared')
+            self.state = 'waiting'
+        self.__starts__.put(at)
+        return {}
+
+    def samples(self, since=0.0):
+        """
+        :param since: float time of the agent
+        :return: dict, samples newer than since as lists of timestamp,
+        setpoint, load, workers and limit
+        """
+        stress = self.stress
+        if not stress:
+            return {'samples': []}
+        return {'samples': [
+            [x.timestamp, x.setpoint, x.load, x.workers, x.limit]
+            for x in stress.metrics.since(since)]}
+
+    def stop(self):
+        """
+        Cancel a waiting run, interrupt a running one
+        """
+        with self.__lock__:
+            if self.state == 'waiting':
+                self.state = 'prepared'
+            elif self.state == 'running' and not self.__stopping__:
+                self.__stopping__ = True
+                os.kill(os.getpid(), signal.SIGINT)
+        return {}
+
+    def run_next(self, wait=0.5):
+        """
+        Run the next started run once its start time comes
+        :param wait: float seconds to wait for a start
+        """
+        try:
+            at = self.__starts__.get(timeout=wait)
+        except queue.Empty:
+            return
+        while self.state == 'waiting' and time.time() < at:
+            time.sleep(min(0.05, max(0.0, at - time.time())))
+        with self.__lock__:
+            if self.state != 'waiting':
+                return
+            self.state = 'running'
+        try:
+            self.stress.run()
+        except SystemExit:
+            # LimitedStress has logged why
+            self.error = 'The run failed'
+        finally:
+            with self.__lock__:
+                self.state = 'finished'
+
+    def start_server(self):
+        """
+        :return: tuple (address, port) bound
+        :raise socket.error: the port can not be bound
+        """
+        self.__server__ = AgentServer((self.address, self.port),
+                                      AgentHandler)
+        self.__server__.agent = self
+        thread = threading.Thread(target=self.__server__.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.__server__.server_address
+
+    def stop_server(self):
+        self.__server__.shutdown()
+        self.__server__.server_close()
+
+    def serve_forever(self):
+        """
+        Serve coordinators until interrupted, other than by a stop
+        """
+        # a stop interrupts the run as ctrl-c would, even when started in
+        # the background, where SIGINT is ignored
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        try:
+            while True:
+                try:
+                    self.run_next()
+                except KeyboardInterrupt:
+                    if not self.__stopping__:
+                        raise
+                finally:
+                    if self.state != 'running':
+                        self.__stopping__ = False
+        finally:
+            self.stop_server()
+
+
+class AgentClient(object):
+    """
+        Connection of the coordinator to an agent
+    """
+
+    def __init__(self, address, timeout=10.0):
+        """
+        :param address: str HOST:PORT
+        :param timeout: float seconds of connecting and every request
+        :raise socket.error: the agent can not be reached
+        """
+        host, port = parse_address(address)
+        self.address = '{0}:{1}'.format(host, port)
+        self.host = host
+        self.offset = 0.0
+        self.__connection__ = socket.create_connection((host, port),
+                                                       timeout)
+        self.__stream__ = self.__connection__.makefile('rb')
+
+    def request(self, command, **arguments):
+        """
+        :param command: str
+        :param arguments: of the command
+        :return: dict response
+        :raise AgentError: the agent failed the request or closed
+        """
+        arguments['command'] = command
+        send_message(self.__connection__, arguments)
+        response = read_message(self.__stream__)
+        if response is None:
+            raise AgentError('{0} closed the connection'.format(
+                self.address))
+        if not response.pop('ok', False):
+            raise AgentError('{0}: {1}'.format(self.address,
+                                               response.get('error')))
+        return response
+
+    def synchronise(self):
+        """
+        Estimate the offset of the clock of the agent from the round
+        trip of a status request, as in Cristian's algorithm
+        :return: dict status
+        """
+        sent = time.time()
+        status = self.request('status')
+        received = time.time()
+        self.offset = status['time'] - (sent + received) / 2.0
+        self.host = status['host']
+        return status
+
+    def close(self):
+        self.__stream__.close()
+        self.__connection__.close()
+
+
+class Coordinator(object):
+    """
+        Drives the agents of several hosts: pushes their settings,
+        starts them together and merges their samples on the clock of
+        the coordinator
+    """
+    __finished__ = ('idle', 'finished')
+
+    def __init__(self, addresses, timeout=10.0):
+        """
+        :param addresses: iterable of str HOST:PORT
+        :param timeout: float seconds of every request
+        :raise socket.error: an agent can not be reached
+        """
+        self.agents = [AgentClient(x, timeout) for x in addresses]
+        self.samples = dict((x.address, []) for x in self.agents)
+        self.__since__ = dict((x.address, 0.0) for x in self.agents)
+
+    def prepare(self, settings, overrides=None):
+        """
+        :param settings: dict of StressAgent.settings for every agent
+        :param overrides: dict {address: dict of settings of the agent}
+        :raise AgentError: an agent refused them
+        """
+        overrides = overrides if overrides else {}
+        for agent in self.agents:
+            agent_settings = dict(settings)
+            agent_settings.update(overrides.get(agent.address, {}))
+            agent.request('prepare', settings=agent_settings)
+
+    def start(self, delay=2.0):
+        """
+        Start every agent at the same time, each on its own clock
+        :param delay: float seconds for the start to reach every agent
+        :return: float start time of the coordinator
+        """
+        for agent in self.agents:
+            agent.synchronise()
+        at = time.time() + delay
+        for agent in self.agents:
+            agent.request('start', at=at + agent.offset)
+        return at
+
+    def collect(self):
+        """
+        Fetch the samples of every agent since the last collect
+        :return: dict {address: list of new samples}, samples as tuples
+        timestamp on the coordinator clock, setpoint, load, workers, limit
+        """
+        collected = {}
+        for agent in self.agents:
+            samples = agent.request(
+                'samples', since=self.__since__[agent.address])['samples']
+            if samples:
+                self.__since__[agent.address] = samples[-1][0]
+            collected[agent.address] = [
+                (x[0] - agent.offset,) + tuple(x[1:]) for x in samples]
+            self.samples[agent.address].extend(collected[agent.address])
+        return collected
+
+    def states(self):
+        """
+        :return: dict {address: str state}
+        """
+        return dict((x.address, x.request('status')['state'])
+                    for x in self.agents)
+
+    @property
+    def finished(self):
+        return all(x in self.__finished__ for x in self.states().values())
+
+    def stop(self):
+        for agent in self.agents:
+            agent.request('stop')
+
+    def latest(self):
+        """
+        :return: dict {address: latest load or None}
+        """
+        return dict((address, samples[-1][2] if samples else None)
+                    for address, samples in self.samples.items())
+
+    def aggregate(self, period=1.0):
+        """
+        Loads of every agent averaged over buckets of the period
+        :param period: float seconds
+        :return: list of tuples (bucket start, {address: load}, mean load)
+        """
+        buckets = {}
+        for address, samples in self.samples.items():
+            for sample in samples:
+                bucket = buckets.setdefault(
+                    int(sample[0] // period), {}).setdefault(address, [])
+                bucket.append(sample[2])
+        rows = []
+        for bucket in sorted(buckets):
+            loads = dict((address, sum(x) / len(x))
+                         for address, x in buckets[bucket].items())
+            rows.append((bucket * period, loads,
+                         sum(loads.values()) / len(loads)))
+        return rows
+
+    def to_csv(self, path, period=1.0):
+        """
+        :param path: str
+        :param period: float seconds of a row
+        """
+        addresses = [x.address for x in self.agents]
+        with open(path, 'w') as output:
+            output.write(','.join(['timestamp'] + addresses + ['mean']) +
+                         '\n')
+            for timestamp, loads, mean in self.aggregate(period):
+                output.write(','.join(
+                    ['{0:.3f}'.format(timestamp)] +
+                    ['{0:.2f}'.format(loads[x]) if x in loads else ''
+                     for x in addresses] + ['{0:.2f}'.format(mean)]) + '\n')
+
+    def close(self):
+        for agent in self.agents:
+            agent.close()
+
+
+def coordinate(coordinator, period=1.0, delay=2.0):
+    """
+    Start the agents and print their latest loads every period until
+    they all finish, or stop them when interrupted
+    :param coordinator: Coordinator
+    :param period: float seconds
+    :param delay: float seconds before the start
+    """
+    start = coordinator.start(delay)
+    try:
+        while time.time() < start or not coordinator.finished:
+            time.sleep(period)
+            coordinator.collect()
+            loads = coordinator.latest()
+            known = [x for x in loads.values() if x is not None]
+            print('{0:7.1f}s  {1}  mean {2}'.format(
+                time.time() - start, '  '.join(
+                    '{0} {1}'.format(address, '-' if load is None
+                                     else '{0:.1f}'.format(load))
+                    for address, load in sorted(loads.items())),
+                '{0:.1f}'.format(sum(known) / len(known)) if known else '-'))
+    except KeyboardInterrupt:
+        coordinator.stop()
+    coordinator.collect()
+
+
+def setpoint_crafter(parser, specs):
+    """
+    :param parser: argparse.ArgumentParser
+    :param specs: list of str HOST:PORT=LIMIT
+    :return: dict {address: float limit}
+    """
+    limits = {}
+    for spec in specs or ():
+        address, _, limit = spec.rpartition('=')
+        try:
+            host, port = parse_address(address)
+            limits['{0}:{1}'.format(host, port)] = float(limit)
+        except ValueError:
+            parser.error('Malformed setpoint: {0}'.format(spec))
+    return limits
+
+
+def args_crafter():
+    parser = argparse.ArgumentParser(
+        prog='cluster', description='Stress several hosts together: an '
+                                    'agent on every host, driven by one '
+                                    'coordinator')
+    commands = parser.add_subparsers(dest='command')
+    agent = commands.add_parser('agent', help='Run LimitedStress for a '
+                                              'coordinator')
+    agent.add_argument('-p', '--port', help='Port to listen on',
+                       default=AGENT_PORT, type=int)
+    agent.add_argument('-a', '--address', help='Address to listen on, '
+                                               '0.0.0.0 for every host',
+                       default='127.0.0.1')
+    agent.add_argument('-v', '--verbose', help='Verbosity of the runs',
+                       default='print', choices=('print', 'log', 'debug'))
+    coordinator = commands.add_parser('coordinator',
+                                      help='Start agents together and '
+                                           'merge their samples')
+    coordinator.add_argument('-ag', '--agent', help='HOST:PORT of an agent '
+                                                    '(repeatable)',
+                             action='append', required=True)
+    coordinator.add_argument('-l', '--limit', help='Load of every agent',
+                             default=None, type=float)
+    coordinator.add_argument('-sp', '--setpoint',
+                             help='HOST:PORT=LIMIT, the load of one agent '
+                                  '(repeatable)', action='append')
+    coordinator.add_argument('-pr', '--profile',
+                             help='Load profile of every agent, as in '
+                                  'StressAuto', default=None)
+    coordinator.add_argument('-t', '--timeout',
+                             help='Seconds the agents hold their limit',
+                             default=30, type=float)
+    coordinator.add_argument('-e', '--engine', help='Engine of the agents',
+                             choices=LimitedStress.engines,
+                             default='stress')
+    coordinator.add_argument('-lt', '--load-target',
+                             help='Whether the limit of an agent is the '
+                                  'total load of its host or the load it '
+                                  'adds, e.g. for agents sharing a host',
+                             choices=LimitedStress.load_targets,
+                             default='total', dest='load_target')
+    coordinator.add_argument('-d', '--delay', help='Seconds from the '
+                                                   'request to the start',
+                             default=2.0, type=float)
+    coordinator.add_argument('-p', '--period', help='Seconds between '
+                                                    'reports',
+                             default=1.0, type=float)
+    coordinator.add_argument('-o', '--output', help='Write the merged loads '
+                                                    'of every period to '
+                                                    'this csv file',
+                             default=None)
+    return parser
+
+
+if __name__ == '__main__':
+    parse = args_crafter()
+    args_parse = parse.parse_args()
+    if args_parse.command == 'agent':
+        stress_agent = StressAgent(port=args_parse.port,
+                                   address=args_parse.address,
+                                   verbosity=args_parse.verbose)
+        print('Agent listening on {0}:{1}'.format(
+            *stress_agent.start_server()))
+        try:
+            stress_agent.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    elif args_parse.command == 'coordinator':
+        limits = setpoint_crafter(parse, args_parse.setpoint)
+        if args_parse.limit is None and not args_parse.profile and \
+                len(limits) < len(args_parse.agent):
+            parse.error('one of --limit or --profile is required, or a '
+                        '--setpoint for every agent')
+        # a limit is a one step profile, so every agent controls, and
+        # samples, for the same time and they all end together
+        settings = {'engine': args_parse.engine,
+                    'load_target': args_parse.load_target,
+                    'profile': args_parse.profile or 'step:{0}:{1}'.format(
+                        args_parse.limit, args_parse.timeout)}
+        overrides = dict((address, {'profile': 'step:{0}:{1}'.format(
+            limit, args_parse.timeout)}) for address, limit in limits.items())
+        try:
+            cluster = Coordinator(args_parse.agent)
+            cluster.prepare(settings, overrides)
+        except (socket.error, AgentError) as exc:
+            parse.exit(1, '{0}\n'.format(exc))
+        try:
+            coordinate(cluster, period=args_parse.period,
+                       delay=args_parse.delay)
+            if args_parse.output:
+                cluster.to_csv(args_parse.output, args_parse.period)
+        finally:
+            cluster.close()
+    else:
+        parse.print_help()
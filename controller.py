@@ -0,0 +1,313 @@
+import time
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class PidController(object):
+    """
+        Positional PID controller with clamping anti-windup
+        The derivative acts on the measurement, so setpoint changes
+        do not kick the output
+    """
+    __output_limits__ = (0.0, 100.0)
+
+    def __init__(self, kp=0.4, ki=0.8, kd=0.0,
+                 output_limits=__output_limits__):
+        """
+        Gains are per second, output is clamped to output limits
+        :param kp: float
+        :param ki: float
+        :param kd: float
+        :param output_limits: tuple (min, max)
+        """
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.output_limits = output_limits
+        self.__integral__ = 0.0
+        self.__last_measurement__ = None
+        self.__last_time__ = None
+        self.__output__ = None
+
+    def clone(self):
+        """
+        Fresh controller with the same tuning
+        :return: PidController
+        """
+        return PidController(self.kp, self.ki, self.kd, self.output_limits)
+
+    @property
+    def output(self):
+        """
+        Latest output
+        :return: float or None
+        """
+        return self.__output__
+
+    def clamp(self, value):
+        """
+        :param value: float
+        :return: float
+        """
+        low, high = self.output_limits
+        if low is not None and value < low:
+            return low
+        if high is not None and value > high:
+            return high
+        return value
+
+    def reset(self, output=0.0, error=0.0):
+        """
+        Start over, with the integral primed so that the first update
+        with the given error outputs the given output (bumpless start)
+        :param output: float
+        :param error: float
+        """
+        self.__integral__ = self.clamp(output) - self.kp * error
+        self.__last_measurement__ = None
+        self.__last_time__ = None
+        self.__output__ = None
+
+    def shift(self, delta):
+        """
+        Feed forward: move the output by delta without waiting for the
+        error to build up, e.g. when the setpoint moves
+        :param delta: float
+        """
+        self.__integral__ = self.clamp(self.__integral__ + delta)
+
+    def update(self, setpoint, measurement, now=None):
+        """
+        Next output for the given measurement
+        :param setpoint: float
+        :param measurement: float
+        :param now: float monotonic seconds
+        :return: float
+        """
+        now = monotonic() if now is None else now
+        dt = now - self.__last_time__ if self.__last_time__ is not None \
+            else 0.0
+        error = setpoint - measurement
+
+        derivative = 0.0
+        if dt > 0 and self.__last_measurement__ is not None:
+            derivative = -(measurement - self.__last_measurement__) / dt
+
+        integral = self.__integral__ + self.ki * error * dt
+        unclamped = self.kp * error + integral + self.kd * derivative
+        output = self.clamp(unclamped)
+        # anti-windup: only keep integrating while not pushing the
+        # saturated output further past its limit
+        if output == unclamped or (unclamped > output) != (error > 0):
+            self.__integral__ = self.clamp(integral)
+
+        self.__last_measurement__ = measurement
+        self.__last_time__ = now
+        self.__output__ = output
+        return output
+
+
+class ConvergenceStats(object):
+    """
+        Tracks how a measurement approaches its setpoint:
+        convergence time and overshoot
+    """
+
+    def __init__(self, tolerance=1.0, settle_time=3.0):
+        """
+        The measurement has converged once it stayed within tolerance
+        of the setpoint for settle time seconds
+        :param tolerance: float
+        :param settle_time: float
+        """
+        self.tolerance = tolerance
+        self.settle_time = settle_time
+        self.reset()
+
+    def reset(self, start=None, initial=None):
+        """
+        :param start: float monotonic seconds
+        :param initial: float initial measurement
+        """
+        self.__start__ = start
+        self.__initial__ = initial
+        self.__setpoint__ = None
+        self.__within_since__ = None
+        self.__converged_at__ = None
+        self.__overshoot__ = 0.0
+
+    def record(self, now, setpoint, measurement):
+        """
+        :param now: float monotonic seconds
+        :param setpoint: float
+        :param measurement: float
+        """
+        if self.__start__ is None or setpoint != self.__setpoint__:
+            self.reset(start=now, initial=measurement)
+            self.__setpoint__ = setpoint
+
+        rising = setpoint >= self.__initial__
+        overshoot = measurement - setpoint if rising \
+            else setpoint - measurement
+        self.__overshoot__ = max(self.__overshoot__, overshoot)
+
+        if abs(setpoint - measurement) <= self.tolerance:
+            if self.__within_since__ is None:
+                self.__within_since__ = now
+            if self.__converged_at__ is None and \
+                    now - self.__within_since__ >= self.settle_time:
+                self.__converged_at__ = self.__within_since__
+        else:
+            self.__within_since__ = None
+
+    @property
+    def converged(self):
+        """
+        :return: bool
+        """
+        return self.__converged_at__ is not None
+
+    @property
+    def convergence_time(self):
+        """
+        Seconds from the setpoint change until the measurement settled
+        :return: float or None
+        """
+        if self.__converged_at__ is None:
+            return None
+        return self.__converged_at__ - self.__start__
+
+    @property
+    def overshoot(self):
+        """
+        Largest excursion past the setpoint, in measurement units
+        :return: float
+        """
+        return self.__overshoot__
+
+    @property
+    def overshoot_percent(self):
+        """
+        Overshoot as percent of the step size
+        :return: float or None
+        """
+        if self.__setpoint__ is None or self.__setpoint__ == self.__initial__:
+            return None
+        return 100.0 * self.__overshoot__ / \
+            abs(self.__setpoint__ - self.__initial__)
+
+    def report(self):
+        """
+        :return: str
+        """
+        if self.converged:
+            converged = 'Converged in {0:.1f}s'.format(self.convergence_time)
+        else:
+            converged = 'Did not converge within {0}'.format(self.tolerance)
+        overshoot = 'overshoot {0:.1f}'.format(self.overshoot)
+        if self.overshoot_percent is not None:
+            overshoot += ' ({0:.0f}% of step)'.format(self.overshoot_percent)
+        return '{0}, {1}'.format(converged, overshoot)
+
+
+class Ticker(object):
+    """
+        Fixed rate ticks on a monotonic clock
+    """
+
+    def __init__(self, period, clock=monotonic, sleep=time.sleep):
+        """
+        :param period: float seconds between ticks
+        :param clock: callable returning monotonic seconds
+        :param sleep: callable sleeping seconds
+        """
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        self.__next_tick__ = None
+
+    def start(self):
+        self.__next_tick__ = self.clock()
+
+    def wait(self):
+        """
+        Sleep until the next tick
+        """
+        if self.__next_tick__ is None:
+            self.start()
+        self.__next_tick__ += self.period
+        remaining = self.__next_tick__ - self.clock()
+        if remaining > 0:
+            self.sleep(remaining)
+        else:
+            # fell behind, do not try to catch up with a burst of ticks
+            self.__next_tick__ = self.clock()
+
+
+class ControlLoop(object):
+    """
+        Periodic measure -> controller -> actuate loop
+        Resource agnostic: measure and actuate are callables
+    """
+
+    def __init__(self, controller, measure, actuate, period=0.5,
+                 stats=None, clock=monotonic, sleep=time.sleep):
+        """
+        :param controller: PidController
+        :param measure: callable returning the measurement
+        :param actuate: callable taking the controller output
+        :param period: float seconds between ticks
+        :param stats: ConvergenceStats
+        :param clock: callable returning monotonic seconds
+        :param sleep: callable sleeping seconds
+        """
+        self.controller = controller
+        self.measure = measure
+        self.actuate = actuate
+        self.stats = stats if stats else ConvergenceStats()
+        self.clock = clock
+        self.ticker = Ticker(period, clock, sleep)
+        self.measurement = None
+        self.setpoint = None
+
+    def start(self, setpoint):
+        """
+        Prime the controller with the output that closes the current gap,
+        assuming the generated load adds to the measured one
+        :param setpoint: float
+        :return: float measurement
+        """
+        self.measurement = self.measure()
+        self.setpoint = setpoint
+        gap = setpoint - self.measurement
+        self.controller.reset(output=gap, error=gap)
+        self.ticker.start()
+        return self.measurement
+
+    def tick(self, setpoint=None):
+        """
+        One control step
+        :param setpoint: float, keep the previous one if None
+        :return: float controller output
+        """
+        if setpoint is not None:
+            if self.setpoint is not None:
+                self.controller.shift(setpoint - self.setpoint)
+            self.setpoint = setpoint
+        self.measurement = self.measure()
+        now = self.clock()
+        self.stats.record(now, self.setpoint, self.measurement)
+        output = self.controller.update(self.setpoint, self.measurement, now)
+        self.actuate(output)
+        return output
+
+    @property
+    def period(self):
+        """
+        :return: float seconds between ticks
+        """
+        return self.ticker.period
+
+    def wait(self):
+        """
+        Sleep until the next control period starts
+        """
+        self.ticker.wait()
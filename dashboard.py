@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+import collections
+import math
+import os
+import sys
+import threading
+from controller import monotonic
+
+# eighth blocks where the terminal takes utf-8, ascii otherwise
+SPARK_BLOCKS = u' ▁▂▃▄▅▆▇█'
+SPARK_ASCII = u' _.-~=*#@'
+BAR_BLOCKS = (u'█', u'·')
+BAR_ASCII = (u'#', u'-')
+
+CLEAR_LINES = '\x1b[{0}F\x1b[J'
+
+
+def terminal_size(stream, default=(80, 24)):
+    """
+    :param stream: file
+    :param default: tuple (int columns, int lines) when not found
+    :return: tuple (int columns, int lines)
+    """
+    try:
+        size = os.get_terminal_size(stream.fileno())
+        if size.columns and size.lines:
+            return size.columns, size.lines
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:
+        return (int(os.environ.get('COLUMNS', default[0])),
+                int(os.environ.get('LINES', default[1])))
+    except ValueError:
+        return default
+
+
+def sparkline(values, ramp=SPARK_BLOCKS, highest=100.0):
+    """
+    :param values: iterable of float percent, nan is left blank
+    :param ramp: str characters from empty to full
+    :param highest: float value of a full character
+    :return: str one character per value
+    """
+    line = []
+    for value in values:
+        if value is None or math.isnan(value):
+            line.append(ramp[0])
+            continue
+        level = int(round(min(max(value, 0.0), highest) / highest *
+                          (len(ramp) - 1)))
+        line.append(ramp[level])
+    return u''.join(line)
+
+
+def bar(value, width, blocks=BAR_BLOCKS, highest=100.0):
+    """
+    :param value: float percent
+    :param width: int characters
+    :param blocks: tuple (str full, str empty)
+    :param highest: float value of a full bar
+    :return: str
+    """
+    full = int(round(min(max(value, 0.0), highest) / highest * width))
+    return blocks[0] * full + blocks[1] * (width - full)
+
+
+def clock_format(seconds):
+    """
+    :param seconds: float
+    :return: str hh:mm:ss
+    """
+    seconds = int(max(0, seconds))
+    return '{0:02d}:{1:02d}:{2:02d}'.format(seconds // 3600,
+                                            seconds // 60 % 60, seconds % 60)
+
+
+class Dashboard(object):
+    """
+        Live view of the run, redrawn in place at a fixed rate by a daemon
+        thread from the latest values the control loop publishes, so
+        drawing never holds the loop up
+        The loop only copies its values in under the lock, the terminal is
+        written by the thread alone, messages included: they are queued
+        and written above the next frame
+    """
+    __rate__ = 4.0
+    __history__ = 60
+    # messages kept while the terminal does not take them
+    __backlog__ = 1000
+
+    def __init__(self, rate=__rate__, history=__history__, stream=None):
+        """
+        :param rate: float redraws per second
+        :param history: int samples in the sparklines
+        :param stream: file drawn to, stdout by default
+        """
+        self.rate = rate
+        self.stream = stream if stream else sys.stdout
+        self.setpoints = collections.deque(maxlen=history)
+        self.loads = collections.deque(maxlen=history)
+        self.per_core = {}
+        self.workers = self.limiters = 0
+        self.status = ''
+        self.started = self.deadline = None
+        encoding = (getattr(self.stream, 'encoding', None) or '').lower()
+        self.unicode = encoding.replace('-', '') == 'utf8'
+        self.__messages__ = collections.deque(maxlen=self.__backlog__)
+        self.__drawn__ = 0
+        self.__lock__ = threading.Lock()
+        self.__stopped__ = threading.Event()
+        self.__thread__ = None
+
+    @property
+    def enabled(self):
+        """
+        :return: bool whether the stream is a terminal to draw on
+        """
+        isatty = getattr(self.stream, 'isatty', None)
+        return bool(isatty and isatty())
+
+    @property
+    def drawing(self):
+        """
+        :return: bool whether the thread draws, and writes the messages
+        """
+        return self.__thread__ is not None
+
+    def update(self, setpoint, load, per_core=None, workers=0, limiters=0):
+        """
+        Latest sample of the control loop
+        :param setpoint: float percent
+        :param load: float percent
+        :param per_core: dict {core: float percent}
+        :param workers: int
+        :param limiters: int
+        """
+        with self.__lock__:
+            self.setpoints.append(setpoint)
+            self.loads.append(load)
+            if per_core:
+                self.per_core = dict(per_core)
+            self.workers = workers
+            self.limiters = limiters
+
+    def message(self, text):
+        """
+        Written above the dashboard with the next frame
+        :param text: str
+        """
+        with self.__lock__:
+            self.__messages__.append(text)
+
+    def count_down(self, seconds, status=''):
+        """
+        :param seconds: float left of the run, None when unknown
+        :param status: str
+        """
+        with self.__lock__:
+            self.deadline = monotonic() + seconds \
+                if seconds is not None else None
+            self.status = status
+
+    def render(self, width=80, height=24):
+        """
+        Cores get a bar each when they fit the height, a character each
+        otherwise
+        :param width: int columns
+        :param height: int lines
+        :return: list of str lines, none wider than the width
+        """
+        now = monotonic()
+        ramp = SPARK_BLOCKS if self.unicode else SPARK_ASCII
+        blocks = BAR_BLOCKS if self.unicode else BAR_ASCII
+        with self.__lock__:
+            setpoints, loads = list(self.setpoints), list(self.loads)
+            per_core = sorted(self.per_core.items())
+            workers, limiters = self.workers, self.limiters
+            status, deadline = self.status, self.deadline
+        elapsed = now - self.started if self.started else 0.0
+        lines = [u'elapsed {0}  remaining {1}  workers {2}  limiters {3}  '
+                 u'{4}'.format(clock_format(elapsed),
+                               clock_format(deadline - now) if deadline
+                               else '--:--:--', workers, limiters, status)]
+        # label and value columns take 16 characters
+        spark_width = max(1, width - 16)
+        for name, values in (('setpoint', setpoints), ('load', loads)):
+            last = values[-1] if values else float('nan')
+            lines.append(u'{0:<8} {1:>5} {2}'.format(
+                name, '-' if math.isnan(last) else '{0:.1f}'.format(last),
+                sparkline(values[-spark_width:], ramp)))
+        if len(per_core) < height - len(lines):
+            for core, load in per_core:
+                lines.append(u'cpu{0:<5} {1:>5.1f} {2}'.format(
+                    core, load, bar(load, spark_width, blocks)))
+            return [x[:width - 1] for x in lines]
+        # too many cores for a bar each, one character per core instead
+        for first in range(0, len(per_core), spark_width):
+            cores = per_core[first:first + spark_width]
+            lines.append(u'cpu{0:<11} {1}'.format(
+                '{0}-{1}'.format(cores[0][0], cores[-1][0]),
+                sparkline((x for _, x in cores), ramp)))
+        return [x[:width - 1] for x in lines]
+
+    def write(self, text):
+        """
+        :param text: str
+        """
+        if str is bytes and isinstance(text, type(u'')):
+            text = text.encode('utf-8' if self.unicode else 'ascii',
+                               'replace')
+        self.stream.write(text)
+        self.stream.flush()
+
+    def draw(self):
+        """
+        Replace the previous frame with the queued messages and the latest
+        values, in a single write outside the lock
+        """
+        lines = self.render(*terminal_size(self.stream))
+        with self.__lock__:
+            messages = list(self.__messages__)
+            self.__messages__.clear()
+        text = CLEAR_LINES.format(self.__drawn__) if self.__drawn__ else ''
+        text += u''.join(x + u'\n' for x in messages)
+        self.write(text + u'\n'.join(lines) + u'\n')
+        self.__drawn__ = len(lines)
+
+    def redraw(self):
+        while not self.__stopped__.wait(1.0 / self.rate):
+            self.draw()
+
+    def start(self):
+        self.started = monotonic()
+        if self.__thread__ or not self.enabled:
+            return
+        self.__stopped__.clear()
+        self.__thread__ = threading.Thread(target=self.redraw)
+        self.__thread__.daemon = True
+        self.__thread__.start()
+
+    def stop(self):
+        """
+        The last frame is left on the terminal
+        """
+        if not self.__thread__:
+            return
+        self.__stopped__.set()
+        self.__thread__.join(1.0)
+        self.__thread__ = None
+        self.draw()
+        self.__drawn__ = 0
+        with self.__lock__:
+            messages = list(self.__messages__)
+            self.__messages__.clear()
+        for text in messages:
+            self.write(text + u'\n')
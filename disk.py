@@ -0,0 +1,206 @@
+import errno
+import io
+import mmap
+import os
+import random
+import time
+from paced import paced, PacedWorkers
+
+PROC_DISKSTATS = '/proc/diskstats'
+SECTOR_SIZE = 512
+MEGABYTE = 1024 * 1024
+
+
+def device_of_path(path, diskstats_path=PROC_DISKSTATS):
+    """
+    Name of the block device the path lives on, as in /proc/diskstats
+    :param path: str
+    :param diskstats_path: str
+    :return: str or None
+    """
+    device = os.stat(path).st_dev
+    major, minor = os.major(device), os.minor(device)
+    with open(diskstats_path) as diskstats:
+        for line in diskstats:
+            fields = line.split()
+            if int(fields[0]) == major and int(fields[1]) == minor:
+                return fields[2]
+    return None
+
+
+class DiskStats(object):
+    """
+        Throughput and iops of a block device from /proc/diskstats
+    """
+    units = ('mbps', 'iops')
+
+    def __init__(self, device, unit='mbps', diskstats_path=PROC_DISKSTATS):
+        """
+        :param device: str device name, e.g. sda
+        :param unit: str mbps or iops
+        :param diskstats_path: str
+        :raise NotImplementedError: unit not in accepted values
+        """
+        if unit not in self.units:
+            raise NotImplementedError('This unit is not supported!')
+        self.device = device
+        self.unit = unit
+        self.diskstats_path = diskstats_path
+        self.__last__ = None
+        self.__last_time__ = None
+
+    def read_counters(self):
+        """
+        :return: tuple (completed ios, bytes transferred)
+        :raise ValueError: no such device
+        """
+        with open(self.diskstats_path) as diskstats:
+            for line in diskstats:
+                fields = line.split()
+                if fields[2] == self.device:
+                    ios = int(fields[3]) + int(fields[7])
+                    sectors = int(fields[5]) + int(fields[9])
+                    return ios, sectors * SECTOR_SIZE
+        raise ValueError('No such block device: {0}'.format(self.device))
+
+    def sample(self):
+        """
+        Rate since the previous sample, 0 on the first one
+        :return: float MB/s or iops
+        """
+        counters, now = self.read_counters(), time.time()
+        last, last_time = self.__last__, self.__last_time__
+        self.__last__, self.__last_time__ = counters, now
+        if last is None or now <= last_time:
+            return 0.0
+        if self.unit == 'iops':
+            return (counters[0] - last[0]) / (now - last_time)
+        return (counters[1] - last[1]) / float(MEGABYTE) / (now - last_time)
+
+
+def io_worker(path, block_size, read_ratio, direct, index, active, rate,
+              busy, running):
+    """
+    Worker body: paced random block reads and writes on the file
+    :param path: str
+    :param block_size: int bytes
+    :param read_ratio: float share of reads, the rest are writes
+    :param direct: bool open with O_DIRECT
+    """
+    flags = os.O_RDWR | (getattr(os, 'O_DIRECT', 0) if direct else 0)
+    raw = io.FileIO(os.open(path, flags), 'r+')
+    # mmap memory is page aligned, as O_DIRECT needs
+    buffer_ = mmap.mmap(-1, block_size)
+    blocks = max(1, os.fstat(raw.fileno()).st_size // block_size)
+    for _ in paced(index, active, rate, busy, running):
+        raw.seek(random.randrange(blocks) * block_size)
+        if random.random() < read_ratio:
+            raw.readinto(buffer_)
+        else:
+            raw.write(buffer_)
+    raw.close()
+
+
+class DiskStress(PacedWorkers):
+    """
+        Disk io generator: paced random io workers on a test file
+        The workers write over the whole file, so only a file created
+        for the run is used, and removed after it, unless forced onto an
+        existing one, which is then left in place
+    """
+    __block_size__ = 4096
+
+    def __init__(self, path, device=None, unit='mbps',
+                 block_size=__block_size__, read_ratio=0.5, direct=False,
+                 file_size=256 * MEGABYTE, max_workers=16, force=False):
+        """
+        :param path: str test file, on the device to stress
+        :param device: str, defaults to the device of the path
+        :param unit: str mbps or iops
+        :param block_size: int bytes of every operation
+        :param read_ratio: float share of reads
+        :param direct: bool bypass the page cache
+        :param file_size: int bytes of the test file
+        :param max_workers: int
+        :param force: bool write over an existing file
+        :raise ValueError: the device of the path is not a block device,
+        or the path exists and is not forced
+        """
+        if os.path.exists(path) and not force:
+            raise ValueError('{0} exists and disk stress would overwrite '
+                             'it, remove it or force it'.format(path))
+        PacedWorkers.__init__(self, max_workers=max_workers)
+        self.path = path
+        self.block_size = block_size
+        self.read_ratio = read_ratio
+        self.direct = direct
+        self.file_size = file_size
+        self.force = force
+        self.__created__ = False
+        if not device:
+            device = device_of_path(
+                os.path.dirname(os.path.abspath(self.path)))
+        if not device:
+            raise ValueError('No block device found for {0}'.format(path))
+        self.stats = DiskStats(device, unit=unit)
+
+    def prepare(self):
+        """
+        Create the test file, or extend a forced one, written out so reads
+        hit the device
+        :raise OSError: the file appeared since and is not forced
+        """
+        try:
+            descriptor = os.open(self.path,
+                                 os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            self.__created__ = True
+        except OSError as exc:
+            if exc.errno != errno.EEXIST or not self.force:
+                raise
+            if os.path.getsize(self.path) >= self.file_size:
+                return
+            descriptor = os.open(self.path, os.O_WRONLY)
+        block = b'\0' * MEGABYTE
+        with os.fdopen(descriptor, 'wb') as test_file:
+            for _ in range(self.file_size // MEGABYTE):
+                test_file.write(block)
+            test_file.flush()
+            os.fsync(test_file.fileno())
+
+    def worker(self):
+        return io_worker, (self.path, self.block_size, self.read_ratio,
+                           self.direct)
+
+    def measure(self):
+        """
+        Starting first keeps writing out the test file out of the
+        measured windows
+        :return: float MB/s or iops of the device
+        """
+        self.start()
+        return self.stats.sample()
+
+    def operations(self, output):
+        """
+        :param output: float MB/s or iops
+        :return: float operations per second
+        """
+        if self.stats.unit == 'iops':
+            return output
+        return output * MEGABYTE / self.block_size
+
+    def status(self, measurement):
+        """
+        :param measurement: float
+        :return: str
+        """
+        return 'Disk io is currently at {0:.1f} {1}, {2} workers'.format(
+            measurement, self.stats.unit, self.active.value)
+
+    def cleanup(self):
+        if self.__created__:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.__created__ = False
@@ -0,0 +1,130 @@
+import multiprocessing
+import signal
+import time
+from affinity import set_affinity
+
+
+def duty_cycle(ratios, index, running, period, core=None):
+    """
+    Worker body: busy for ratio of every period, asleep for the rest
+    The ratio is re-read every period, so it can be retargeted live
+    :param ratios: multiprocessing.Array of float in [0, 1]
+    :param index: int index of the worker ratio
+    :param running: multiprocessing.Value, the worker exits when false
+    :param period: float seconds
+    :param core: int core to pin the worker to, if any
+    """
+    # Ctrl-C is for the parent, which stops the worker through running
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if core is not None:
+        set_affinity(0, (core,))
+    while running.value:
+        start = time.time()
+        busy_until = start + period * ratios[index]
+        while time.time() < busy_until:
+            pass
+        idle = start + period - time.time()
+        if idle > 0:
+            time.sleep(idle)
+
+
+class DutyCyclePool(object):
+    """
+        Pool of python worker processes, one per core by default, each
+        running a busy/sleep duty cycle
+        Duty ratios live in shared memory, so changing the load is a store
+        instead of a process spawn, and neither stress nor cpulimit is needed
+    """
+    __period__ = 0.02
+
+    def __init__(self, workers=None, period=__period__, cores=None):
+        """
+        With cores, there is one worker pinned to every core given
+        :param workers: int, defaults to the cpu count
+        :param period: float seconds of one busy/sleep cycle
+        :param cores: tuple of int
+        """
+        self.cores = tuple(cores) if cores else None
+        if self.cores:
+            workers = len(self.cores)
+        self.workers = workers if workers else multiprocessing.cpu_count()
+        self.period = period
+        self.ratios = multiprocessing.Array('d', self.workers, lock=False)
+        self.running = multiprocessing.Value('b', 0, lock=False)
+        self.__processes__ = []
+
+    @property
+    def pids(self):
+        """
+        :return: tuple
+        """
+        return tuple(x.pid for x in self.__processes__)
+
+    @property
+    def started(self):
+        """
+        :return: bool
+        """
+        return bool(self.__processes__)
+
+    def start(self):
+        """
+        Spawn the workers, idle until a demand is set
+        """
+        if self.started:
+            return
+        self.running.value = 1
+        for index in range(self.workers):
+            process = multiprocessing.Process(
+                target=duty_cycle,
+                args=(self.ratios, index, self.running, self.period,
+                      self.cores[index] if self.cores else None))
+            process.daemon = True
+            process.start()
+            self.__processes__.append(process)
+
+    def set_ratio(self, index, ratio):
+        """
+        :param index: int
+        :param ratio: float, clamped to [0, 1]
+        """
+        self.ratios[index] = min(1.0, max(0.0, ratio))
+
+    def set_core_ratio(self, core, ratio):
+        """
+        :param core: int one of the pinned cores
+        :param ratio: float, clamped to [0, 1]
+        """
+        self.start()
+        self.set_ratio(self.cores.index(core), ratio)
+
+    def set_demand(self, demand):
+        """
+        Spread the demand evenly over the workers
+        :param demand: float cpu percent, 100 per full core
+        :return: float the demand actually set
+        """
+        self.start()
+        ratio = min(1.0, max(0.0, demand / (100.0 * self.workers)))
+        for index in range(self.workers):
+            self.ratios[index] = ratio
+        return 100.0 * ratio * self.workers
+
+    @property
+    def demand(self):
+        """
+        :return: float cpu percent, 100 per full core
+        """
+        return 100.0 * sum(self.ratios[:])
+
+    def stop(self, timeout=1.0):
+        """
+        Let the workers finish their period, kill the ones that do not
+        :param timeout: float seconds
+        """
+        self.running.value = 0
+        for process in self.__processes__:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.__processes__ = []
@@ -0,0 +1,127 @@
+import threading
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class ControllerState(object):
+    """
+        Latest values of the control loop, written by the loop and read
+        by the http server thread
+    """
+    gauges = (
+        ('setpoint', 'Target load in percent'),
+        ('load', 'Measured load in percent'),
+        ('error', 'Setpoint minus measured load in percent'),
+        ('workers', 'Load generating processes'),
+        ('limiters', 'Limiter processes, or 1 for a cgroup'),
+        ('limit', 'Load requested from the workers, 100 per core'),
+        ('generated', 'Host load of StressAuto and its processes'),
+        ('foreign', 'Host load of every other process'),
+        ('iteration_seconds', 'Duration of the last control loop iteration'),
+    )
+
+    def __init__(self, prefix='stressauto'):
+        """
+        :param prefix: str prepended to every metric name
+        """
+        self.prefix = prefix
+        self.values = dict((name, 0.0) for name, _ in self.gauges)
+        self.iterations = 0
+        self.__lock__ = threading.Lock()
+
+    def update(self, **values):
+        """
+        Counts one control loop iteration
+        :param values: float of the gauges
+        """
+        with self.__lock__:
+            self.values.update(values)
+            self.iterations += 1
+
+    def render(self):
+        """
+        Prometheus text exposition of the gauges and the iteration counter
+        :return: str
+        """
+        with self.__lock__:
+            values, iterations = dict(self.values), self.iterations
+        lines = []
+        for name, description in self.gauges:
+            metric = '{0}_{1}'.format(self.prefix, name)
+            lines.append('# HELP {0} {1}'.format(metric, description))
+            lines.append('# TYPE {0} gauge'.format(metric))
+            lines.append('{0} {1}'.format(metric, float(values[name])))
+        metric = '{0}_iterations_total'.format(self.prefix)
+        lines.append('# HELP {0} Control loop iterations'.format(metric))
+        lines.append('# TYPE {0} counter'.format(metric))
+        lines.append('{0} {1}'.format(metric, iterations))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+        Serves the state of the server on /metrics
+    """
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.state.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        # scrapes would flood the output of the run
+        pass
+
+
+class MetricsServer(object):
+    """
+        Prometheus endpoint on a daemon thread, so serving never blocks
+        the control loop
+    """
+    __port__ = 9464
+
+    def __init__(self, port=__port__, address='127.0.0.1', state=None):
+        """
+        :param port: int, 0 binds any free port
+        :param address: str, 0.0.0.0 to be scraped from other hosts
+        :param state: ControllerState
+        """
+        self.state = state if state else ControllerState()
+        self.address = address
+        self.port = port
+        self.__server__ = None
+        self.__thread__ = None
+
+    def start(self):
+        """
+        :return: tuple (address, port) bound
+        :raise socket.error: the port can not be bound
+        """
+        if self.__server__:
+            return self.__server__.server_address
+        self.__server__ = HTTPServer((self.address, self.port),
+                                     MetricsHandler)
+        self.__server__.state = self.state
+        self.__thread__ = threading.Thread(
+            target=self.__server__.serve_forever)
+        self.__thread__.daemon = True
+        self.__thread__.start()
+        return self.__server__.server_address
+
+    def stop(self):
+        if not self.__server__:
+            return
+        self.__server__.shutdown()
+        self.__server__.server_close()
+        self.__thread__.join(1.0)
+        self.__server__ = self.__thread__ = None
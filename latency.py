@@ -0,0 +1,246 @@
+import math
+import multiprocessing
+import signal
+import time
+from affinity import set_affinity, set_realtime
+from controller import monotonic
+
+# microseconds counted exactly, longer latencies in 1% wide buckets
+LINEAR_BUCKETS = 128
+BUCKET_GROWTH = 1.01
+BUCKETS = LINEAR_BUCKETS + 1200
+
+
+def bucket_index(microseconds):
+    """
+    :param microseconds: float
+    :return: int histogram bucket
+    """
+    if microseconds < LINEAR_BUCKETS:
+        return max(0, int(microseconds))
+    return min(BUCKETS - 1, LINEAR_BUCKETS + int(math.log(
+        float(microseconds) / LINEAR_BUCKETS, BUCKET_GROWTH)))
+
+
+def bucket_limit(index):
+    """
+    :param index: int histogram bucket
+    :return: float microseconds, upper edge of the bucket
+    """
+    if index < LINEAR_BUCKETS:
+        return float(index + 1)
+    return LINEAR_BUCKETS * BUCKET_GROWTH ** (index - LINEAR_BUCKETS + 1)
+
+
+def probe_wakeups(counts, running, interval, priority=None, core=None):
+    """
+    Probe body, as cyclictest: sleep until the next wakeup time and
+    count how late the wakeup came, in microseconds
+    :param counts: multiprocessing.Array of int, one per bucket
+    :param running: multiprocessing.Value, the probe exits when false
+    :param interval: float seconds between wakeups
+    :param priority: int SCHED_FIFO priority, None keeps the default
+    scheduling
+    :param core: int core to pin the probe to, if any
+    """
+    # the parent handles Ctrl-C and stops the probe through running
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if core is not None:
+        set_affinity(0, (core,))
+    if priority:
+        try:
+            set_realtime(0, priority)
+        except OSError:
+            # measured at normal priority, which the report tells
+            counts[BUCKETS] = 1
+    wakeup = monotonic()
+    while running.value:
+        wakeup += interval
+        delay = wakeup - monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        latency = monotonic() - wakeup
+        counts[bucket_index(max(0.0, latency) * 1e6)] += 1
+        if latency > interval:
+            # do not try to catch up with a burst of wakeups
+            wakeup = monotonic()
+
+
+class LatencyHistogram(object):
+    """
+        Wakeup latencies of a plateau, in microsecond buckets
+        Percentiles are the upper edge of their bucket, exact up to 128 us
+        and within 1% above
+    """
+
+    def __init__(self, name, counts):
+        """
+        :param name: str
+        :param counts: list of int per bucket
+        """
+        self.name = name
+        self.counts = counts
+
+    @property
+    def wakeups(self):
+        return sum(self.counts)
+
+    def percentile(self, percent):
+        """
+        :param percent: float 0 to 100
+        :return: float microseconds, or None without wakeups
+        """
+        total = self.wakeups
+        if not total:
+            return None
+        rank = max(1, int(math.ceil(percent / 100.0 * total)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return bucket_limit(index)
+        return bucket_limit(len(self.counts) - 1)
+
+    @property
+    def maximum(self):
+        """
+        :return: float microseconds, or None without wakeups
+        """
+        return self.percentile(100)
+
+    def report(self):
+        """
+        :return: str
+        """
+        if not self.wakeups:
+            return 'no wakeups'
+        return 'p50 {0:.0f} us, p99 {1:.0f} us, p99.9 {2:.0f} us, max ' \
+               '{3:.0f} us over {4} wakeups'.format(
+                   self.percentile(50), self.percentile(99),
+                   self.percentile(99.9), self.maximum, self.wakeups)
+
+
+class LatencyPlateau(object):
+    """
+        Histogram of the wakeups of the block it guards, kept by its probe
+    """
+
+    def __init__(self, probe, name):
+        self.probe = probe
+        self.name = name
+        self.start = None
+        self.histogram = None
+
+    def __enter__(self):
+        self.start = self.probe.snapshot()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram = self.probe.histogram(self.name, self.start)
+        self.probe.plateaus.append(self.histogram)
+        return False
+
+
+class LatencyProbe(object):
+    """
+        Scheduler latency of the host under the generated load: a timer
+        process, optionally SCHED_FIFO, measures how late it wakes up
+        The probe runs apart from the control loop, in its own process,
+        and counts into a shared histogram the plateaus take differences
+        of
+    """
+    __interval__ = 0.001
+
+    def __init__(self, interval=__interval__, priority=None, core=None):
+        """
+        :param interval: float seconds between wakeups
+        :param priority: int SCHED_FIFO priority 1 to 99, None for the
+        default scheduling
+        :param core: int core to pin the probe to, if any
+        """
+        self.interval = interval
+        self.priority = priority
+        self.core = core
+        # the last slot flags a priority that could not be set
+        self.counts = multiprocessing.Array('L', BUCKETS + 1, lock=False)
+        self.running = multiprocessing.Value('b', 0, lock=False)
+        self.plateaus = []
+        self.__process__ = None
+
+    @property
+    def pids(self):
+        """
+        :return: tuple
+        """
+        return (self.__process__.pid,) if self.__process__ else ()
+
+    @property
+    def realtime(self):
+        """
+        :return: bool whether the probe runs under SCHED_FIFO
+        """
+        return bool(self.priority) and not self.counts[BUCKETS]
+
+    def start(self):
+        if self.__process__:
+            return
+        self.running.value = 1
+        self.__process__ = multiprocessing.Process(
+            target=probe_wakeups,
+            args=(self.counts, self.running, self.interval, self.priority,
+                  self.core))
+        self.__process__.daemon = True
+        self.__process__.start()
+
+    def stop(self, timeout=1.0):
+        """
+        :param timeout: float seconds
+        """
+        if not self.__process__:
+            return
+        self.running.value = 0
+        self.__process__.join(timeout)
+        if self.__process__.is_alive():
+            self.__process__.terminate()
+        self.__process__ = None
+
+    def snapshot(self):
+        """
+        :return: list of int counts per bucket so far
+        """
+        return self.counts[:BUCKETS]
+
+    def histogram(self, name, since=None):
+        """
+        :param name: str
+        :param since: snapshot, None for every wakeup so far
+        :return: LatencyHistogram of the wakeups since the snapshot
+        """
+        counts = self.snapshot()
+        if since:
+            counts = [x - y for x, y in zip(counts, since)]
+        return LatencyHistogram(name, counts)
+
+    def plateau(self, name):
+        """
+        :param name: str
+        :return: context manager keeping the histogram of its block
+        """
+        return LatencyPlateau(self, name)
+
+    def summary(self):
+        """
+        Per plateau percentiles, in microseconds
+        :return: str table
+        """
+        lines = ['{0:<24} {1:>9} {2:>8} {3:>8} {4:>8} {5:>8}'.format(
+            'plateau', 'wakeups', 'p50 us', 'p99 us', 'p99.9 us', 'max us')]
+        for histogram in self.plateaus:
+            if not histogram.wakeups:
+                continue
+            lines.append(
+                '{0:<24} {1:>9} {2:>8.0f} {3:>8.0f} {4:>8.0f} {5:>8.0f}'
+                .format(histogram.name, histogram.wakeups,
+                        histogram.percentile(50), histogram.percentile(99),
+                        histogram.percentile(99.9), histogram.maximum))
+        return '\n'.join(lines)
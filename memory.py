@@ -0,0 +1,200 @@
+import mmap
+import multiprocessing
+import signal
+import time
+
+PROC_MEMINFO = '/proc/meminfo'
+MEGABYTE = 1024 * 1024
+
+
+class MemInfo(object):
+    """
+        Reads memory usage from /proc/meminfo
+    """
+
+    def __init__(self, meminfo_path=PROC_MEMINFO):
+        """
+        :param meminfo_path: str
+        """
+        self.meminfo_path = meminfo_path
+
+    def read(self):
+        """
+        :return: dict {field: bytes}
+        """
+        fields = {}
+        with open(self.meminfo_path) as meminfo:
+            for line in meminfo:
+                name, value = line.split(':', 1)
+                value = value.split()
+                multiplier = 1024 if len(value) > 1 else 1
+                fields[name] = int(value[0]) * multiplier
+        return fields
+
+    @property
+    def total(self):
+        """
+        :return: int bytes
+        """
+        return self.read()['MemTotal']
+
+    def used_percent(self):
+        """
+        Memory that is not available to new allocations, in percent
+        :return: float
+        """
+        fields = self.read()
+        return 100.0 * (fields['MemTotal'] - fields['MemAvailable']) / \
+            fields['MemTotal']
+
+    def used_percent_for_available(self, available):
+        """
+        The used percent target that leaves the given MemAvailable
+        :param available: int bytes
+        :return: float
+        """
+        total = self.total
+        return 100.0 * (total - min(available, total)) / total
+
+
+def touch(chunk, value):
+    """
+    Write one byte of every page, so the kernel has to back it
+    :param chunk: mmap.mmap
+    :param value: int
+    """
+    pages = len(range(0, len(chunk), mmap.PAGESIZE))
+    chunk[::mmap.PAGESIZE] = bytes(bytearray((value,))) * pages
+
+
+def memory_hog(target_chunks, chunk_size, dirty_rate, running):
+    """
+    Worker body: holds target chunks of touched anonymous memory and
+    re-dirties them round robin at dirty rate bytes per second
+    Chunks are separate mappings, so shrinking returns them to the kernel
+    :param target_chunks: multiprocessing.Value int
+    :param chunk_size: int bytes
+    :param dirty_rate: multiprocessing.Value float bytes per second
+    :param running: multiprocessing.Value, the worker exits when false
+    """
+    # left running on Ctrl-C, the parent frees it through running
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    chunks = []
+    cursor = 0
+    dirty_budget = 0.0
+    last = time.time()
+    while running.value:
+        target = target_chunks.value
+        # grow in bursts, so a shrink request is not stuck behind a
+        # long allocation
+        for _ in range(min(16, target - len(chunks))):
+            chunk = mmap.mmap(-1, chunk_size)
+            touch(chunk, 1)
+            chunks.append(chunk)
+        while len(chunks) > target:
+            chunks.pop().close()
+
+        now = time.time()
+        dirty_budget = min(dirty_budget + dirty_rate.value * (now - last),
+                           chunk_size * max(1, len(chunks)))
+        last = now
+        while chunks and dirty_budget >= chunk_size:
+            cursor %= len(chunks)
+            touch(chunks[cursor], int(now) % 255 + 1)
+            cursor += 1
+            dirty_budget -= chunk_size
+        time.sleep(0.01)
+    for chunk in chunks:
+        chunk.close()
+
+
+class MemoryStress(object):
+    """
+        Memory pressure generator: a worker process holding touched
+        memory chunks, the chunk count is changed live through shared
+        memory
+        Measured and targeted as used memory percent from /proc/meminfo
+    """
+    __chunk_size__ = 64 * MEGABYTE
+    output_limits = (0.0, 100.0)
+    setpoint_limits = (0.0, 100.0)
+
+    def __init__(self, chunk_size=__chunk_size__, dirty_rate=0,
+                 meminfo=None):
+        """
+        :param chunk_size: int bytes allocated or freed at once
+        :param dirty_rate: float bytes re-dirtied per second
+        :param meminfo: MemInfo
+        """
+        self.chunk_size = chunk_size
+        self.meminfo = meminfo if meminfo else MemInfo()
+        self.target_chunks = multiprocessing.Value('l', 0, lock=False)
+        self.dirty_rate = multiprocessing.Value('d', dirty_rate, lock=False)
+        self.running = multiprocessing.Value('b', 0, lock=False)
+        self.__process__ = None
+        self.__total__ = self.meminfo.total
+
+    @property
+    def pid(self):
+        """
+        :return: int or None
+        """
+        return self.__process__.pid if self.__process__ else None
+
+    @property
+    def pids(self):
+        """
+        :return: tuple
+        """
+        return (self.pid,) if self.pid else ()
+
+    @property
+    def allocated(self):
+        """
+        :return: int bytes requested from the worker
+        """
+        return self.target_chunks.value * self.chunk_size
+
+    def start(self):
+        if self.__process__:
+            return
+        self.running.value = 1
+        self.__process__ = multiprocessing.Process(
+            target=memory_hog, args=(self.target_chunks, self.chunk_size,
+                                     self.dirty_rate, self.running))
+        self.__process__.daemon = True
+        self.__process__.start()
+
+    def measure(self):
+        """
+        :return: float used memory percent
+        """
+        return self.meminfo.used_percent()
+
+    def actuate(self, output):
+        """
+        :param output: float percent of the total memory to hold
+        """
+        self.start()
+        self.target_chunks.value = int(round(
+            output * self.__total__ / 100.0 / self.chunk_size))
+
+    def status(self, measurement):
+        """
+        :param measurement: float
+        :return: str
+        """
+        return 'Memory use is currently at {0:.1f}, holding {1} MB'.format(
+            measurement, self.allocated // MEGABYTE)
+
+    def stop(self, timeout=2.0):
+        """
+        :param timeout: float seconds
+        """
+        if not self.__process__:
+            return
+        self.running.value = 0
+        self.__process__.join(timeout)
+        if self.__process__.is_alive():
+            self.__process__.terminate()
+        self.__process__ = None
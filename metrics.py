@@ -0,0 +1,206 @@
+import array
+import collections
+import struct
+
+MetricsSample = collections.namedtuple(
+    'MetricsSample', ('timestamp', 'setpoint', 'load', 'per_core', 'workers',
+                      'limit'))
+
+BINARY_MAGIC = b'SAMT'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHH')
+
+
+def record_struct(cores):
+    """
+    Binary record: double timestamp, float setpoint, float load,
+    unsigned workers, float limit, float per core
+    :param cores: int
+    :return: struct.Struct
+    """
+    return struct.Struct('<dffIf' + 'f' * cores)
+
+
+def read_metrics(path):
+    """
+    Stream a binary metrics file written by MetricsRecorder
+    :param path: str
+    :return: generator of MetricsSample
+    :raise ValueError: not a metrics file
+    """
+    with open(path, 'rb') as metrics:
+        magic, version, cores = BINARY_HEADER.unpack(
+            metrics.read(BINARY_HEADER.size))
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError('{0} is not a StressAuto metrics file'.format(
+                path))
+        record = record_struct(cores)
+        while True:
+            chunk = metrics.read(record.size)
+            if len(chunk) < record.size:
+                break
+            values = record.unpack(chunk)
+            yield MetricsSample(values[0], values[1], values[2], values[5:],
+                                values[3], values[4])
+
+
+class MetricsRecorder(object):
+    """
+        Time series of the samples of a run, in preallocated array ring
+        buffers: memory is fixed when created and the oldest samples are
+        overwritten once full
+        A sample takes 24 bytes, so 24 hours at the 2 Hz of the default
+        control period are about 4 MB; per core loads take 4 bytes a core
+        and are kept for as many of the latest samples as fit their own
+        size, older samples read them as 0
+    """
+    formats = ('csv', 'binary')
+    __capacity__ = 24 * 3600 * 2
+    __per_core_bytes__ = 32 * 1024 * 1024
+
+    def __init__(self, capacity=__capacity__, cores=0,
+                 per_core_bytes=__per_core_bytes__):
+        """
+        :param capacity: int samples kept
+        :param cores: int per core loads of every sample
+        :param per_core_bytes: int size of the per core loads
+        :raise ValueError: capacity is not positive
+        """
+        if capacity <= 0:
+            raise ValueError('Metrics capacity must be positive!')
+        self.capacity = capacity
+        self.cores = cores
+        self.timestamps = array.array('d', [0.0]) * capacity
+        self.setpoints = array.array('f', [0.0]) * capacity
+        self.loads = array.array('f', [0.0]) * capacity
+        self.workers = array.array('I', [0]) * capacity
+        self.limits = array.array('f', [0.0]) * capacity
+        self.per_core_capacity = min(capacity, per_core_bytes // (4 * cores)) \
+            if cores else 0
+        self.per_core = array.array('f', [0.0]) * (
+            self.per_core_capacity * cores)
+        self.__cursor__ = 0
+        self.__count__ = 0
+        self.__recorded__ = 0
+
+    def __len__(self):
+        return self.__count__
+
+    @property
+    def size(self):
+        """
+        :return: int bytes held by the buffers
+        """
+        return sum(x.itemsize * len(x) for x in (
+            self.timestamps, self.setpoints, self.loads, self.workers,
+            self.limits, self.per_core))
+
+    def record(self, timestamp, setpoint, load, per_core=(), workers=0,
+               limit=0.0):
+        """
+        Missing per core loads are recorded as 0
+        :param timestamp: float
+        :param setpoint: float, nan when there is no setpoint
+        :param load: float
+        :param per_core: dict {core: load} or sequence of float
+        :param workers: int
+        :param limit: float
+        """
+        index = self.__cursor__
+        self.timestamps[index] = timestamp
+        self.setpoints[index] = setpoint
+        self.loads[index] = load
+        self.workers[index] = workers
+        self.limits[index] = limit
+        if isinstance(per_core, dict):
+            per_core = [per_core.get(x, 0.0) for x in range(self.cores)]
+        per_core = list(per_core)[:self.cores]
+        per_core += [0.0] * (self.cores - len(per_core))
+        if self.per_core_capacity:
+            offset = self.__recorded__ % self.per_core_capacity * self.cores
+            self.per_core[offset:offset + self.cores] = array.array(
+                'f', per_core)
+        self.__cursor__ = (index + 1) % self.capacity
+        self.__count__ = min(self.__count__ + 1, self.capacity)
+        self.__recorded__ += 1
+
+    def samples(self):
+        """
+        Oldest first
+        :return: generator of MetricsSample
+        """
+        first = (self.__cursor__ - self.__count__) % self.capacity
+        for position in range(self.__count__):
+            yield self.sample((first + position) % self.capacity)
+
+    def sample(self, index):
+        """
+        :param index: int position in the buffers
+        :return: MetricsSample
+        """
+        age = (self.__cursor__ - 1 - index) % self.capacity
+        if age < self.per_core_capacity:
+            offset = (self.__recorded__ - 1 - age) % \
+                self.per_core_capacity * self.cores
+            per_core = tuple(self.per_core[offset:offset + self.cores])
+        else:
+            per_core = (0.0,) * self.cores
+        return MetricsSample(self.timestamps[index], self.setpoints[index],
+                             self.loads[index], per_core,
+                             self.workers[index], self.limits[index])
+
+    def since(self, timestamp):
+        """
+        Samples newer than the timestamp, found from the newest back, so
+        polling the latest ones does not walk the whole buffer
+        :param timestamp: float
+        :return: list of MetricsSample, oldest first
+        """
+        count = 0
+        while count < self.__count__ and self.timestamps[
+                (self.__cursor__ - count - 1) % self.capacity] > timestamp:
+            count += 1
+        return [self.sample((self.__cursor__ - x) % self.capacity)
+                for x in range(count, 0, -1)]
+
+    def to_csv(self, path):
+        """
+        :param path: str
+        """
+        with open(path, 'w') as output:
+            output.write(','.join(
+                ['timestamp', 'setpoint', 'load', 'workers', 'limit'] +
+                ['core{0}'.format(x) for x in range(self.cores)]) + '\n')
+            for sample in self.samples():
+                output.write(','.join(
+                    ['{0:.3f}'.format(sample.timestamp)] +
+                    ['{0:.2f}'.format(x) for x in (sample.setpoint,
+                                                   sample.load)] +
+                    [str(sample.workers), '{0:.2f}'.format(sample.limit)] +
+                    ['{0:.2f}'.format(x) for x in sample.per_core]) + '\n')
+
+    def to_binary(self, path):
+        """
+        :param path: str
+        """
+        record = record_struct(self.cores)
+        with open(path, 'wb') as output:
+            output.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION,
+                                            self.cores))
+            for sample in self.samples():
+                output.write(record.pack(
+                    sample.timestamp, sample.setpoint, sample.load,
+                    sample.workers, sample.limit, *sample.per_core))
+
+    def export(self, path, output_format='csv'):
+        """
+        :param path: str
+        :param output_format: str csv or binary
+        :raise NotImplementedError: format not in accepted values
+        """
+        if output_format not in self.formats:
+            raise NotImplementedError('This metrics format is not supported!')
+        if output_format == 'binary':
+            self.to_binary(path)
+        else:
+            self.to_csv(path)
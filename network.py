@@ -0,0 +1,321 @@
+import ctypes
+import ctypes.util
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import tempfile
+import time
+from paced import paced, PacedWorkers
+
+PROC_NET_DEV = '/proc/net/dev'
+
+
+class NetDev(object):
+    """
+        Bandwidth or packet rate of an interface from /proc/net/dev
+    """
+    units = ('mbit', 'pps')
+
+    def __init__(self, interface='lo', unit='mbit', net_dev_path=PROC_NET_DEV):
+        """
+        :param interface: str
+        :param unit: str mbit (per second) or pps
+        :param net_dev_path: str
+        :raise NotImplementedError: unit not in accepted values
+        """
+        if unit not in self.units:
+            raise NotImplementedError('This unit is not supported!')
+        self.interface = interface
+        self.unit = unit
+        self.net_dev_path = net_dev_path
+        self.__last__ = None
+        self.__last_time__ = None
+
+    def read_counters(self):
+        """
+        Transmitted bytes and packets
+        :return: tuple (bytes, packets)
+        :raise ValueError: no such interface
+        """
+        with open(self.net_dev_path) as net_dev:
+            for line in net_dev:
+                name, _, counters = line.partition(':')
+                if counters and name.strip() == self.interface:
+                    counters = counters.split()
+                    return int(counters[8]), int(counters[9])
+        raise ValueError('No such interface: {0}'.format(self.interface))
+
+    def sample(self):
+        """
+        Rate since the previous sample, 0 on the first one
+        :return: float Mbit/s or packets per second
+        """
+        counters, now = self.read_counters(), time.time()
+        last, last_time = self.__last__, self.__last_time__
+        self.__last__, self.__last_time__ = counters, now
+        if last is None or now <= last_time:
+            return 0.0
+        if self.unit == 'pps':
+            return (counters[1] - last[1]) / (now - last_time)
+        return (counters[0] - last[0]) * 8 / 1e6 / (now - last_time)
+
+
+class IoVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p),
+                ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(IoVec)),
+                ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p),
+                ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+def datagram_batch(sock, packet_size, batch):
+    """
+    Batch of datagrams of one preallocated buffer sent with a single
+    sendmmsg call, on linux
+    :param sock: socket.socket connected udp socket
+    :param packet_size: int bytes
+    :param batch: int datagrams
+    :return: function sending the batch, returning the datagrams sent,
+    or None without sendmmsg
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    buffer_ = ctypes.create_string_buffer(packet_size)
+    iov = IoVec(ctypes.cast(buffer_, ctypes.c_void_p), packet_size)
+    messages = (MMsgHdr * batch)()
+    for message in messages:
+        message.msg_hdr.msg_iov = ctypes.pointer(iov)
+        message.msg_hdr.msg_iovlen = 1
+    fileno = sock.fileno()
+
+    def send():
+        """
+        :return: int datagrams sent, fewer when the socket buffer fills
+        :raise OSError: nothing could be sent
+        """
+        sent = sendmmsg(fileno, messages, batch, 0)
+        if sent < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return sent
+    # the messages point into these, keep them alive along with send
+    send.buffers = (buffer_, iov)
+    return send
+
+
+def net_sink(protocol, port, running):
+    """
+    Sink body: accepts and discards everything sent to the port into a
+    preallocated buffer
+    Sinks bound to the same port with SO_REUSEPORT share its connections
+    or datagrams
+    :param protocol: str tcp or udp
+    :param port: multiprocessing.Value int, 0 binds any free port and the
+    bound one is written back
+    :param running: multiprocessing.Value, the sink exits when false
+    """
+    # the parent handles Ctrl-C and stops the sink through running
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    kind = socket.SOCK_STREAM if protocol == 'tcp' else socket.SOCK_DGRAM
+    server = socket.socket(socket.AF_INET, kind)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server.bind(('127.0.0.1', port.value))
+    if protocol == 'tcp':
+        server.listen(64)
+    port.value = server.getsockname()[1]
+    buffer_ = bytearray(1 << 16)
+    if protocol == 'udp':
+        # a blocking receive per datagram, without a select in between
+        server.settimeout(0.1)
+        while running.value:
+            try:
+                server.recv_into(buffer_)
+            except (socket.timeout, socket.error):
+                pass
+        server.close()
+        return
+    sockets = [server]
+    while running.value:
+        readable = select.select(sockets, [], [], 0.1)[0]
+        for sock in readable:
+            if sock is server:
+                sockets.append(server.accept()[0])
+            elif not sock.recv_into(buffer_) and sock is not server:
+                sockets.remove(sock)
+                sock.close()
+    for sock in sockets:
+        sock.close()
+
+
+def net_sender(address, protocol, packet_size, batch, payload, index,
+               active, rate, busy, running):
+    """
+    Sender body: paced batches of packets, every batch in one call where
+    possible: over tcp one sendfile of the batch from the payload file
+    (or one send of a preallocated buffer), over udp one sendmmsg of the
+    batch (or a send per datagram without sendmmsg)
+    :param address: tuple (host, port)
+    :param protocol: str tcp or udp
+    :param packet_size: int bytes
+    :param batch: int packets sent on every pacing step
+    :param payload: str file of a batch of packets for sendfile
+    """
+    kind = socket.SOCK_STREAM if protocol == 'tcp' else socket.SOCK_DGRAM
+    sock = socket.socket(socket.AF_INET, kind)
+    sock.connect(address)
+    size = packet_size * batch
+    buffer_ = memoryview(bytearray(size if protocol == 'tcp'
+                                   else packet_size))
+    sendfile = getattr(os, 'sendfile', None) if protocol == 'tcp' else None
+    payload_fd = os.open(payload, os.O_RDONLY) if sendfile else None
+    send_batch = datagram_batch(sock, packet_size, batch) \
+        if protocol == 'udp' else None
+    for _ in paced(index, active, rate, busy, running, batch=batch):
+        try:
+            if sendfile:
+                offset = 0
+                while offset < size:
+                    sent = sendfile(sock.fileno(), payload_fd, offset,
+                                    size - offset)
+                    if not sent:
+                        break
+                    offset += sent
+            elif protocol == 'tcp':
+                sock.sendall(buffer_)
+            elif send_batch:
+                send_batch()
+            else:
+                for _ in range(batch):
+                    sock.send(buffer_)
+        except (socket.error, OSError):
+            # a full udp socket buffer drops the packets, as a wire would
+            pass
+    if payload_fd is not None:
+        os.close(payload_fd)
+    sock.close()
+
+
+class NetworkStress(PacedWorkers):
+    """
+        Network traffic generator: paced sender processes to a sink, by
+        default local ones on loopback, one per sender where SO_REUSEPORT
+        spreads the traffic over them, measured on the interface the
+        traffic goes through
+    """
+    __packet_size__ = 1400
+
+    def __init__(self, protocol='tcp', target=None, interface='lo',
+                 unit='mbit', packet_size=__packet_size__, batch=32,
+                 max_workers=4):
+        """
+        :param protocol: str tcp or udp
+        :param target: tuple (host, port) of a sink, e.g. in a network
+        namespace, a local sink is started if None
+        :param interface: str interface to measure
+        :param unit: str mbit or pps
+        :param packet_size: int bytes of every send
+        :param batch: int packets sent on every pacing step
+        :param max_workers: int
+        """
+        PacedWorkers.__init__(self, max_workers=max_workers)
+        self.protocol = protocol
+        self.target = target
+        self.packet_size = packet_size
+        self.batch = batch
+        self.stats = NetDev(interface, unit=unit)
+        self.port = multiprocessing.Value('l', 0, lock=False)
+        self.__sinks__ = []
+        self.__payload__ = None
+
+    def start_sink(self, timeout=5.0):
+        """
+        The first sink binds a free port, the others join it
+        :param timeout: float seconds to wait for the sink to bind
+        :return: tuple (host, port)
+        :raise OSError: the sink did not bind
+        """
+        sinks = self.max_workers if hasattr(socket, 'SO_REUSEPORT') else 1
+        for _ in range(sinks):
+            sink = multiprocessing.Process(
+                target=net_sink, args=(self.protocol, self.port,
+                                       self.running))
+            sink.daemon = True
+            sink.start()
+            self.__sinks__.append(sink)
+            deadline = time.time() + timeout
+            while not self.port.value and time.time() < deadline:
+                time.sleep(0.01)
+            if not self.port.value:
+                raise OSError('Network sink did not start')
+        return '127.0.0.1', self.port.value
+
+    def prepare(self):
+        self.running.value = 1
+        if not self.target:
+            self.target = self.start_sink()
+        payload, self.__payload__ = tempfile.mkstemp(prefix='stressauto')
+        os.write(payload, b'\0' * self.packet_size * self.batch)
+        os.close(payload)
+
+    @property
+    def pids(self):
+        """
+        :return: tuple senders and the local sinks
+        """
+        return PacedWorkers.pids.fget(self) + tuple(
+            x.pid for x in self.__sinks__)
+
+    def worker(self):
+        return net_sender, (self.target, self.protocol, self.packet_size,
+                            self.batch, self.__payload__)
+
+    def measure(self):
+        """
+        :return: float Mbit/s or packets per second
+        """
+        self.start()
+        return self.stats.sample()
+
+    def operations(self, output):
+        """
+        :param output: float Mbit/s or packets per second
+        :return: float packets per second
+        """
+        if self.stats.unit == 'pps':
+            return output
+        return output * 1e6 / 8 / self.packet_size
+
+    def status(self, measurement):
+        """
+        :param measurement: float
+        :return: str
+        """
+        return 'Network traffic is currently at {0:.1f} {1}, {2} senders'\
+            .format(measurement, self.stats.unit, self.active.value)
+
+    def cleanup(self):
+        for sink in self.__sinks__:
+            sink.join(1.0)
+            if sink.is_alive():
+                sink.terminate()
+        self.__sinks__ = []
+        if self.__payload__:
+            os.remove(self.__payload__)
+            self.__payload__ = None
@@ -0,0 +1,143 @@
+import multiprocessing
+import signal
+import time
+
+
+def paced(index, active, rate, busy, running, batch=1):
+    """
+    Pacing of a worker body: yields once for every batch of operations to
+    perform now, while the worker index is below active
+    Reports the fraction of time spent in the operations to busy[index]
+    :param index: int
+    :param active: multiprocessing.Value int active workers
+    :param rate: multiprocessing.Value float operations per second per worker
+    :param busy: multiprocessing.Array float
+    :param running: multiprocessing.Value, pacing stops when false
+    :param batch: int operations performed on every yield
+    """
+    # Ctrl-C is for the parent, which stops pacing through running
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    next_op = window_start = time.time()
+    busy_time = 0.0
+    while running.value:
+        now = time.time()
+        if now - window_start >= 0.5:
+            busy[index] = busy_time / (now - window_start)
+            busy_time, window_start = 0.0, now
+        if index >= active.value or rate.value <= 0:
+            next_op = now
+            time.sleep(0.05)
+            continue
+        if next_op > now:
+            time.sleep(min(next_op - now, 0.05))
+            continue
+        yield
+        busy_time += time.time() - now
+        # do not bank more than 100ms of missed operations
+        next_op = max(next_op + batch / rate.value, time.time() - 0.1)
+
+
+class PacedWorkers(object):
+    """
+        Pool of worker processes sharing an operation rate
+        The controller sets the rate, the number of active workers follows
+        how busy they are, so slow targets get more concurrency and fast
+        ones are not flooded
+        Subclasses give the worker body and how an output maps to
+        operations per second
+    """
+    output_limits = (0.0, None)
+    setpoint_limits = (0.0, None)
+
+    def __init__(self, max_workers=16):
+        """
+        :param max_workers: int
+        """
+        self.max_workers = max_workers
+        self.active = multiprocessing.Value('l', 1, lock=False)
+        self.rate = multiprocessing.Value('d', 0, lock=False)
+        self.busy = multiprocessing.Array('d', max_workers, lock=False)
+        self.running = multiprocessing.Value('b', 0, lock=False)
+        self.__processes__ = []
+
+    def worker(self):
+        """
+        Worker body and its arguments, the pacing arguments
+        (index, active, rate, busy, running) are appended
+        :return: tuple (callable, tuple)
+        """
+        raise NotImplementedError('Paced workers need a worker body')
+
+    def operations(self, output):
+        """
+        :param output: float controller output
+        :return: float operations per second
+        """
+        raise NotImplementedError('Paced workers need an operation rate')
+
+    def prepare(self):
+        """
+        Called once before the workers start
+        """
+        pass
+
+    def cleanup(self):
+        """
+        Called once after the workers stopped
+        """
+        pass
+
+    @property
+    def pids(self):
+        """
+        :return: tuple
+        """
+        return tuple(x.pid for x in self.__processes__)
+
+    def start(self):
+        if self.__processes__:
+            return
+        self.prepare()
+        self.running.value = 1
+        target, args = self.worker()
+        for index in range(self.max_workers):
+            process = multiprocessing.Process(
+                target=target, args=args + (index, self.active, self.rate,
+                                            self.busy, self.running))
+            process.daemon = True
+            process.start()
+            self.__processes__.append(process)
+
+    def adjust_concurrency(self):
+        """
+        One more worker when the active ones are saturated, one less when
+        they mostly wait on their pacing
+        """
+        active = self.active.value
+        busy = sum(self.busy[:active]) / active
+        if busy > 0.9 and active < self.max_workers:
+            self.active.value = active + 1
+        elif busy < 0.4 and active > 1:
+            self.active.value = active - 1
+
+    def actuate(self, output):
+        """
+        :param output: float controller output
+        """
+        self.start()
+        self.adjust_concurrency()
+        self.rate.value = self.operations(output) / self.active.value
+
+    def stop(self, timeout=2.0):
+        """
+        :param timeout: float seconds
+        """
+        if not self.__processes__:
+            return
+        self.running.value = 0
+        for process in self.__processes__:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.__processes__ = []
+        self.cleanup()
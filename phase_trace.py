@@ -0,0 +1,159 @@
+import array
+import collections
+import json
+import os
+import threading
+from controller import monotonic
+
+PhaseEvent = collections.namedtuple('PhaseEvent',
+                                    ('name', 'start', 'duration', 'thread'))
+
+
+def percentile(values, percent):
+    """
+    Nearest rank percentile
+    :param values: sorted sequence of float
+    :param percent: float 0 to 100
+    :return: float or None if there are no values
+    """
+    if not values:
+        return None
+    rank = int(round(percent / 100.0 * (len(values) - 1)))
+    return values[min(len(values) - 1, max(0, rank))]
+
+
+class NullPhase(object):
+    """
+        Phase of a run that is not traced
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+class Phase(object):
+    """
+        Times the block it guards into its tracer
+    """
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, *_):
+        self.tracer.record(self.name, self.start,
+                           self.tracer.clock() - self.start)
+        return False
+
+
+class PhaseTracer(object):
+    """
+        Monotonic timings of the phases of the control loops
+        Every duration is kept for the percentiles, 8 bytes each, the
+        events for the export are the latest max events
+    """
+    formats = ('chrome', 'jsonl')
+    __max_events__ = 100000
+
+    def __init__(self, max_events=__max_events__, clock=monotonic):
+        """
+        :param max_events: int events kept for the export
+        :param clock: callable returning monotonic seconds
+        """
+        self.clock = clock
+        self.origin = clock()
+        self.events = collections.deque(maxlen=max_events)
+        self.durations = collections.OrderedDict()
+
+    def phase(self, name):
+        """
+        :param name: str
+        :return: context manager timing its block
+        """
+        return Phase(self, name)
+
+    def traced(self, name, function):
+        """
+        :param name: str
+        :param function: callable
+        :return: callable timing every call of the function
+        """
+        def traced_call(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+        return traced_call
+
+    def record(self, name, start, duration):
+        """
+        :param name: str
+        :param start: float monotonic seconds
+        :param duration: float seconds
+        """
+        self.events.append(PhaseEvent(name, start - self.origin, duration,
+                                      threading.current_thread().ident))
+        if name not in self.durations:
+            self.durations[name] = array.array('d')
+        self.durations[name].append(duration)
+
+    def summary(self):
+        """
+        Per phase count, p50, p99, max and total, in milliseconds
+        :return: str table
+        """
+        lines = ['{0:<16} {1:>7} {2:>10} {3:>10} {4:>10} {5:>11}'.format(
+            'phase', 'count', 'p50 ms', 'p99 ms', 'max ms', 'total ms')]
+        for name, durations in self.durations.items():
+            values = sorted(durations)
+            lines.append(
+                '{0:<16} {1:>7} {2:>10.2f} {3:>10.2f} {4:>10.2f} {5:>11.1f}'
+                .format(name, len(values), 1000 * percentile(values, 50),
+                        1000 * percentile(values, 99), 1000 * values[-1],
+                        1000 * sum(values)))
+        return '\n'.join(lines)
+
+    def to_chrome(self, path):
+        """
+        Chrome trace event format, for chrome://tracing or Perfetto
+        :param path: str
+        """
+        pid = os.getpid()
+        with open(path, 'w') as output:
+            json.dump({'traceEvents': [
+                {'name': x.name, 'ph': 'X', 'ts': 1e6 * x.start,
+                 'dur': 1e6 * x.duration, 'pid': pid, 'tid': x.thread}
+                for x in self.events], 'displayTimeUnit': 'ms'}, output)
+
+    def to_json_lines(self, path):
+        """
+        One event per line, seconds since the tracer started
+        :param path: str
+        """
+        with open(path, 'w') as output:
+            for event in self.events:
+                output.write(json.dumps(
+                    {'phase': event.name, 'start': event.start,
+                     'duration': event.duration}) + '\n')
+
+    def export(self, path, output_format='chrome'):
+        """
+        :param path: str
+        :param output_format: str chrome or jsonl
+        :raise NotImplementedError: format not in accepted values
+        """
+        if output_format not in self.formats:
+            raise NotImplementedError('This trace format is not supported!')
+        if output_format == 'jsonl':
+            self.to_json_lines(path)
+        else:
+            self.to_chrome(path)
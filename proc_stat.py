@@ -0,0 +1,200 @@
+import collections
+import multiprocessing
+import os
+import time
+
+PROC = '/proc'
+PROC_STAT = '/proc/stat'
+
+CpuLoad = collections.namedtuple('CpuLoad', ('total', 'per_core'))
+
+
+class ProcStat(object):
+    """
+        Samples cpu utilisation from the jiffy counters of /proc/stat
+        Replaces forking top and grep for every sample: reading the counters
+        is a single file read, so samples can be taken every 50-100 ms
+    """
+    __stat_path__ = PROC_STAT
+    __interval__ = 0.1
+
+    def __init__(self, interval=__interval__, stat_path=PROC_STAT):
+        """
+        Interval is the minimum window (seconds) a load value is computed on
+        :param interval: float
+        :param stat_path: str
+        """
+        self.interval = interval
+        self.__stat_path__ = stat_path
+        self.__last_counters__ = None
+        self.__last_time__ = None
+        self.__last_load__ = None
+
+    @property
+    def interval(self):
+        """
+        :return: float
+        """
+        return self.__interval__
+
+    @interval.setter
+    def interval(self, value):
+        """
+        :param value: float
+        :raise ValueError: if interval is not positive
+        """
+        if value <= 0:
+            raise ValueError('Sampling interval must be positive!')
+        self.__interval__ = float(value)
+
+    @property
+    def last_load(self):
+        """
+        Latest computed load, without sampling again
+        :return: CpuLoad or None
+        """
+        return self.__last_load__
+
+    @staticmethod
+    def parse_counters(line):
+        """
+        Busy and total jiffies of a cpu line
+        guest and guest_nice are already accounted in user and nice
+        :param line: str
+        :return: tuple (name, busy, total)
+        """
+        fields = line.split()
+        values = [int(x) for x in fields[1:9]]
+        idle = sum(values[3:5])
+        total = sum(values)
+        return fields[0], total - idle, total
+
+    def read_counters(self):
+        """
+        Read the aggregate and per core counters
+        :return: dict {cpu name: (busy, total)}
+        """
+        counters = {}
+        with open(self.__stat_path__) as stat:
+            for line in stat:
+                if not line.startswith('cpu'):
+                    break
+                name, busy, total = self.parse_counters(line)
+                counters[name] = (busy, total)
+        return counters
+
+    @staticmethod
+    def utilisation(old, new):
+        """
+        Percent of busy jiffies between two readings of the same cpu
+        :param old: tuple (busy, total)
+        :param new: tuple (busy, total)
+        :return: float
+        """
+        total = new[1] - old[1]
+        if total <= 0:
+            return 0.0
+        return 100.0 * (new[0] - old[0]) / total
+
+    def compute_load(self, old, new):
+        """
+        :param old: dict {cpu name: (busy, total)}
+        :param new: dict {cpu name: (busy, total)}
+        :return: CpuLoad
+        """
+        per_core = {}
+        for name, counters in new.items():
+            if name != 'cpu' and name in old:
+                per_core[int(name[3:])] = self.utilisation(old[name],
+                                                           counters)
+        return CpuLoad(self.utilisation(old['cpu'], new['cpu']), per_core)
+
+    def reset(self):
+        """
+        Take a new baseline reading
+        """
+        self.__last_counters__ = self.read_counters()
+        self.__last_time__ = time.time()
+
+    def sample(self):
+        """
+        Load over the window since the previous reading
+        A stale baseline (older than two intervals) is retaken and the
+        remainder of the interval is slept, so a window is never shorter
+        than the interval and never much older than it
+        :return: CpuLoad
+        """
+        now = time.time()
+        if self.__last_time__ is None or \
+                now - self.__last_time__ > 2 * self.interval:
+            self.reset()
+            now = self.__last_time__
+        remaining = self.interval - (now - self.__last_time__)
+        if remaining > 0:
+            time.sleep(remaining)
+        old = self.__last_counters__
+        self.reset()
+        self.__last_load__ = self.compute_load(old, self.__last_counters__)
+        return self.__last_load__
+
+    def get_cpuload(self):
+        """
+        Total cpu percent load
+        :return: float
+        """
+        return self.sample().total
+
+
+def process_cpu_ticks(pid, proc=PROC):
+    """
+    utime + stime of a process from /proc/<pid>/stat
+    :param pid: int or str
+    :param proc: str
+    :return: int clock ticks, None if the process is gone
+    """
+    try:
+        with open(os.path.join(proc, str(pid), 'stat')) as stat:
+            # the command name may hold spaces, fields follow its ')'
+            fields = stat.read().rsplit(')', 1)[1].split()
+    except (IOError, OSError):
+        return None
+    return int(fields[11]) + int(fields[12])
+
+
+class ProcessCpu(object):
+    """
+        Cpu load of a set of processes, in percent of the whole host
+    """
+
+    def __init__(self, pids, proc=PROC):
+        """
+        :param pids: callable returning the pids to account
+        :param proc: str
+        """
+        self.pids = pids
+        self.proc = proc
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.cpus = multiprocessing.cpu_count()
+        self.__last__ = {}
+        self.__last_time__ = None
+
+    def sample(self):
+        """
+        Load since the previous sample, 0 on the first one
+        Processes that appeared since are accounted from their start,
+        the ones that exited are dropped, and a pid that went back is a
+        new process under a reused pid
+        :return: float
+        """
+        ticks = dict((pid, process_cpu_ticks(pid, self.proc))
+                     for pid in self.pids())
+        ticks = dict((pid, x) for pid, x in ticks.items() if x is not None)
+        now = time.time()
+        last, last_time = self.__last__, self.__last_time__
+        self.__last__, self.__last_time__ = ticks, now
+        if last_time is None or now <= last_time:
+            return 0.0
+        used = sum(x - last.get(pid, 0) if x >= last.get(pid, 0) else x
+                   for pid, x in ticks.items())
+        return 100.0 * used / self.clock_ticks / (now - last_time) / \
+            self.cpus
@@ -0,0 +1,301 @@
+import bisect
+import math
+
+
+PERCENT = (0.0, 100.0)
+
+
+def clamp_load(load, limits=PERCENT):
+    """
+    :param load: float
+    :param limits: tuple (min, max), max None for loads in absolute units
+    :return: float within the limits
+    """
+    low, high = limits
+    load = max(low, load)
+    return min(high, load) if high is not None else load
+
+
+class Profile(object):
+    """
+        Setpoint as a function of the seconds elapsed since the start
+        Profiles carry no unit: negative loads are raised to 0, and the
+        run caps them at 100 when the target is a percent
+    """
+    duration = None
+    limits = (0.0, None)
+
+    def setpoint(self, elapsed):
+        """
+        :param elapsed: float seconds
+        :return: float load percent
+        """
+        raise NotImplementedError('Profile has to define a setpoint')
+
+    def finished(self, elapsed):
+        """
+        :param elapsed: float seconds
+        :return: bool
+        """
+        return self.duration is not None and elapsed >= self.duration
+
+    def segment(self, elapsed):
+        """
+        Name of the stretch of constant setpoint the elapsed time is in
+        :param elapsed: float seconds
+        :return: str, None while the setpoint moves
+        """
+        return None
+
+
+class ConstantProfile(Profile):
+
+    def __init__(self, load, duration=None):
+        """
+        :param load: float
+        :param duration: float seconds
+        """
+        self.load = clamp_load(load, self.limits)
+        self.duration = duration
+
+    def setpoint(self, elapsed):
+        return self.load
+
+    def segment(self, elapsed):
+        return 'limit {0:g}'.format(self.load)
+
+
+class RampProfile(Profile):
+    """
+        Linear ramp from start to end load, held at the end load
+    """
+
+    def __init__(self, start, end, duration):
+        """
+        :param start: float
+        :param end: float
+        :param duration: float seconds
+        """
+        self.start, self.end = (clamp_load(start, self.limits),
+                                 clamp_load(end, self.limits))
+        self.duration = duration
+
+    def setpoint(self, elapsed):
+        if elapsed >= self.duration:
+            return self.end
+        return self.start + (self.end - self.start) * \
+            max(0.0, elapsed) / self.duration
+
+
+class StepProfile(Profile):
+    """
+        Staircase: every level is held for step duration seconds
+    """
+
+    def __init__(self, levels, step_duration):
+        """
+        :param levels: tuple of float
+        :param step_duration: float seconds
+        :raise ValueError: no levels, or the steps take no time
+        """
+        if not levels:
+            raise ValueError('Step profile has no levels!')
+        if step_duration <= 0:
+            raise ValueError('Step duration must be positive!')
+        self.levels = tuple(clamp_load(x, self.limits) for x in levels)
+        self.step_duration = step_duration
+        self.duration = step_duration * len(self.levels)
+
+    def step(self, elapsed):
+        """
+        :param elapsed: float seconds
+        :return: int index of the level
+        """
+        step = int(max(0.0, elapsed) // self.step_duration)
+        return min(step, len(self.levels) - 1)
+
+    def setpoint(self, elapsed):
+        return self.levels[self.step(elapsed)]
+
+    def segment(self, elapsed):
+        step = self.step(elapsed)
+        return 'limit {0:g} (step {1})'.format(self.levels[step], step + 1)
+
+
+class SineProfile(Profile):
+    """
+        Sine wave around the mean load, e.g. a compressed diurnal cycle
+    """
+
+    def __init__(self, mean, amplitude, period, duration):
+        """
+        :param mean: float
+        :param amplitude: float
+        :param period: float seconds of one wave
+        :param duration: float seconds
+        :raise ValueError: the period is not positive
+        """
+        if period <= 0:
+            raise ValueError('Sine period must be positive!')
+        self.mean = mean
+        self.amplitude = amplitude
+        self.period = period
+        self.duration = duration
+
+    def setpoint(self, elapsed):
+        return clamp_load(self.mean + self.amplitude * math.sin(
+            2 * math.pi * elapsed / self.period), self.limits)
+
+
+class ScheduleProfile(Profile):
+    """
+        Piecewise schedule of (seconds, load) points, either linearly
+        interpolated or held until the next point
+    """
+
+    def __init__(self, points, interpolate=True):
+        """
+        :param points: iterable of (seconds, load)
+        :param interpolate: bool
+        :raise ValueError: no points
+        """
+        points = sorted((float(x), clamp_load(float(y), self.limits))
+                        for x, y in points)
+        if not points:
+            raise ValueError('Schedule has no points!')
+        self.times = [x[0] for x in points]
+        self.loads = [x[1] for x in points]
+        self.interpolate = interpolate
+        self.duration = self.times[-1]
+
+    @classmethod
+    def from_file(cls, path, interpolate=True):
+        """
+        One 'seconds load' point per line, comma or whitespace separated,
+        blank lines and # comments are skipped
+        :param path: str
+        :param interpolate: bool
+        :return: ScheduleProfile
+        :raise ValueError: a line is not a point
+        """
+        points = []
+        with open(path) as schedule:
+            for number, text in enumerate(schedule, 1):
+                line = text.split('#', 1)[0].replace(',', ' ').split()
+                if not line:
+                    continue
+                try:
+                    seconds, load = line
+                    points.append((float(seconds), float(load)))
+                except ValueError:
+                    raise ValueError('Malformed schedule line {0} of {1}: '
+                                     '{2}'.format(number, path,
+                                                  text.strip()))
+        return cls(points, interpolate=interpolate)
+
+    def setpoint(self, elapsed):
+        index = bisect.bisect_right(self.times, elapsed)
+        if index == 0:
+            return self.loads[0]
+        if index == len(self.times) or not self.interpolate:
+            return self.loads[index - 1]
+        start, end = self.times[index - 1], self.times[index]
+        return self.loads[index - 1] + \
+            (self.loads[index] - self.loads[index - 1]) * \
+            (elapsed - start) / (end - start)
+
+    def segment(self, elapsed):
+        index = bisect.bisect_right(self.times, elapsed)
+        if index == 0:
+            return 'limit {0:g} (0-{1:g} s)'.format(self.loads[0],
+                                                     self.times[0])
+        if index == len(self.times):
+            return 'limit {0:g} ({1:g} s-)'.format(self.loads[-1],
+                                                    self.times[-1])
+        if self.interpolate and \
+                self.loads[index - 1] != self.loads[index]:
+            return None
+        return 'limit {0:g} ({1:g}-{2:g} s)'.format(
+            self.loads[index - 1], self.times[index - 1], self.times[index])
+
+
+class TrackingRecord(object):
+    """
+        Setpoint versus achieved load over a run
+    """
+
+    def __init__(self):
+        self.samples = []
+
+    def record(self, elapsed, setpoint, load):
+        """
+        :param elapsed: float seconds
+        :param setpoint: float
+        :param load: float
+        """
+        self.samples.append((elapsed, setpoint, load))
+
+    @property
+    def rmse(self):
+        """
+        :return: float or None
+        """
+        if not self.samples:
+            return None
+        return math.sqrt(sum((x[2] - x[1]) ** 2 for x in self.samples) /
+                         len(self.samples))
+
+    @property
+    def mean_abs_error(self):
+        """
+        :return: float or None
+        """
+        if not self.samples:
+            return None
+        return sum(abs(x[2] - x[1]) for x in self.samples) / \
+            len(self.samples)
+
+    def report(self):
+        """
+        :return: str
+        """
+        if not self.samples:
+            return 'No samples tracked'
+        return 'Tracked {0} samples, rmse {1:.2f}, mean abs error ' \
+               '{2:.2f}'.format(len(self.samples), self.rmse,
+                                self.mean_abs_error)
+
+    def to_csv(self, path):
+        """
+        :param path: str
+        """
+        with open(path, 'w') as csv:
+            csv.write('elapsed,setpoint,load\n')
+            for sample in self.samples:
+                csv.write('{0:.3f},{1:.2f},{2:.2f}\n'.format(*sample))
+
+
+def parse_profile(spec):
+    """
+    Profile from a command line spec:
+    ramp:START:END:SECONDS, step:L1,L2,..:SECONDS_PER_STEP,
+    sine:MEAN:AMPLITUDE:PERIOD:SECONDS, file:PATH
+    :param spec: str
+    :return: Profile
+    :raise ValueError: unknown or malformed spec
+    """
+    kind, _, arguments = spec.partition(':')
+    if kind == 'file':
+        return ScheduleProfile.from_file(arguments)
+    arguments = arguments.split(':')
+    try:
+        if kind == 'ramp':
+            return RampProfile(*(float(x) for x in arguments))
+        if kind == 'step':
+            return StepProfile([float(x) for x in arguments[0].split(',')],
+                               float(arguments[1]))
+        if kind == 'sine':
+            return SineProfile(*(float(x) for x in arguments))
+    except (TypeError, IndexError, ValueError):
+        raise ValueError('Malformed {0} profile: {1}'.format(kind, spec))
+    raise ValueError('No such profile: {0}'.format(kind))
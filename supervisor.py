@@ -0,0 +1,270 @@
+import collections
+import errno
+import os
+import select
+import threading
+import time
+import weakref
+
+
+class ChildOutput(object):
+    """
+        Output of a child process, split in lines
+        The latest lines are kept for whoever waits on them, older ones are
+        dropped, so the pipe is always drained
+    """
+    __max_lines__ = 256
+
+    def __init__(self, process, max_lines=__max_lines__):
+        """
+        :param process: subprocess.Popen
+        :param max_lines: int
+        """
+        self.process = process
+        self.lines = collections.deque(maxlen=max_lines)
+        self.partial = b''
+        self.closed = False
+
+    def feed(self, data):
+        """
+        :param data: bytes read from the pipe, empty at end of file
+        """
+        if not data:
+            self.closed = True
+            if self.partial:
+                self.lines.append(self.partial.decode('utf-8', 'replace'))
+            self.partial = b''
+            return
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        self.lines.extend(x.decode('utf-8', 'replace') for x in lines)
+
+
+class Supervisor(object):
+    """
+        Watches the children of StressAuto from a single thread:
+        drains their output, so a chatty child never stalls on a full pipe,
+        and notices them, or any pid, exit as soon as they do
+        Exits are seen through a pidfd where the platform has them, through
+        the end of the output or a poll otherwise
+        Callbacks run on the supervisor thread and should only record
+    """
+    __poll__ = 0.1
+
+    def __init__(self, poll=__poll__):
+        """
+        :param poll: float seconds between checks of pids without a pidfd
+        """
+        self.poll = poll
+        self.__outputs__ = {}
+        # outputs by process, kept after they ended for wait_for
+        self.__watched__ = weakref.WeakKeyDictionary()
+        self.__pids__ = {}
+        self.__exiting__ = []
+        self.__changed__ = threading.Condition(threading.Lock())
+        self.__thread__ = None
+        self.__running__ = False
+
+    @property
+    def running(self):
+        """
+        :return: bool
+        """
+        return self.__running__
+
+    def start(self):
+        if self.__running__:
+            return
+        self.__running__ = True
+        self.__thread__ = threading.Thread(target=self.supervise)
+        self.__thread__.daemon = True
+        self.__thread__.start()
+
+    def stop(self, timeout=1.0):
+        """
+        :param timeout: float seconds
+        """
+        if not self.__running__:
+            return
+        self.__running__ = False
+        self.__thread__.join(timeout)
+        self.__thread__ = None
+        for pidfd, _ in self.__pids__.values():
+            if pidfd is not None:
+                os.close(pidfd)
+        self.__pids__.clear()
+        self.__outputs__.clear()
+        self.__watched__.clear()
+        del self.__exiting__[:]
+
+    def watch(self, process):
+        """
+        Drain the output of the process and keep its latest lines
+        Outputs that are not pipes, as of stand in processes, are read
+        directly by wait_for
+        :param process: subprocess.Popen
+        :return: subprocess.Popen
+        """
+        stdout = getattr(process, 'stdout', None)
+        fileno = getattr(stdout, 'fileno', None)
+        if not fileno:
+            return process
+        with self.__changed__:
+            if process not in self.__watched__:
+                output = ChildOutput(process)
+                self.__outputs__[fileno()] = output
+                self.__watched__[process] = output
+        self.start()
+        return process
+
+    def watch_pid(self, pid, on_exit):
+        """
+        :param pid: int, need not be a child
+        :param on_exit: callable taking the pid, called once it exited
+        """
+        pidfd_open = getattr(os, 'pidfd_open', None)
+        pidfd = None
+        if pidfd_open:
+            try:
+                pidfd = pidfd_open(pid)
+            except OSError as exc:
+                if exc.errno == errno.ESRCH:
+                    on_exit(pid)
+                    return
+        with self.__changed__:
+            self.__pids__[pid] = (pidfd, on_exit)
+        self.start()
+
+    def forget_pid(self, pid):
+        """
+        Stop watching a pid, e.g. before killing it on purpose
+        :param pid: int
+        """
+        with self.__changed__:
+            pidfd, _ = self.__pids__.pop(pid, (None, None))
+        if pidfd is not None:
+            os.close(pidfd)
+
+    def wait_for(self, process, pattern, count=1, timeout=None):
+        """
+        Wait until the process printed count lines matching the pattern
+        :param process: subprocess.Popen
+        :param pattern: compiled regular expression
+        :param count: int
+        :param timeout: float seconds, None waits forever
+        :return: list of str, the matched part of the lines
+        :raise OSError: timed out, or the output ended before
+        """
+        with self.__changed__:
+            output = self.__watched__.get(process)
+        matches = []
+        deadline = None if timeout is None else time.time() + timeout
+        if output is None:
+            # unwatched outputs are read here, the deadline is checked
+            # between lines
+            while len(matches) < count:
+                if deadline is not None and time.time() >= deadline:
+                    raise OSError('Process {0} did not report its workers '
+                                  'in {1} seconds'.format(process.pid,
+                                                          timeout))
+                line = process.stdout.readline()
+                if not line:
+                    raise OSError('Process {0} exited before reporting '
+                                  'its workers'.format(process.pid))
+                match = pattern.search(line)
+                if match:
+                    matches.append(match.group())
+            return matches
+        with self.__changed__:
+            while True:
+                while output.lines and len(matches) < count:
+                    match = pattern.search(output.lines.popleft())
+                    if match:
+                        matches.append(match.group())
+                if len(matches) >= count:
+                    return matches
+                if output.closed:
+                    raise OSError('Process {0} exited before reporting '
+                                  'its workers'.format(process.pid))
+                remaining = None if deadline is None \
+                    else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise OSError('Process {0} did not report its workers '
+                                  'in {1} seconds'.format(process.pid,
+                                                          timeout))
+                self.__changed__.wait(remaining if remaining is not None
+                                      else self.poll)
+
+    def read_outputs(self, readable):
+        """
+        :param readable: list of file descriptors of watched outputs
+        """
+        for fd in readable:
+            output = self.__outputs__[fd]
+            try:
+                data = os.read(fd, 65536)
+            except OSError:
+                data = b''
+            with self.__changed__:
+                output.feed(data)
+                if output.closed:
+                    del self.__outputs__[fd]
+                self.__changed__.notify_all()
+            if output.closed:
+                output.process.stdout.close()
+                # reap it, an exited child stays a zombie until then, it
+                # may still be exiting when its output ends
+                if output.process.poll() is None:
+                    self.__exiting__.append(output.process)
+
+    def reap(self):
+        """
+        Reap the children whose output ended once they exited
+        """
+        self.__exiting__ = [x for x in self.__exiting__ if x.poll() is None]
+
+    def check_pids(self, readable):
+        """
+        :param readable: list of pidfds that became readable
+        """
+        exited = []
+        for pid, (pidfd, on_exit) in list(self.__pids__.items()):
+            if pidfd is not None:
+                if pidfd in readable:
+                    exited.append(pid)
+                continue
+            try:
+                os.kill(pid, 0)
+            except OSError as exc:
+                if exc.errno == errno.ESRCH:
+                    exited.append(pid)
+        for pid in exited:
+            with self.__changed__:
+                pidfd, on_exit = self.__pids__.pop(pid, (None, None))
+            if pidfd is not None:
+                os.close(pidfd)
+            if on_exit:
+                on_exit(pid)
+
+    def supervise(self):
+        """
+        Body of the supervisor thread
+        """
+        while self.__running__:
+            with self.__changed__:
+                outputs = list(self.__outputs__)
+                pidfds = [x[0] for x in self.__pids__.values()
+                          if x[0] is not None]
+            if not outputs and not pidfds and not self.__exiting__:
+                readable = []
+                time.sleep(self.poll)
+            else:
+                try:
+                    readable = select.select(outputs + pidfds, [], [],
+                                             self.poll)[0]
+                except (select.error, OSError, ValueError):
+                    # a descriptor was closed under us, watch again
+                    continue
+            self.read_outputs([x for x in readable if x in outputs])
+            self.check_pids([x for x in readable if x in pidfds])
+            self.reap()
@@ -0,0 +1,319 @@
+import collections
+import glob
+import os
+import re
+
+SYS_CPU = '/sys/devices/system/cpu'
+SYS_THERMAL = '/sys/class/thermal'
+PROC_PRESSURE = '/proc/pressure'
+
+TelemetrySample = collections.namedtuple(
+    'TelemetrySample', ('timestamp', 'load', 'generated', 'workers',
+                        'frequencies', 'temperatures', 'pressure',
+                        'throttles'))
+
+
+def read_number(path):
+    """
+    :param path: str
+    :return: int, or None when the file is missing or unreadable
+    """
+    try:
+        with open(path) as number:
+            return int(number.read().strip())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def cpu_directories(root=SYS_CPU):
+    """
+    :param root: str
+    :return: dict {cpu: str directory}
+    """
+    directories = {}
+    for path in glob.glob(os.path.join(root, 'cpu[0-9]*')):
+        directories[int(os.path.basename(path)[3:])] = path
+    return directories
+
+
+def frequency_paths(root=SYS_CPU):
+    """
+    :param root: str
+    :return: dict {cpu: str scaling_cur_freq}, empty without cpufreq
+    """
+    paths = {}
+    for cpu, path in cpu_directories(root).items():
+        path = os.path.join(path, 'cpufreq', 'scaling_cur_freq')
+        if os.path.exists(path):
+            paths[cpu] = path
+    return paths
+
+
+def throttle_paths(root=SYS_CPU):
+    """
+    Thermal throttling event counters of the cpus, on x86
+    :param root: str
+    :return: list of str, empty where not counted
+    """
+    paths = []
+    for path in sorted(cpu_directories(root).values()):
+        for counter in ('core_throttle_count', 'package_throttle_count'):
+            counter = os.path.join(path, 'thermal_throttle', counter)
+            if os.path.exists(counter):
+                paths.append(counter)
+    return paths
+
+
+def thermal_zones(root=SYS_THERMAL):
+    """
+    :param root: str
+    :return: dict {zone type: str temp}, empty without thermal zones
+    """
+    zones = {}
+    for path in sorted(glob.glob(os.path.join(root, 'thermal_zone*'))):
+        try:
+            with open(os.path.join(path, 'type')) as zone:
+                name = zone.read().strip()
+        except (IOError, OSError):
+            name = os.path.basename(path)
+        if name in zones:
+            name = '{0}-{1}'.format(name, os.path.basename(path)[12:])
+        zones[name] = os.path.join(path, 'temp')
+    return zones
+
+
+def read_frequencies(paths):
+    """
+    :param paths: dict {cpu: str} of frequency_paths
+    :return: dict {cpu: kHz}
+    """
+    frequencies = {}
+    for cpu, path in paths.items():
+        frequency = read_number(path)
+        if frequency:
+            frequencies[cpu] = frequency
+    return frequencies
+
+
+def read_throttles(paths):
+    """
+    :param paths: list of str of throttle_paths
+    :return: int events counted
+    """
+    return sum(x for x in (read_number(path) for path in paths) if x)
+
+
+def read_temperatures(zones):
+    """
+    :param zones: dict {zone type: str} of thermal_zones
+    :return: dict {zone type: float celsius}
+    """
+    temperatures = {}
+    for name, path in zones.items():
+        temperature = read_number(path)
+        if temperature is not None:
+            temperatures[name] = temperature / 1000.0
+    return temperatures
+
+
+def read_pressure(root=PROC_PRESSURE):
+    """
+    Stall totals of the pressure stall information, where the kernel
+    has it
+    :param root: str
+    :return: dict {resource: int microseconds some task stalled}
+    """
+    pressure = {}
+    for resource in ('cpu', 'memory', 'io'):
+        try:
+            with open(os.path.join(root, resource)) as stall:
+                match = re.search(r'^some .*total=(\d+)', stall.read(),
+                                  re.MULTILINE)
+        except (IOError, OSError):
+            continue
+        if match:
+            pressure[resource] = int(match.group(1))
+    return pressure
+
+
+def mean(values):
+    """
+    :param values: iterable of float
+    :return: float, or None without values
+    """
+    values = list(values)
+    return sum(values) / len(values) if values else None
+
+
+class Telemetry(object):
+    """
+        Cpu frequencies, thermal zones, throttling events and pressure
+        stalls, sampled along with the load samples, to tell how much work
+        a load percent was worth while the host throttles
+        Pressure is kept as the percent of the time since the previous
+        sample some task stalled
+        The cpus and zones are found once, the samples only read them
+    """
+    __max_samples__ = 100000
+    # mean frequency below this ratio of its highest so far is throttled
+    __throttle_ratio__ = 0.9
+    # generated load percents the demand may move and count as unchanged
+    __demand_tolerance__ = 5.0
+
+    def __init__(self, cpus=1.0, max_samples=__max_samples__, cpu_root=SYS_CPU,
+                 thermal_root=SYS_THERMAL, pressure_root=PROC_PRESSURE):
+        """
+        :param cpus: float cpus a load of 100 percent takes
+        :param max_samples: int latest samples kept
+        :param cpu_root: str
+        :param thermal_root: str
+        :param pressure_root: str
+        """
+        self.cpus = cpus
+        self.pressure_root = pressure_root
+        self.frequency_paths = frequency_paths(cpu_root)
+        self.throttle_paths = throttle_paths(cpu_root)
+        self.thermal_zones = thermal_zones(thermal_root)
+        self.samples = collections.deque(maxlen=max_samples)
+        self.__last_pressure__ = None
+
+    def sample(self, timestamp, load, generated, workers):
+        """
+        :param timestamp: float seconds
+        :param load: float percent
+        :param generated: float percent of the load StressAuto generates
+        :param workers: int
+        :return: TelemetrySample
+        """
+        totals = read_pressure(self.pressure_root)
+        pressure = {}
+        if self.__last_pressure__:
+            last_time, last_totals = self.__last_pressure__
+            elapsed = timestamp - last_time
+            for resource, total in totals.items():
+                if elapsed > 0 and resource in last_totals:
+                    pressure[resource] = 100.0 * (
+                        total - last_totals[resource]) / (elapsed * 1e6)
+        self.__last_pressure__ = (timestamp, totals)
+        telemetry = TelemetrySample(
+            timestamp, load, generated, workers,
+            read_frequencies(self.frequency_paths),
+            read_temperatures(self.thermal_zones), pressure,
+            read_throttles(self.throttle_paths))
+        self.samples.append(telemetry)
+        return telemetry
+
+    def work_per_worker(self, telemetry):
+        """
+        Effective throughput of a worker: the cpu time it gets at the
+        frequency it runs at
+        :param telemetry: TelemetrySample
+        :return: float GHz, or None without frequencies or workers
+        """
+        frequency = mean(telemetry.frequencies.values())
+        if frequency is None or not telemetry.workers:
+            return None
+        return telemetry.generated / 100.0 * self.cpus * frequency / 1e6 / \
+            telemetry.workers
+
+    def same_demand(self, telemetry, other):
+        """
+        The governor lowers the frequency when less is asked of the cpus,
+        a throttled cpu while the same is asked
+        :param telemetry: TelemetrySample
+        :param other: TelemetrySample
+        :return: bool
+        """
+        return telemetry.workers == other.workers and abs(
+            telemetry.generated - other.generated) <= \
+            self.__demand_tolerance__
+
+    def throttle_start(self):
+        """
+        First sample where a cpu counted a throttling event, or, where the
+        cpus count none, where the mean frequency fell below the throttle
+        ratio of its highest since the demand last changed
+        :return: TelemetrySample, or None if it never throttled
+        """
+        if self.throttle_paths:
+            samples = iter(self.samples)
+            first = next(samples, None)
+            for telemetry in samples:
+                if telemetry.throttles > first.throttles:
+                    return telemetry
+            return None
+        peak = None
+        for telemetry in self.samples:
+            frequency = mean(telemetry.frequencies.values())
+            if frequency is None:
+                continue
+            if peak and not self.same_demand(peak, telemetry):
+                peak = None
+            if peak and frequency < self.__throttle_ratio__ * mean(
+                    peak.frequencies.values()):
+                return telemetry
+            if not peak or frequency > mean(peak.frequencies.values()):
+                peak = telemetry
+        return None
+
+    def describe(self, samples):
+        """
+        :param samples: list of TelemetrySample
+        :return: str mean frequency, hottest zone, cpu pressure and work
+        per worker of the samples
+        """
+        frequency = mean(x for sample in samples
+                         for x in sample.frequencies.values())
+        hottest = max([x for sample in samples
+                       for x in sample.temperatures.values()] or [None])
+        pressure = mean(x.pressure['cpu'] for x in samples
+                        if 'cpu' in x.pressure)
+        work = mean(x for x in (self.work_per_worker(sample)
+                                for sample in samples) if x is not None)
+        return '{0}, hottest {1}, cpu pressure {2}, {3} per worker'.format(
+            '{0:.0f} MHz'.format(frequency / 1000.0) if frequency
+            else 'no cpufreq',
+            '{0:.1f} C'.format(hottest) if hottest is not None else '-',
+            '{0:.1f}%'.format(pressure) if pressure is not None else '-',
+            '{0:.2f} GHz'.format(work) if work is not None else '-')
+
+    def summary(self):
+        """
+        :return: str, before and after throttling started, if it did
+        """
+        samples = list(self.samples)
+        if not samples:
+            return 'No telemetry samples'
+        start = self.throttle_start()
+        if start is None:
+            return 'No throttling seen: {0}'.format(self.describe(samples))
+        before = [x for x in samples if x.timestamp < start.timestamp]
+        after = [x for x in samples if x.timestamp >= start.timestamp]
+        return 'Throttling started {0:.1f} s into the run, at {1:.1f}% ' \
+               'load\nBefore: {2}\nAfter: {3}'.format(
+                   start.timestamp - samples[0].timestamp, start.load,
+                   self.describe(before), self.describe(after))
+
+    def to_csv(self, path):
+        """
+        Mean frequency, hottest zone, throttle events and stall percents
+        of every sample
+        :param path: str
+        """
+        with open(path, 'w') as output:
+            output.write('timestamp,load,generated,workers,mhz,celsius,'
+                         'throttles,cpu_stall,memory_stall,io_stall\n')
+            for sample in self.samples:
+                frequency = mean(sample.frequencies.values())
+                output.write(','.join([
+                    '{0:.3f}'.format(sample.timestamp),
+                    '{0:.2f}'.format(sample.load),
+                    '{0:.2f}'.format(sample.generated), str(sample.workers),
+                    '{0:.0f}'.format(frequency / 1000.0)
+                    if frequency else '',
+                    '{0:.1f}'.format(max(sample.temperatures.values()))
+                    if sample.temperatures else '',
+                    str(sample.throttles)] +
+                    ['{0:.2f}'.format(sample.pressure[x])
+                     if x in sample.pressure else ''
+                     for x in ('cpu', 'memory', 'io')]) + '\n')
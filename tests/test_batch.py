@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from batch import BatchPhase, BatchRunner, BatchScenario
+
+
+class BatchPhaseTest(unittest.TestCase):
+
+    def test_limit_is_the_cpu_target(self):
+        phase = BatchPhase.from_dict({'limit': 40, 'duration': 30}, 0)
+        self.assertEqual(phase.targets, {'cpu': 40.0})
+        self.assertEqual(phase.name, 'cpu=40')
+
+    def test_aliases_are_resolved(self):
+        phase = BatchPhase.from_dict(
+            {'targets': {'mem': 60, 'n': 10}, 'duration': 30}, 0)
+        self.assertEqual(phase.targets, {'vm': 60.0, 'net': 10.0})
+
+    def test_scenario_hook_is_the_default(self):
+        self.assertEqual(BatchPhase.from_dict(
+            {'limit': 40, 'duration': 30}, 0, hook='./hook.sh').hook,
+            './hook.sh')
+        self.assertEqual(BatchPhase.from_dict(
+            {'limit': 40, 'duration': 30, 'hook': 'true'}, 0,
+            hook='./hook.sh').hook, 'true')
+
+    def test_malformed_phases(self):
+        for data in ({'duration': 30}, {'limit': 40},
+                     {'limit': 40, 'duration': 'long'},
+                     {'targets': {'gpu': 10}, 'duration': 30}):
+            self.assertRaises(ValueError, BatchPhase.from_dict, data, 0)
+
+
+class BatchScenarioTest(unittest.TestCase):
+
+    def test_sweep_appends_a_phase_per_step(self):
+        scenario = BatchScenario.from_dict({
+            'phases': [{'limit': 5, 'duration': 20}],
+            'sweep': {'from': 10, 'to': 30, 'step': 10, 'duration': 20}})
+        self.assertEqual([x.targets for x in scenario.phases],
+                         [{'cpu': 5.0}, {'cpu': 10.0}, {'cpu': 20.0},
+                          {'cpu': 30.0}])
+        self.assertEqual(scenario.phases[-1].name, 'cpu=30')
+
+    def test_sweep_includes_a_last_step_off_by_rounding(self):
+        scenario = BatchScenario.from_dict({
+            'sweep': {'from': 0.1, 'to': 0.3, 'step': 0.1,
+                      'duration': 20}})
+        self.assertEqual(len(scenario.phases), 3)
+
+    def test_malformed_sweeps(self):
+        for sweep in ({'from': 10, 'to': 30, 'duration': 20},
+                      {'from': 10, 'to': 30, 'step': 0, 'duration': 20}):
+            self.assertRaises(ValueError, BatchScenario.from_dict,
+                              {'sweep': sweep})
+
+    def test_malformed_scenarios(self):
+        self.assertRaises(ValueError, BatchScenario.from_dict, {})
+        self.assertRaises(ValueError, BatchScenario.from_dict, {
+            'settle': 30, 'phases': [{'limit': 40, 'duration': 30}]})
+        self.assertRaises(ValueError, BatchScenario.from_dict, {
+            'phases': [{'limit': 40, 'duration': 30}],
+            'settings': {'mode': 'pid'}})
+
+    def test_setpoints_bring_left_out_types_down(self):
+        scenario = BatchScenario.from_dict({'phases': [
+            {'targets': {'cpu': 30, 'vm': 50}, 'duration': 20},
+            {'limit': 60, 'duration': 20}]})
+        self.assertEqual(scenario.stress_types, ('cpu', 'vm'))
+        self.assertEqual(scenario.setpoints(scenario.phases[1]),
+                         {'cpu': 60.0, 'vm': 0.0})
+
+    def test_from_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'scenario.json')
+            with open(path, 'w') as scenario:
+                json.dump({'settle': 2, 'phases': [
+                    {'limit': 40, 'duration': 10}]}, scenario)
+            scenario = BatchScenario.from_file(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(scenario.settle, 2.0)
+        self.assertEqual(len(scenario.phases), 1)
+
+
+class BatchRunnerTest(unittest.TestCase):
+
+    def test_workers_only_load_the_cpu(self):
+        for other in ('net', 'vm'):
+            scenario = BatchScenario.from_dict({'phases': [
+                {'targets': {'cpu': 30, other: 10}, 'duration': 20}]})
+            runner = BatchRunner(scenario, verbosity='')
+            self.assertEqual(runner.stress.stress_types, ('cpu',))
+            self.assertEqual(sorted(runner.stress.targets), ['cpu', other])
+            self.assertEqual(list(runner.stress.resources), [other])
+
+
+if __name__ == '__main__':
+    unittest.main()
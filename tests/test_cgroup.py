@@ -0,0 +1,215 @@
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+from cgroup import CgroupCpu, CgroupLimit, read_value, write_value
+from StressAuto import LimitedStress
+
+
+def procs(path):
+    return (read_value(os.path.join(path, 'cgroup.procs')) or '').split()
+
+
+def controllers(path):
+    return (read_value(os.path.join(path, 'cgroup.subtree_control')) or
+            '').split()
+
+
+class FakeKernel(object):
+    """
+        cgroup v2 rules on a plain directory tree: a process is in one
+        cgroup at a time, and a cgroup with controllers enabled for its
+        children holds no process
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, path, value):
+        directory, name = os.path.split(path)
+        if name == 'cgroup.subtree_control':
+            enabled = controllers(directory)
+            for change in value.split():
+                if change[0] == '+' and procs(directory):
+                    raise IOError(errno.EBUSY, 'Device or resource busy')
+                if change[0] == '+':
+                    enabled.append(change[1:])
+                else:
+                    enabled.remove(change[1:])
+            write_value(path, ' '.join(enabled))
+        elif name == 'cgroup.procs':
+            if controllers(directory):
+                raise IOError(errno.EBUSY, 'Device or resource busy')
+            for parent, _, files in os.walk(self.root):
+                if 'cgroup.procs' in files:
+                    write_value(os.path.join(parent, 'cgroup.procs'),
+                                '\n'.join(x for x in procs(parent)
+                                          if x != value))
+            write_value(path, '\n'.join(procs(directory) + [value]))
+        else:
+            write_value(path, value)
+
+    @staticmethod
+    def rmdir(path):
+        if procs(path):
+            raise OSError(errno.EBUSY, 'Device or resource busy')
+        shutil.rmtree(path)
+
+
+class CgroupLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.own = os.path.join(self.root, 'session.scope')
+        os.mkdir(self.own)
+        kernel = FakeKernel(self.root)
+        own = self.own
+
+        class FakeCgroupLimit(CgroupLimit):
+            write = staticmethod(kernel.write)
+            rmdir = staticmethod(kernel.rmdir)
+
+            @staticmethod
+            def own_path():
+                return own
+
+        self.limit = FakeCgroupLimit(name='stressauto-1')
+        self.limit.sleep = lambda _: None
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_busy_cgroup_is_moved_into_a_leaf(self):
+        write_value(os.path.join(self.own, 'cgroup.procs'), '100\n200')
+        self.limit.create()
+        control = os.path.join(self.own, 'stressauto-ctl')
+        self.assertEqual(self.limit.control, control)
+        self.assertEqual(procs(control), ['100', '200'])
+        self.assertEqual(procs(self.own), [])
+        self.assertEqual(controllers(self.own), ['cpu'])
+        self.assertEqual(self.limit.path,
+                         os.path.join(self.own, 'stressauto-1'))
+        self.assertEqual(read_value(os.path.join(self.limit.path,
+                                                 'cpu.max')), '1000 100000')
+        self.limit.add_pid(300)
+        self.assertEqual(self.limit.pids(), ('300',))
+
+    def test_remove_waits_for_the_workers_and_moves_back(self):
+        write_value(os.path.join(self.own, 'cgroup.procs'), '100\n200')
+        self.limit.create()
+        self.limit.add_pid(300)
+        path = self.limit.path
+        events = os.path.join(path, 'cgroup.events')
+        write_value(events, 'populated 1\nfrozen 0')
+
+        def worker_exits(_):
+            write_value(os.path.join(path, 'cgroup.procs'), '')
+            write_value(events, 'populated 0\nfrozen 0')
+        self.limit.sleep = worker_exits
+        self.limit.remove()
+        self.assertEqual(sorted(os.listdir(self.own)),
+                         ['cgroup.procs', 'cgroup.subtree_control'])
+        self.assertEqual(sorted(procs(self.own)), ['100', '200'])
+        self.assertEqual(controllers(self.own), [])
+
+    def test_remove_fails_when_the_workers_stay(self):
+        self.limit.create()
+        self.limit.add_pid(300)
+        write_value(os.path.join(self.limit.path, 'cgroup.events'),
+                    'populated 1')
+        self.limit.__removal_timeout__ = 0.0
+        self.assertRaises(OSError, self.limit.remove)
+
+    def test_empty_cgroup_takes_the_workers_directly(self):
+        self.limit.create()
+        self.assertEqual(self.limit.control, None)
+        self.assertEqual(os.path.dirname(self.limit.path), self.own)
+        self.limit.remove()
+        self.assertEqual(os.listdir(self.own), ['cgroup.subtree_control'])
+        self.assertEqual(controllers(self.own), [])
+
+    def test_cpuset_is_written(self):
+        self.limit.cpuset = '0-1'
+        self.limit.create()
+        self.assertEqual(controllers(self.own), ['cpu', 'cpuset'])
+        self.assertEqual(read_value(os.path.join(self.limit.path,
+                                                 'cpuset.cpus')), '0-1')
+
+
+class CgroupQuotaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.own = os.path.join(self.root, 'kubepods', 'pod')
+        os.makedirs(self.own)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_cpu_max(self):
+        path = os.path.join(self.own, 'cpu.max')
+        self.assertEqual(CgroupCpu.cpu_max(self.own), None)
+        write_value(path, 'max 100000\n')
+        self.assertEqual(CgroupCpu.cpu_max(self.own), None)
+        write_value(path, '150000 100000\n')
+        self.assertEqual(CgroupCpu.cpu_max(self.own), 1.5)
+
+    def test_cfs_quota(self):
+        write_value(os.path.join(self.own, 'cpu.cfs_period_us'), '100000')
+        write_value(os.path.join(self.own, 'cpu.cfs_quota_us'), '-1')
+        self.assertEqual(CgroupCpu.cfs_quota(self.own), None)
+        write_value(os.path.join(self.own, 'cpu.cfs_quota_us'), '50000')
+        self.assertEqual(CgroupCpu.cfs_quota(self.own), 0.5)
+
+    def test_lowest_quota_up_to_the_root(self):
+        self.assertEqual(CgroupCpu.lowest_quota(
+            self.root, '/kubepods/pod', CgroupCpu.cpu_max), None)
+        write_value(os.path.join(self.root, 'kubepods', 'cpu.max'),
+                    '200000 100000')
+        write_value(os.path.join(self.own, 'cpu.max'), '300000 100000')
+        self.assertEqual(CgroupCpu.lowest_quota(
+            self.root, '/kubepods/pod', CgroupCpu.cpu_max), 2.0)
+
+    def test_load_is_a_percent_of_the_quota(self):
+        stat = os.path.join(self.own, 'cpu.stat')
+        write_value(stat, 'usage_usec 1000000\nuser_usec 0\n')
+        sampler = CgroupCpu(stat, 1e-6, quota=0.5, interval=0.05)
+        sampler.reset()
+        write_value(stat, 'usage_usec 1025000\nuser_usec 0\n')
+        load = sampler.sample().total
+        # 25 ms of cpu over a window of at least 50 ms of half a cpu
+        self.assertTrue(0 < load <= 100.0)
+
+    def test_detect_falls_through_to_v2_outside_the_v1_hierarchy(self):
+        mounts = os.path.join(self.root, 'mounts')
+        cgroups = os.path.join(self.root, 'cgroup')
+        write_value(mounts, '\n'.join([
+            'cgroup /sys/fs/cgroup/cpu,cpuacct cgroup rw,cpu,cpuacct 0 0',
+            'cgroup2 {0} cgroup2 rw 0 0'.format(self.root)]))
+        write_value(cgroups, '1:memory:/\n0::/kubepods/pod\n')
+        write_value(os.path.join(self.own, 'cpu.max'), '50000 100000')
+        cgroup_cpu = CgroupCpu.detect(mounts=mounts, cgroup_file=cgroups)
+        self.assertEqual(cgroup_cpu.usage_path,
+                         os.path.join(self.own, 'cpu.stat'))
+        self.assertEqual(cgroup_cpu.quota, 0.5)
+        write_value(cgroups, '1:memory:/\n')
+        self.assertEqual(CgroupCpu.detect(mounts=mounts, cgroup_file=cgroups),
+                         None)
+
+    def test_interference_is_in_percent_of_the_quota(self):
+        stat = os.path.join(self.own, 'cpu.stat')
+        write_value(stat, 'usage_usec 0\n')
+
+        class QuotaStress(LimitedStress):
+            def setup_sampler(self, measure, interval):
+                return CgroupCpu(stat, 1e-6, quota=0.5)
+
+        stress = QuotaStress(verbosity='', tool_location={})
+        self.assertEqual(stress.capacity, 0.5)
+        self.assertEqual(stress.own_cpu.cpus, 0.5)
+        self.assertEqual(stress.interference.cpus, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import argparse
+import threading
+import time
+import unittest
+from cluster import (AgentError, Coordinator, StressAgent,
+                     setpoint_crafter)
+
+
+class ProfileStress(object):
+    """
+        Stress that only follows its profile, recording the setpoint as
+        the load
+    """
+    period = 0.02
+
+    def __init__(self, profile=None, metrics=None, **settings):
+        self.profile = profile
+        self.metrics = metrics
+        self.settings = settings
+        self.started = self.ended = None
+
+    def run(self):
+        self.started = time.time()
+        while not self.profile.finished(time.time() - self.started):
+            setpoint = self.profile.setpoint(time.time() - self.started)
+            self.metrics.record(time.time(), setpoint, setpoint)
+            time.sleep(self.period)
+        self.ended = time.time()
+
+
+class SkewedAgent(StressAgent):
+    """
+        Agent whose clock is ahead of the coordinator
+    """
+    skew = 100.0
+
+    def status(self):
+        status = StressAgent.status(self)
+        status['time'] += self.skew
+        return status
+
+    def start(self, at):
+        return StressAgent.start(self, at - self.skew)
+
+    def samples(self, since=0.0):
+        samples = StressAgent.samples(self, max(0.0, since - self.skew))
+        for sample in samples['samples']:
+            sample[0] += self.skew
+        return samples
+
+
+class CoordinatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.agents = [StressAgent(port=0, verbosity='',
+                                   stress_factory=ProfileStress),
+                       StressAgent(port=0, verbosity='',
+                                   stress_factory=ProfileStress),
+                       SkewedAgent(port=0, verbosity='',
+                                   stress_factory=ProfileStress)]
+        self.addresses = ['{0}:{1}'.format(*x.start_server())
+                          for x in self.agents]
+        self.running = True
+        self.threads = [threading.Thread(target=self.serve, args=(x,))
+                        for x in self.agents]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+        self.coordinator = Coordinator(self.addresses)
+
+    def tearDown(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.coordinator.close()
+        for agent in self.agents:
+            agent.stop_server()
+
+    def serve(self, agent):
+        """
+        serve_forever without its SIGINT handler, which a test thread
+        can not set
+        """
+        while self.running:
+            agent.run_next(wait=0.05)
+
+    def run_cluster(self, overrides=None):
+        self.coordinator.prepare({'profile': 'step:30:0.3'}, overrides)
+        start = self.coordinator.start(delay=0.2)
+        deadline = time.time() + 5.0
+        while not self.coordinator.finished and time.time() < deadline:
+            time.sleep(0.05)
+        self.coordinator.collect()
+        return start
+
+    def test_setpoint_overrides(self):
+        limits = setpoint_crafter(argparse.ArgumentParser(), [
+            '{0}=70'.format(self.addresses[1])])
+        self.run_cluster(dict(
+            (address, {'profile': 'step:{0}:0.3'.format(limit)})
+            for address, limit in limits.items()))
+        self.assertEqual(self.agents[0].stress.profile.levels, (30.0,))
+        self.assertEqual(self.agents[1].stress.profile.levels, (70.0,))
+        self.assertEqual(self.coordinator.latest()[self.addresses[1]], 70.0)
+
+    def test_samples_on_the_coordinator_clock(self):
+        start = self.run_cluster()
+        for address in self.addresses:
+            samples = self.coordinator.samples[address]
+            self.assertTrue(samples, address)
+            self.assertTrue(start - 0.1 <= samples[0][0] < start + 0.2,
+                            (address, samples[0][0] - start))
+            self.assertEqual(samples[-1][1], 30.0)
+        rows = self.coordinator.aggregate(period=10.0)
+        self.assertEqual(set(rows[0][1]), set(self.addresses))
+
+    def test_collect_returns_only_new_samples(self):
+        self.run_cluster()
+        self.assertEqual(self.coordinator.collect(),
+                         dict((x, []) for x in self.addresses))
+
+    def test_agents_end_together(self):
+        self.run_cluster()
+        self.assertTrue(self.coordinator.finished)
+        started = [x.stress.started for x in self.agents]
+        ended = [x.stress.ended for x in self.agents]
+        self.assertTrue(max(started) - min(started) < 0.1, started)
+        self.assertTrue(max(ended) - min(ended) < 0.1, ended)
+
+    def test_stop_cancels_a_waiting_run(self):
+        self.coordinator.prepare({'profile': 'step:30:0.3'})
+        self.coordinator.start(delay=60.0)
+        self.coordinator.stop()
+        self.assertEqual(set(self.coordinator.states().values()),
+                         set(['prepared']))
+
+    def test_refused_settings(self):
+        with self.assertRaises(AgentError) as raised:
+            self.coordinator.prepare({'profile': 'step:30:0.3',
+                                      'colour': 'red'})
+        self.assertIn('Unknown settings: colour', str(raised.exception))
+        with self.assertRaises(AgentError):
+            self.coordinator.prepare({'profile': 'zigzag:1'})
+
+    def test_start_needs_a_prepared_run(self):
+        with self.assertRaises(AgentError) as raised:
+            self.coordinator.start(delay=0.0)
+        self.assertIn('No run is prepared', str(raised.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from controller import ControlLoop, ConvergenceStats, PidController
+
+
+class PidControllerTest(unittest.TestCase):
+
+    def test_saturated_output_does_not_wind_up(self):
+        controller = PidController(kp=0.5, ki=1.0)
+        controller.update(100.0, 0.0, now=0.0)
+        for now in range(1, 61):
+            self.assertEqual(controller.update(100.0, 0.0, now=now), 100.0)
+        # a minute against the limit leaves the integral at the limit, so
+        # the output comes off it as soon as the error reverses
+        self.assertTrue(controller.update(100.0, 110.0, now=61) < 100.0)
+
+    def test_integral_stops_while_pushing_past_the_limit(self):
+        controller = PidController(kp=0.0, ki=1.0)
+        controller.reset(output=90.0)
+        self.assertEqual(controller.update(200.0, 0.0, now=0.0), 90.0)
+        self.assertEqual(controller.update(200.0, 0.0, now=1.0), 100.0)
+        self.assertEqual(controller.update(50.0, 60.0, now=2.0), 80.0)
+
+    def test_bumpless_reset(self):
+        controller = PidController(kp=0.5, ki=1.0)
+        controller.reset(output=30.0, error=10.0)
+        self.assertEqual(controller.update(40.0, 30.0, now=0.0), 30.0)
+
+    def test_derivative_acts_on_the_measurement(self):
+        controller = PidController(kp=0.0, ki=0.0, kd=1.0,
+                                   output_limits=(None, None))
+        controller.update(10.0, 5.0, now=0.0)
+        self.assertEqual(controller.update(90.0, 5.0, now=1.0), 0.0)
+        self.assertEqual(controller.update(90.0, 7.0, now=2.0), -2.0)
+
+    def test_shift_is_clamped(self):
+        controller = PidController(kp=0.0, ki=0.0)
+        controller.reset(output=80.0)
+        controller.shift(50.0)
+        self.assertEqual(controller.update(0.0, 0.0, now=0.0), 100.0)
+
+
+class ConvergenceStatsTest(unittest.TestCase):
+
+    def test_convergence_and_overshoot(self):
+        stats = ConvergenceStats(tolerance=1.0, settle_time=2.0)
+        for now, measurement in enumerate((0.0, 30.0, 55.0, 50.5, 50.0,
+                                           49.5, 50.0)):
+            stats.record(float(now), 50.0, measurement)
+        self.assertTrue(stats.converged)
+        self.assertEqual(stats.convergence_time, 3.0)
+        self.assertEqual(stats.overshoot, 5.0)
+        self.assertEqual(stats.overshoot_percent, 10.0)
+
+    def test_setpoint_change_starts_over(self):
+        stats = ConvergenceStats(tolerance=1.0, settle_time=0.0)
+        stats.record(0.0, 50.0, 50.0)
+        self.assertTrue(stats.converged)
+        stats.record(1.0, 80.0, 50.0)
+        self.assertFalse(stats.converged)
+        self.assertEqual(stats.overshoot, 0.0)
+
+
+class ControlLoopTest(unittest.TestCase):
+
+    def test_loop_closes_the_gap(self):
+        clock = [0.0]
+        state = {'load': 20.0, 'output': None}
+
+        def actuate(output):
+            state['output'] = output
+            state['load'] = 20.0 + output
+
+        loop = ControlLoop(PidController(), lambda: state['load'], actuate,
+                           period=0.5, clock=lambda: clock[0],
+                           sleep=lambda seconds: None)
+        loop.start(60.0)
+        for _ in range(40):
+            clock[0] += 0.5
+            loop.tick()
+        self.assertTrue(abs(state['load'] - 60.0) < 0.5)
+        self.assertTrue(loop.stats.converged)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import threading
+import unittest
+from dashboard import Dashboard, bar, clock_format, sparkline
+
+
+class StuckTerminal(object):
+    """
+        Terminal whose writes block until released, as a paused or full
+        one does
+    """
+    encoding = 'utf-8'
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.writing = threading.Event()
+        self.text = []
+
+    def write(self, text):
+        self.writing.set()
+        self.released.wait(5.0)
+        self.text.append(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return True
+
+
+class DashboardTest(unittest.TestCase):
+
+    def test_stuck_terminal_does_not_hold_the_loop(self):
+        terminal = StuckTerminal()
+        dashboard = Dashboard(stream=terminal)
+        drawer = threading.Thread(target=dashboard.draw)
+        drawer.start()
+        self.assertTrue(terminal.writing.wait(5.0))
+        done = threading.Event()
+
+        def loop():
+            dashboard.update(40.0, 38.0, {0: 38.0}, workers=1, limiters=1)
+            dashboard.message('Target achieved')
+            done.set()
+        threading.Thread(target=loop).start()
+        self.assertTrue(done.wait(1.0))
+        terminal.released.set()
+        drawer.join(5.0)
+        dashboard.draw()
+        self.assertIn('Target achieved\n', terminal.text[-1])
+
+    def test_render(self):
+        dashboard = Dashboard(stream=StuckTerminal())
+        dashboard.update(50.0, 25.0, {0: 25.0, 1: 100.0}, workers=2,
+                         limiters=1)
+        lines = dashboard.render(70, 24)
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].startswith(u'elapsed 00:00:00'))
+        self.assertIn(u'workers 2  limiters 1', lines[0])
+        self.assertTrue(all(len(x) < 70 for x in lines))
+        self.assertTrue(lines[4].startswith(u'cpu1     100.0'))
+
+    def test_many_cores_get_a_character_each(self):
+        dashboard = Dashboard(stream=StuckTerminal())
+        dashboard.update(50.0, 25.0, dict((x, 50.0) for x in range(64)))
+        lines = dashboard.render(80, 10)
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[3].startswith(u'cpu0-63 '))
+        self.assertTrue(lines[3].endswith(u' ' + u'\u2584' * 64))
+
+    def test_helpers(self):
+        self.assertEqual(sparkline([0, 50, 100, float('nan')], ' .:#'),
+                         u' :# ')
+        self.assertEqual(bar(50, 4, ('#', '-')), '##--')
+        self.assertEqual(clock_format(3725.9), '01:02:05')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+from disk import MEGABYTE, DiskStress
+
+
+class DiskStressTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'stressauto.io')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_created_file_is_removed(self):
+        stress = DiskStress(self.path, device='sda', file_size=MEGABYTE)
+        stress.prepare()
+        self.assertEqual(os.path.getsize(self.path), MEGABYTE)
+        stress.cleanup()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_existing_file_is_refused(self):
+        with open(self.path, 'w') as existing:
+            existing.write('keep')
+        self.assertRaises(ValueError, DiskStress, self.path, device='sda')
+        with open(self.path) as existing:
+            self.assertEqual(existing.read(), 'keep')
+
+    def test_file_appearing_before_prepare_is_kept(self):
+        stress = DiskStress(self.path, device='sda', file_size=MEGABYTE)
+        with open(self.path, 'w') as existing:
+            existing.write('keep')
+        self.assertRaises(OSError, stress.prepare)
+        stress.cleanup()
+        with open(self.path) as existing:
+            self.assertEqual(existing.read(), 'keep')
+
+    def test_forced_file_is_left_in_place(self):
+        with open(self.path, 'w') as existing:
+            existing.write('keep')
+        stress = DiskStress(self.path, device='sda', file_size=MEGABYTE,
+                            force=True)
+        stress.prepare()
+        self.assertEqual(os.path.getsize(self.path), MEGABYTE)
+        stress.cleanup()
+        self.assertTrue(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import time
+import unittest
+from duty_cycle import DutyCyclePool
+from proc_stat import process_cpu_ticks
+
+TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def busy_percent(pid, seconds):
+    """
+    :param pid: int
+    :param seconds: float
+    :return: float cpu percent of the process over the seconds
+    """
+    before = process_cpu_ticks(pid)
+    time.sleep(seconds)
+    return 100.0 * (process_cpu_ticks(pid) - before) / TICKS / seconds
+
+
+class RatioTest(unittest.TestCase):
+
+    def test_ratios_are_clamped(self):
+        pool = DutyCyclePool(workers=2)
+        pool.set_ratio(0, 1.5)
+        pool.set_ratio(1, -0.5)
+        self.assertEqual(pool.ratios[:], [1.0, 0.0])
+        self.assertEqual(pool.demand, 100.0)
+
+    def test_pinned_cores(self):
+        pool = DutyCyclePool(workers=8, cores=(0, 2))
+        self.assertEqual(pool.workers, 2)
+        pool.set_ratio(pool.cores.index(2), 0.25)
+        self.assertEqual(pool.ratios[:], [0.0, 0.25])
+
+
+class SharedDemandTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = DutyCyclePool(workers=2)
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_demand_is_spread_over_the_workers(self):
+        self.assertEqual(self.pool.set_demand(50.0), 50.0)
+        self.assertEqual(self.pool.ratios[:], [0.25, 0.25])
+        self.assertEqual(self.pool.set_demand(500.0), 200.0)
+        self.assertEqual(len(self.pool.pids), 2)
+
+    def test_workers_follow_the_shared_ratio(self):
+        self.pool.set_demand(60.0)
+        pids = self.pool.pids
+        time.sleep(0.2)
+        busy = busy_percent(pids[0], 1.0)
+        self.assertTrue(10.0 < busy < 60.0, busy)
+        # the same workers, retargeted through shared memory
+        self.pool.set_demand(0.0)
+        time.sleep(0.1)
+        self.assertTrue(busy_percent(pids[0], 0.5) < 10.0)
+        self.assertEqual(self.pool.pids, pids)
+
+    def test_stop_ends_the_workers(self):
+        self.pool.set_demand(0.0)
+        pids = self.pool.pids
+        self.pool.stop()
+        self.assertFalse(self.pool.started)
+        for pid in pids:
+            self.assertRaises(OSError, os.kill, pid, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import time
+import unittest
+try:
+    from urllib2 import urlopen
+except ImportError:
+    from urllib.request import urlopen
+from exporter import ControllerState, MetricsServer
+from StressAuto import LimitedStress
+
+
+class SlowLoop(object):
+    """
+        Control loop whose tick takes 50 ms
+    """
+    setpoint, measurement = 40.0, 38.0
+
+    @staticmethod
+    def tick():
+        time.sleep(0.05)
+
+
+class ControllerStateTest(unittest.TestCase):
+
+    def test_render(self):
+        state = ControllerState()
+        state.update(setpoint=40.0, load=38.5)
+        text = state.render()
+        self.assertIn('# TYPE stressauto_load gauge\nstressauto_load 38.5\n',
+                      text)
+        self.assertIn('stressauto_iterations_total 1\n', text)
+
+    def test_served_on_metrics(self):
+        server = MetricsServer(port=0)
+        address, port = server.start()
+        try:
+            server.state.update(setpoint=40.0)
+            body = urlopen('http://{0}:{1}/metrics'.format(
+                address, port)).read().decode('utf-8')
+        finally:
+            server.stop()
+        self.assertIn('stressauto_setpoint 40.0\n', body)
+
+
+class IterationTimeTest(unittest.TestCase):
+
+    def test_wait_is_not_part_of_the_iteration(self):
+        server = MetricsServer(port=0)
+        stress = LimitedStress(verbosity='', tool_location={}, mode='pid',
+                               exporter=server)
+        loop = SlowLoop()
+        stress.pid_step(loop)
+        # the wait for the next control period
+        time.sleep(0.3)
+        stress.pid_step(loop)
+        iteration = server.state.values['iteration_seconds']
+        self.assertTrue(0.05 <= iteration < 0.25, iteration)
+        self.assertEqual(server.state.values['error'], 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from latency import BUCKETS, LINEAR_BUCKETS, LatencyHistogram, \
+    LatencyProbe, bucket_index, bucket_limit
+from StressAuto import LimitedStress
+
+
+def histogram_of(latencies):
+    """
+    :param latencies: list of float microseconds
+    :return: LatencyHistogram
+    """
+    counts = [0] * BUCKETS
+    for latency in latencies:
+        counts[bucket_index(latency)] += 1
+    return LatencyHistogram('test', counts)
+
+
+class BucketTest(unittest.TestCase):
+
+    def test_microseconds_are_exact_below_the_linear_buckets(self):
+        for microseconds in (0, 1.5, 64, LINEAR_BUCKETS - 1):
+            self.assertEqual(bucket_limit(bucket_index(microseconds)),
+                             int(microseconds) + 1)
+
+    def test_longer_latencies_are_within_a_percent(self):
+        for microseconds in (200.0, 5000.0, 100000.0):
+            limit = bucket_limit(bucket_index(microseconds))
+            self.assertTrue(microseconds <= limit <= microseconds * 1.0201)
+
+    def test_last_bucket_takes_everything_longer(self):
+        self.assertEqual(bucket_index(1e12), BUCKETS - 1)
+        self.assertEqual(bucket_index(-5), 0)
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = histogram_of([10] * 98 + [50, 1000])
+        self.assertEqual(histogram.wakeups, 100)
+        self.assertEqual(histogram.percentile(50), 11)
+        self.assertEqual(histogram.percentile(98), 11)
+        self.assertEqual(histogram.percentile(99), 51)
+        self.assertTrue(1000 <= histogram.maximum <= 1010)
+
+    def test_empty_histogram(self):
+        histogram = histogram_of([])
+        self.assertEqual(histogram.percentile(99), None)
+        self.assertEqual(histogram.report(), 'no wakeups')
+
+    def test_plateau_counts_only_its_own_wakeups(self):
+        probe = LatencyProbe()
+        probe.counts[bucket_index(5)] = 10
+        with probe.plateau('limit 40') as plateau:
+            probe.counts[bucket_index(20)] += 3
+        self.assertEqual(plateau.histogram.wakeups, 3)
+        self.assertEqual(plateau.histogram.percentile(50), 21)
+        self.assertEqual(probe.plateaus, [plateau.histogram])
+        self.assertIn('limit 40', probe.summary())
+
+
+class FollowPlateauTest(unittest.TestCase):
+
+    def test_plateau_per_segment(self):
+        probe = LatencyProbe()
+        stress = LimitedStress(verbosity='', tool_location={},
+                               latency_probe=probe)
+        plateau = None
+        for segment in ('step 1', 'step 1', None, 'step 2', 'step 3'):
+            plateau = stress.follow_plateau(plateau, segment)
+            probe.counts[0] += 1
+        stress.follow_plateau(plateau, None)
+        self.assertEqual([(x.name, x.wakeups) for x in probe.plateaus],
+                         [('step 1', 2), ('step 2', 1), ('step 3', 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from memory import MEGABYTE, MemInfo, MemoryStress
+
+
+def resident(pid):
+    """
+    :param pid: int
+    :return: int resident bytes of the process
+    """
+    with open('/proc/{0}/status'.format(pid)) as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def wait_until(condition, timeout=5.0):
+    """
+    :param condition: callable returning bool
+    :param timeout: float seconds
+    :return: bool, whether the condition came true in time
+    """
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class MemInfoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'meminfo')
+        with open(path, 'w') as meminfo:
+            meminfo.write('MemTotal:         102400 kB\n'
+                          'MemFree:           40960 kB\n'
+                          'MemAvailable:      76800 kB\n'
+                          'HugePages_Total:       0\n')
+        self.meminfo = MemInfo(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read(self):
+        fields = self.meminfo.read()
+        self.assertEqual(fields['MemTotal'], 100 * MEGABYTE)
+        self.assertEqual(fields['HugePages_Total'], 0)
+
+    def test_used_percent(self):
+        self.assertEqual(self.meminfo.used_percent(), 25.0)
+        self.assertEqual(
+            self.meminfo.used_percent_for_available(60 * MEGABYTE), 40.0)
+        self.assertEqual(
+            self.meminfo.used_percent_for_available(200 * MEGABYTE), 0.0)
+
+    def test_chunks_grow_and_shrink(self):
+        stress = MemoryStress(chunk_size=MEGABYTE, meminfo=self.meminfo)
+        try:
+            stress.actuate(0)
+            self.assertTrue(wait_until(lambda: resident(stress.pid) > 0))
+            idle = resident(stress.pid)
+            stress.actuate(60)
+            self.assertEqual(stress.allocated, 60 * MEGABYTE)
+            self.assertTrue(wait_until(
+                lambda: resident(stress.pid) - idle > 55 * MEGABYTE))
+            stress.actuate(10)
+            self.assertTrue(wait_until(
+                lambda: resident(stress.pid) - idle < 15 * MEGABYTE))
+            pid = stress.pid
+        finally:
+            stress.stop()
+        self.assertEqual(stress.pids, ())
+        self.assertFalse(os.path.exists('/proc/{0}'.format(pid)))
+
+
+if __name__ == '__main__':
+    unittest.main()
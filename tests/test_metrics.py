@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+from metrics import MetricsRecorder, read_metrics
+
+
+def recorder_of(timestamps, capacity=4, cores=2):
+    """
+    :param timestamps: iterable of float
+    :param capacity: int
+    :param cores: int
+    :return: MetricsRecorder with a sample at every timestamp
+    """
+    recorder = MetricsRecorder(capacity=capacity, cores=cores)
+    for timestamp in timestamps:
+        recorder.record(timestamp, 50.0, timestamp, per_core={1: 25.0},
+                        workers=int(timestamp), limit=10.0)
+    return recorder
+
+
+class MetricsRecorderTest(unittest.TestCase):
+
+    def test_oldest_samples_are_overwritten(self):
+        recorder = recorder_of(range(1, 7))
+        self.assertEqual(len(recorder), 4)
+        self.assertEqual([x.timestamp for x in recorder.samples()],
+                         [3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(list(recorder.samples())[0].per_core, (0.0, 25.0))
+
+    def test_size_is_fixed(self):
+        recorder = MetricsRecorder(capacity=10, cores=2)
+        size = recorder.size
+        self.assertEqual(size, 10 * (8 + 4 + 4 + 4 + 4 + 2 * 4))
+        for timestamp in range(25):
+            recorder.record(timestamp, 50.0, 40.0)
+        self.assertEqual(recorder.size, size)
+
+    def test_since(self):
+        recorder = recorder_of(range(1, 7))
+        self.assertEqual([x.timestamp for x in recorder.since(4.0)],
+                         [5.0, 6.0])
+        self.assertEqual([x.timestamp for x in recorder.since(0.0)],
+                         [3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(recorder.since(6.0), [])
+        self.assertEqual(recorder_of([]).since(0.0), [])
+
+    def test_since_before_the_buffer_is_full(self):
+        recorder = recorder_of([1.0, 2.0])
+        self.assertEqual([x.timestamp for x in recorder.since(1.0)], [2.0])
+
+    def test_per_core_loads_are_capped(self):
+        recorder = MetricsRecorder(cores=64)
+        self.assertTrue(recorder.size < 40 * 1024 * 1024)
+        self.assertEqual(recorder.per_core_capacity, 131072)
+
+    def test_per_core_loads_of_the_latest_samples(self):
+        recorder = MetricsRecorder(capacity=4, cores=2, per_core_bytes=16)
+        self.assertEqual(recorder.per_core_capacity, 2)
+        for timestamp in range(1, 7):
+            recorder.record(timestamp, 50.0, 40.0,
+                            per_core=(timestamp, 2 * timestamp))
+        self.assertEqual([x.per_core for x in recorder.samples()],
+                         [(0.0, 0.0), (0.0, 0.0), (5.0, 10.0), (6.0, 12.0)])
+        self.assertEqual([x.per_core for x in recorder.since(4.0)],
+                         [(5.0, 10.0), (6.0, 12.0)])
+
+    def test_capacity_must_be_positive(self):
+        self.assertRaises(ValueError, MetricsRecorder, capacity=0)
+
+
+class MetricsExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_binary_round_trip(self):
+        recorder = recorder_of(range(1, 7))
+        path = os.path.join(self.directory, 'metrics.bin')
+        recorder.export(path, 'binary')
+        self.assertEqual(list(read_metrics(path)), list(recorder.samples()))
+
+    def test_csv(self):
+        path = os.path.join(self.directory, 'metrics.csv')
+        recorder_of([1.0]).export(path)
+        with open(path) as csv:
+            self.assertEqual(csv.read().splitlines(), [
+                'timestamp,setpoint,load,workers,limit,core0,core1',
+                '1.000,50.00,1.00,1,10.00,0.00,25.00'])
+
+    def test_not_a_metrics_file(self):
+        path = os.path.join(self.directory, 'metrics.csv')
+        recorder_of([1.0]).export(path)
+        self.assertRaises(ValueError, list, read_metrics(path))
+
+    def test_unknown_format(self):
+        self.assertRaises(NotImplementedError, recorder_of([]).export,
+                          os.path.join(self.directory, 'metrics'), 'json')
+
+
+if __name__ == '__main__':
+    unittest.main()
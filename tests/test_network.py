@@ -0,0 +1,43 @@
+import socket
+import unittest
+from network import NetworkStress, datagram_batch
+
+
+class DatagramBatchTest(unittest.TestCase):
+
+    def test_batch_is_sent_in_one_call(self):
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sink.bind(('127.0.0.1', 0))
+            sink.settimeout(1.0)
+            sender.connect(sink.getsockname())
+            send = datagram_batch(sender, 1400, 8)
+            if send is None:
+                self.skipTest('no sendmmsg')
+            self.assertEqual(send(), 8)
+            self.assertEqual([len(sink.recv(1 << 16)) for _ in range(8)],
+                             [1400] * 8)
+        finally:
+            sink.close()
+            sender.close()
+
+
+class NetworkStressTest(unittest.TestCase):
+
+    def test_local_sinks_share_the_port(self):
+        stress = NetworkStress(protocol='udp', max_workers=2)
+        stress.running.value = 1
+        try:
+            address = stress.start_sink()
+            sinks = 2 if hasattr(socket, 'SO_REUSEPORT') else 1
+            self.assertEqual(len(stress.pids), sinks)
+            self.assertEqual(address, ('127.0.0.1', stress.port.value))
+        finally:
+            stress.running.value = 0
+            stress.cleanup()
+        self.assertEqual(stress.pids, ())
+
+
+if __name__ == '__main__':
+    unittest.main()
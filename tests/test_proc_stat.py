@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+from proc_stat import ProcStat, ProcessCpu, process_cpu_ticks
+
+STAT = '''cpu  {0} 0 {1} {2} 0 0 0 0 0 0
+cpu0 {0} 0 0 {2} 0 0 0 0 0 0
+cpu1 0 0 {1} {2} 0 0 0 0 0 0
+intr 12345 0 0
+ctxt 6789
+'''
+
+
+def pid_stat(pid, comm, utime, stime):
+    """
+    :return: str /proc/<pid>/stat line
+    """
+    return '{0} ({1}) R 1 {0} {0} 0 -1 4194304 100 0 0 0 {2} {3} 0 0 20 ' \
+           '0 1 0 100 1000 200\n'.format(pid, comm, utime, stime)
+
+
+class ProcStatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'stat')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_stat(self, user, system, idle):
+        with open(self.path, 'w') as stat:
+            stat.write(STAT.format(user, system, idle))
+
+    def test_parse_counters(self):
+        self.assertEqual(ProcStat.parse_counters(
+            'cpu  10 2 3 80 5 1 1 0 7 0'), ('cpu', 17, 102))
+
+    def test_total_and_per_core_load(self):
+        stat = ProcStat(interval=0.01, stat_path=self.path)
+        self.write_stat(100, 100, 1000)
+        stat.reset()
+        self.write_stat(150, 100, 1050)
+        load = stat.sample()
+        self.assertEqual(load.total, 50.0)
+        self.assertEqual(load.per_core, {0: 50.0, 1: 0.0})
+        self.assertEqual(stat.last_load, load)
+
+    def test_counters_that_did_not_move(self):
+        self.assertEqual(ProcStat.utilisation((5, 10), (5, 10)), 0.0)
+
+    def test_interval_must_be_positive(self):
+        self.assertRaises(ValueError, ProcStat, interval=0)
+
+
+class ProcessCpuTest(unittest.TestCase):
+
+    def setUp(self):
+        self.proc = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.proc)
+
+    def write_pid(self, pid, comm, utime, stime):
+        directory = os.path.join(self.proc, str(pid))
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+        with open(os.path.join(directory, 'stat'), 'w') as stat:
+            stat.write(pid_stat(pid, comm, utime, stime))
+
+    def test_comm_with_spaces_and_parentheses(self):
+        self.write_pid(10, 'stress', 7, 3)
+        self.write_pid(11, 'my (odd) worker) 1', 20, 5)
+        self.assertEqual(process_cpu_ticks(10, self.proc), 10)
+        self.assertEqual(process_cpu_ticks('11', self.proc), 25)
+
+    def test_vanished_pid(self):
+        self.assertEqual(process_cpu_ticks(12, self.proc), None)
+
+    def test_load_of_the_processes(self):
+        pids = [10, 11]
+        cpu = ProcessCpu(lambda: pids, proc=self.proc)
+        cpu.clock_ticks, cpu.cpus = 100, 2
+        self.write_pid(10, 'stress', 100, 0)
+        self.write_pid(11, 'stress', 100, 0)
+        self.assertEqual(cpu.sample(), 0.0)
+        self.write_pid(10, 'stress', 150, 0)
+        shutil.rmtree(os.path.join(self.proc, '11'))
+        cpu.__last_time__ -= 1.0
+        load = cpu.sample()
+        # 50 ticks of 10 ms over a second and a bit on 2 cpus, the exited
+        # pid takes nothing back
+        self.assertTrue(20.0 < load <= 25.0)
+        pids.append(12)
+        self.write_pid(12, 'stress', 10, 0)
+        self.write_pid(11, 'reused', 20, 0)
+        cpu.__last_time__ -= 1.0
+        # 10 ticks of the new pid and 20 of the reused one
+        self.assertTrue(12.0 < cpu.sample() <= 15.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
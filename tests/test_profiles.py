@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+from profiles import ConstantProfile, RampProfile, ScheduleProfile, \
+    SineProfile, StepProfile, parse_profile
+
+
+class SetpointTest(unittest.TestCase):
+
+    def test_ramp(self):
+        profile = RampProfile(20, 120, 10)
+        self.assertEqual([profile.setpoint(x) for x in (-1, 0, 5, 10, 20)],
+                         [20.0, 20.0, 70.0, 120.0, 120.0])
+        self.assertFalse(profile.finished(9.9))
+        self.assertTrue(profile.finished(10))
+
+    def test_step(self):
+        profile = StepProfile([20, 40], 5)
+        self.assertEqual([profile.setpoint(x) for x in (0, 4.9, 5, 30)],
+                         [20.0, 20.0, 40.0, 40.0])
+        self.assertEqual(profile.duration, 10)
+
+    def test_sine(self):
+        profile = SineProfile(50, 60, 4, 8)
+        self.assertEqual(profile.setpoint(0), 50.0)
+        self.assertEqual(profile.setpoint(1), 110.0)
+        self.assertEqual(profile.setpoint(3), 0.0)
+
+    def test_schedule(self):
+        points = [(10, 50), (0, 10), (20, 50)]
+        profile = ScheduleProfile(points)
+        self.assertEqual([profile.setpoint(x) for x in (-1, 5, 15, 25)],
+                         [10.0, 30.0, 50.0, 50.0])
+        held = ScheduleProfile(points, interpolate=False)
+        self.assertEqual(held.setpoint(5), 10.0)
+        self.assertEqual(held.duration, 20.0)
+        self.assertRaises(ValueError, ScheduleProfile, [])
+
+
+class ParseProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'schedule')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_schedule(self, text):
+        with open(self.path, 'w') as schedule:
+            schedule.write(text)
+
+    def test_specs(self):
+        ramp = parse_profile('ramp:0:100:60')
+        self.assertEqual((ramp.start, ramp.end, ramp.duration),
+                         (0.0, 100.0, 60.0))
+        step = parse_profile('step:20,40,60:30')
+        self.assertEqual((step.levels, step.step_duration),
+                         ((20.0, 40.0, 60.0), 30.0))
+        sine = parse_profile('sine:50:20:600:3600')
+        self.assertEqual((sine.period, sine.duration), (600.0, 3600.0))
+
+    def test_malformed_specs(self):
+        for spec in ('ramp:0:100', 'step:20,40', 'step:20,x:30',
+                     'step::30', 'step:20,40:0', 'sine:50:20:0:60',
+                     'sine:50:20:-5:60', 'wave:1:2'):
+            self.assertRaises(ValueError, parse_profile, spec)
+
+    def test_schedule_file(self):
+        self.write_schedule('# seconds load\n0, 10\n\n30 50  # peak\n')
+        profile = parse_profile('file:' + self.path)
+        self.assertEqual((profile.times, profile.loads),
+                         ([0.0, 30.0], [10.0, 50.0]))
+
+    def test_malformed_schedule_files(self):
+        for text in ('0 10\n30\n', '0 10\n30 high\n', '0 10 20\n', ''):
+            self.write_schedule(text)
+            self.assertRaises(ValueError, parse_profile, 'file:' + self.path)
+
+
+class SegmentTest(unittest.TestCase):
+
+    def test_every_step_is_a_segment(self):
+        profile = StepProfile([20, 40, 20], 2)
+        self.assertEqual([profile.segment(x) for x in (0, 1.9, 2, 5, 9)],
+                         ['limit 20 (step 1)', 'limit 20 (step 1)',
+                          'limit 40 (step 2)', 'limit 20 (step 3)',
+                          'limit 20 (step 3)'])
+
+    def test_held_schedule_segments(self):
+        profile = ScheduleProfile([(5, 10), (10, 50), (20, 0)],
+                                  interpolate=False)
+        self.assertEqual(profile.segment(1), 'limit 10 (0-5 s)')
+        self.assertEqual(profile.segment(7), 'limit 10 (5-10 s)')
+        self.assertEqual(profile.segment(10), 'limit 50 (10-20 s)')
+
+    def test_interpolated_schedule_is_constant_on_flat_stretches(self):
+        profile = ScheduleProfile([(0, 10), (10, 10), (20, 50)])
+        self.assertEqual(profile.segment(5), 'limit 10 (0-10 s)')
+        self.assertEqual(profile.segment(15), None)
+
+    def test_moving_setpoints_have_no_segment(self):
+        self.assertEqual(RampProfile(0, 100, 10).segment(5), None)
+        self.assertEqual(SineProfile(50, 20, 10, 60).segment(5), None)
+        self.assertEqual(ConstantProfile(30).segment(5), 'limit 30')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,310 @@
+import subprocess
+import time
+import unittest
+from controller import ControlLoop, PidController
+from disk import DiskStress
+from metrics import MetricsRecorder
+from profiles import parse_profile
+from StressAuto import LimitedStress, Stress, StressUnit
+
+
+class RecordingStress(Stress):
+    """
+        stress that only records the switches it would run with
+    """
+    runs = []
+
+    def process_open(self, switches):
+        self.runs.append(switches)
+        self.__process__ = None
+
+
+class RecordingLimitedStress(LimitedStress):
+    stress_tool = RecordingStress
+
+    def get_stress_pid(self, stress_run, workers_count=1):
+        return iter(['1'])
+
+    def watch_unit(self, unit):
+        pass
+
+
+class StressUnitsTest(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStress.runs = []
+
+    def limited_stress(self, targets):
+        return RecordingLimitedStress(tuple(sorted(targets)), verbosity='',
+                                      tool_location={},
+                                      targets=targets)
+
+    def test_units_of_a_multi_run_only_load_the_cpu(self):
+        for other in ('net', 'vm', 'hdd'):
+            stress = self.limited_stress({'cpu': 30.0, other: 10.0})
+            stress.start_unit()
+            stress.run_stress()
+        self.assertEqual(len(RecordingStress.runs), 6)
+        for switches in RecordingStress.runs:
+            self.assertIn('-c', switches)
+            for flag in ('-m', '-d', '-i'):
+                self.assertNotIn(flag, switches)
+
+    def test_unit_runs_a_single_worker(self):
+        self.limited_stress({'cpu': 30.0, 'vm': 5.0}).start_unit()
+        switches = RecordingStress.runs[0]
+        self.assertEqual(switches[switches.index('-c') + 1], '1')
+
+
+class NativeCoresTest(unittest.TestCase):
+
+    def test_pool_skips_the_cores_held_idle(self):
+        stress = LimitedStress(verbosity='', tool_location={}, mode='pid',
+                               engine='native',
+                               core_limits={0: 30, 1: 0, 2: 50})
+        self.assertEqual(stress.pool.cores, (0, 2))
+        self.assertEqual(stress.pool.workers, 2)
+
+
+class SleepRun(object):
+    """
+        Stand-in for the stress parent of a unit: a sleeping process
+        that is its own worker
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(['sleep', '60'])
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+
+def process_state(pid):
+    """
+    :param pid: str
+    :return: str state letter from /proc/<pid>/stat, None once reaped
+    """
+    try:
+        with open('/proc/{0}/stat'.format(pid)) as stat:
+            return stat.read().rpartition(')')[2].split()[0]
+    except IOError:
+        return None
+
+
+def wait_for_state(pid, states, timeout=2.0):
+    deadline = time.time() + timeout
+    while process_state(pid) not in states and time.time() < deadline:
+        time.sleep(0.01)
+    return process_state(pid)
+
+
+class WarmLimitedStress(LimitedStress):
+    started = 0
+
+    def start_unit(self):
+        self.started += 1
+        run = SleepRun()
+        return StressUnit(run, str(run.process.pid))
+
+    def watch_unit(self, unit):
+        pass
+
+
+class WarmWorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stress = WarmLimitedStress(verbosity='', tool_location={},
+                                        mode='pid', warm_workers=1)
+
+    def tearDown(self):
+        self.stress.kill_units()
+
+    def test_scale_up_resumes_a_parked_worker(self):
+        self.stress.set_demand(100)
+        self.assertEqual(self.stress.started, 2)
+        spare = self.stress.__warm__[0]
+        self.assertEqual(wait_for_state(spare.pid, 'T'), 'T')
+        self.stress.set_demand(200)
+        self.assertIn(spare, self.stress.__units__)
+        self.assertNotEqual(wait_for_state(spare.pid, 'RS'), 'T')
+        # a new spare is parked after acting
+        self.assertEqual(self.stress.started, 3)
+        self.assertEqual(wait_for_state(self.stress.__warm__[0].pid, 'T'),
+                         'T')
+
+    def test_scale_down_parks_while_there_is_room(self):
+        self.stress.set_demand(200)
+        spare = self.stress.__warm__.pop()
+        spare.kill()
+        unit = self.stress.__units__.pop()
+        self.stress.retire_unit(unit)
+        self.assertEqual(self.stress.__warm__, [unit])
+        self.assertEqual(wait_for_state(unit.pid, 'T'), 'T')
+        # the pool is full, so the next retired worker is killed
+        other = self.stress.__units__.pop()
+        self.stress.retire_unit(other)
+        self.assertEqual(process_state(other.pid), None)
+
+
+class Stats(object):
+    converged = False
+
+    @staticmethod
+    def report():
+        return 'not converged'
+
+
+class DriftingLoop(object):
+    """
+        Control loop that never settles, on a clock advanced by wait
+    """
+    stats = Stats()
+    measurement = 20.0
+
+    def __init__(self):
+        self.now = 0.0
+        self.ticks = 0
+
+    def start(self, setpoint):
+        pass
+
+    def tick(self):
+        self.ticks += 1
+
+    def wait(self):
+        self.now += 0.5
+
+
+class ConvergeTimeoutTest(unittest.TestCase):
+
+    def limited_stress(self, loop, converge_timeout):
+        stress = LimitedStress(verbosity='', tool_location={}, mode='pid',
+                               converge_timeout=converge_timeout)
+        stress.resource_loop = lambda stats: loop
+        stress.pid_step = lambda x: x.tick()
+        stress.clock = lambda: loop.now
+        stress.kill_everything = lambda: None
+        return stress
+
+    def test_run_goes_on_after_the_deadline(self):
+        loop = DriftingLoop()
+        self.limited_stress(loop, 5.0).run_pid()
+        self.assertEqual(loop.ticks, 10)
+
+    def test_converged_loops_end_before_the_deadline(self):
+        loop = DriftingLoop()
+        stress = self.limited_stress(loop, 5.0)
+        self.assertFalse(stress.converged([loop], 0.0))
+        loop.stats = Stats()
+        loop.stats.converged = True
+        self.assertTrue(stress.converged([loop], 0.0))
+
+    def test_no_deadline_waits(self):
+        loop = DriftingLoop()
+        loop.now = 1e6
+        self.assertFalse(self.limited_stress(loop, 0).converged([loop], 0.0))
+
+
+class DiskTarget(object):
+    setpoint_limits = DiskStress.setpoint_limits
+
+
+class ProfileLimitsTest(unittest.TestCase):
+
+    def test_cpu_setpoints_are_capped(self):
+        stress = LimitedStress(verbosity='', tool_location={},
+                               profile=parse_profile('step:50,150:10'))
+        self.assertEqual(stress.profile_setpoint(15), 100.0)
+
+    def test_absolute_setpoints_are_kept(self):
+        stress = LimitedStress(('hdd',), verbosity='', tool_location={},
+                               profile=parse_profile('step:50,150:10'),
+                               resource=DiskTarget())
+        self.assertEqual(stress.profile_setpoint(15), 150.0)
+
+
+class SimulatedHost(object):
+    """
+        Host whose load is the generated load plus a background load
+        that appears after 20 seconds, on a clock advanced by sleep
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.generated = 0.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def measure(self):
+        return self.generated + (30.0 if self.now >= 20.0 else 0.0)
+
+    def actuate(self, output):
+        self.generated = output
+
+
+class HoldTest(unittest.TestCase):
+
+    def test_load_is_shed_while_holding(self):
+        host = SimulatedHost()
+        stress = LimitedStress(verbosity='', tool_location={}, mode='pid',
+                               limit=50, timeout=40, hold=True)
+        stress.clock = host.clock
+        stress.resource_loop = lambda stats: ControlLoop(
+            PidController(), host.measure, host.actuate, stats=stats,
+            clock=host.clock, sleep=host.sleep)
+        stress.kill_everything = lambda: None
+        stats = stress.run_pid()
+        self.assertTrue(stats.converged)
+        self.assertTrue(host.now >= 40.0, host.now)
+        self.assertAlmostEqual(host.generated, 20.0, delta=1.0)
+        self.assertAlmostEqual(host.measure(), 50.0, delta=1.0)
+
+
+class Load(object):
+    total = 90.0
+    per_core = {}
+
+
+class HostSampler(object):
+    """
+        Host at 90%, of which StressAuto generates 35%
+    """
+    last_load = Load()
+
+    @staticmethod
+    def get_cpuload():
+        return Load.total
+
+
+class OwnCpu(object):
+
+    @staticmethod
+    def sample():
+        return 35.0
+
+
+class LoadTargetTest(unittest.TestCase):
+
+    def run_to_the_limit(self, load_target):
+        metrics = MetricsRecorder(capacity=10)
+        stress = LimitedStress(verbosity='', tool_location={}, limit=30,
+                               metrics=metrics, load_target=load_target)
+        stress.sampler, stress.own_cpu = HostSampler(), OwnCpu()
+        stress.sleep = lambda _: None
+        stress.run_and_keep_the_limit()
+        return [x.load for x in metrics.samples()]
+
+    def test_added_load_is_recorded(self):
+        self.assertEqual(self.run_to_the_limit('added'), [35.0])
+
+    def test_total_load_is_recorded(self):
+        self.assertEqual(self.run_to_the_limit('total'), [90.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
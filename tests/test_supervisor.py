@@ -0,0 +1,91 @@
+import io
+import re
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from supervisor import Supervisor
+
+FORKED = re.compile(r'\[\d+\] forked')
+
+
+def child(code):
+    """
+    :param code: str python run by the child
+    :return: subprocess.Popen with its output on a pipe
+    """
+    return subprocess.Popen([sys.executable, '-c', code],
+                            stdout=subprocess.PIPE)
+
+
+class StandIn(object):
+    """
+        Process whose output is not a pipe
+    """
+    pid = 1
+
+    def __init__(self, text):
+        self.stdout = io.StringIO(text)
+
+
+class SupervisorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.supervisor = Supervisor(poll=0.01)
+
+    def tearDown(self):
+        self.supervisor.stop()
+
+    def test_matches_are_found(self):
+        process = self.supervisor.watch(child(
+            'print("noise"); print("[12] forked"); print("[13] forked")'))
+        self.assertEqual(self.supervisor.wait_for(process, FORKED, 2, 5.0),
+                         ['[12] forked', '[13] forked'])
+
+    def test_exited_child_is_reaped(self):
+        process = self.supervisor.watch(child('print("bye")'))
+        deadline = time.time() + 5.0
+        while process.returncode is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(process.returncode, 0)
+
+    def test_end_of_output_raises(self):
+        process = self.supervisor.watch(child('print("[12] forked")'))
+        self.assertRaises(OSError, self.supervisor.wait_for, process, FORKED,
+                          2, 5.0)
+
+    def test_output_that_ended_before_the_wait_raises(self):
+        process = self.supervisor.watch(child('pass'))
+        process.wait()
+        time.sleep(0.2)
+        self.assertRaises(OSError, self.supervisor.wait_for, process, FORKED,
+                          1, None)
+
+    def test_timeout(self):
+        process = self.supervisor.watch(child('import time; time.sleep(5)'))
+        try:
+            start = time.time()
+            self.assertRaises(OSError, self.supervisor.wait_for, process,
+                              FORKED, 1, 0.2)
+            self.assertTrue(time.time() - start < 2.0)
+        finally:
+            process.kill()
+            process.wait()
+
+    def test_stand_in_output_end_raises(self):
+        self.assertEqual(self.supervisor.wait_for(
+            StandIn(u'[12] forked\n'), FORKED, 1, 1.0), ['[12] forked'])
+        self.assertRaises(OSError, self.supervisor.wait_for,
+                          StandIn(u'[12] forked\n'), FORKED, 2, 1.0)
+
+    def test_exit_of_a_pid_is_noticed(self):
+        process = child('pass')
+        exited = threading.Event()
+        self.supervisor.watch_pid(process.pid, lambda pid: exited.set())
+        process.wait()
+        self.assertTrue(exited.wait(5.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
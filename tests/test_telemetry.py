@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+from telemetry import Telemetry
+
+
+def write(path, value):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as output:
+        output.write(value)
+
+
+class TelemetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cpu_root = os.path.join(self.root, 'cpu')
+        self.thermal_root = os.path.join(self.root, 'thermal')
+        for cpu in (0, 1):
+            write(os.path.join(self.cpu_root, 'cpu{0}'.format(cpu),
+                               'cpufreq', 'scaling_cur_freq'), '3000000')
+        write(os.path.join(self.thermal_root, 'thermal_zone0', 'type'),
+              'x86_pkg_temp')
+        write(os.path.join(self.thermal_root, 'thermal_zone0', 'temp'),
+              '55000')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def telemetry(self):
+        return Telemetry(cpu_root=self.cpu_root,
+                         thermal_root=self.thermal_root,
+                         pressure_root=os.path.join(self.root, 'pressure'))
+
+    def set_frequency(self, frequency):
+        for cpu in (0, 1):
+            write(os.path.join(self.cpu_root, 'cpu{0}'.format(cpu),
+                               'cpufreq', 'scaling_cur_freq'),
+                  str(frequency))
+
+    def test_paths_are_found_once(self):
+        telemetry = self.telemetry()
+        write(os.path.join(self.cpu_root, 'cpu2', 'cpufreq',
+                           'scaling_cur_freq'), '3000000')
+        sample = telemetry.sample(0.0, 50.0, 50.0, 1)
+        self.assertEqual(sample.frequencies, {0: 3000000, 1: 3000000})
+        self.assertEqual(sample.temperatures, {'x86_pkg_temp': 55.0})
+        self.assertEqual(sample.throttles, 0)
+
+    def test_governor_slowing_down_is_not_throttling(self):
+        telemetry = self.telemetry()
+        telemetry.sample(0.0, 100.0, 100.0, 2)
+        self.set_frequency(1200000)
+        telemetry.sample(1.0, 20.0, 20.0, 2)
+        telemetry.sample(2.0, 20.0, 20.0, 1)
+        self.assertEqual(telemetry.throttle_start(), None)
+
+    def test_slowing_down_at_the_same_demand_is_throttling(self):
+        telemetry = self.telemetry()
+        telemetry.sample(0.0, 100.0, 100.0, 2)
+        telemetry.sample(1.0, 100.0, 98.0, 2)
+        self.set_frequency(2000000)
+        start = telemetry.sample(2.0, 100.0, 99.0, 2)
+        self.assertEqual(telemetry.throttle_start(), start)
+        self.assertIn('Throttling started 2.0 s', telemetry.summary())
+
+    def test_counters_decide_where_the_cpus_count(self):
+        counter = os.path.join(self.cpu_root, 'cpu0', 'thermal_throttle',
+                               'core_throttle_count')
+        write(counter, '3')
+        telemetry = self.telemetry()
+        telemetry.sample(0.0, 100.0, 100.0, 2)
+        self.set_frequency(1000000)
+        telemetry.sample(1.0, 100.0, 100.0, 2)
+        self.assertEqual(telemetry.throttle_start(), None)
+        write(counter, '4')
+        start = telemetry.sample(2.0, 100.0, 100.0, 2)
+        self.assertEqual(start.throttles, 4)
+        self.assertEqual(telemetry.throttle_start(), start)
+
+
+if __name__ == '__main__':
+    unittest.main()
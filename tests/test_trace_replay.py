@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from trace_replay import TracePoint, TraceProfile, TraceWriter, read_trace
+
+
+class TraceFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_csv(self, text):
+        with open(self.path, 'w') as trace:
+            trace.write(text)
+
+    def test_csv(self):
+        self.write_csv('timestamp,load,core0,core1\n'
+                       '# recorded on host a\n'
+                       '100.0,40.5,30,51\n'
+                       '101.0, 60  # spike\n'
+                       '102.0\n')
+        self.assertEqual(list(read_trace(self.path)),
+                         [TracePoint(100.0, 40.5, (30.0, 51.0)),
+                          TracePoint(101.0, 60.0, ())])
+
+    def test_binary(self):
+        writer = TraceWriter(self.path, cores=2)
+        writer.write(100.0, 40.5, (30.0, 51.0, 99.0))
+        writer.write(100.5, 60.0, (70.0,))
+        writer.close()
+        points = list(read_trace(self.path))
+        self.assertEqual([(x.timestamp, x.load) for x in points],
+                         [(100.0, 40.5), (100.5, 60.0)])
+        self.assertEqual([x.per_core for x in points],
+                         [(30.0, 51.0), (70.0, 0.0)])
+
+    def test_binary_of_another_version(self):
+        with open(self.path, 'wb') as trace:
+            trace.write(b'SATR\x02\x00\x00\x00')
+        self.assertRaises(ValueError, list, read_trace(self.path))
+
+    def test_profile_from_file(self):
+        self.write_csv('5 20 10 30\n6 40 50 30\n')
+        profile = TraceProfile.from_file(self.path)
+        self.assertEqual(profile.cores, 2)
+        self.assertEqual(profile.core_setpoint(1.5, 0), 50.0)
+
+    def test_empty_trace(self):
+        self.write_csv('timestamp,load\n')
+        self.assertRaises(ValueError, TraceProfile.from_file, self.path)
+
+
+class ReplayTest(unittest.TestCase):
+
+    points = [TracePoint(100.0, 10.0, ()), TracePoint(102.0, 120.0, ()),
+              TracePoint(104.0, 30.0, ())]
+
+    def test_points_are_held_until_the_next(self):
+        profile = TraceProfile(self.points)
+        self.assertEqual([profile.setpoint(x) for x in (0, 1.9, 2, 3, 5)],
+                         [10.0, 10.0, 100.0, 100.0, 30.0])
+        self.assertFalse(profile.finished(4))
+        self.assertTrue(profile.finished(4.1))
+
+    def test_speed_scales_the_time(self):
+        profile = TraceProfile(self.points, speed=2.0)
+        self.assertEqual([profile.setpoint(x) for x in (0, 0.9, 1, 2)],
+                         [10.0, 10.0, 100.0, 30.0])
+        self.assertTrue(profile.finished(2.1))
+        slow = TraceProfile(self.points, speed=0.5)
+        self.assertEqual(slow.setpoint(3.9), 10.0)
+        self.assertEqual(slow.setpoint(4), 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
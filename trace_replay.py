@@ -0,0 +1,177 @@
+import collections
+import struct
+from profiles import Profile, clamp_load, PERCENT
+
+TracePoint = collections.namedtuple('TracePoint',
+                                    ('timestamp', 'load', 'per_core'))
+
+BINARY_MAGIC = b'SATR'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHH')
+
+
+def record_struct(cores):
+    """
+    Binary record: double timestamp, float total load, float per core
+    :param cores: int
+    :return: struct.Struct
+    """
+    return struct.Struct('<df' + 'f' * cores)
+
+
+def read_csv_trace(path):
+    """
+    Stream a 'timestamp,load[,core0,core1..]' csv, lines that do not
+    parse (a header) and # comments are skipped
+    :param path: str
+    :return: generator of TracePoint
+    """
+    with open(path) as trace:
+        for line in trace:
+            fields = line.split('#', 1)[0].replace(',', ' ').split()
+            try:
+                values = [float(x) for x in fields]
+            except ValueError:
+                continue
+            if len(values) >= 2:
+                yield TracePoint(values[0], values[1], tuple(values[2:]))
+
+
+def read_binary_trace(path):
+    """
+    Stream a binary trace written by TraceWriter
+    :param path: str
+    :return: generator of TracePoint
+    :raise ValueError: not a binary trace
+    """
+    with open(path, 'rb') as trace:
+        magic, version, cores = BINARY_HEADER.unpack(
+            trace.read(BINARY_HEADER.size))
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError('{0} is not a StressAuto trace'.format(path))
+        record = record_struct(cores)
+        while True:
+            chunk = trace.read(record.size)
+            if len(chunk) < record.size:
+                break
+            values = record.unpack(chunk)
+            yield TracePoint(values[0], values[1], values[2:])
+
+
+def is_binary_trace(path):
+    """
+    :param path: str
+    :return: bool
+    """
+    with open(path, 'rb') as trace:
+        return trace.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def read_trace(path):
+    """
+    :param path: str csv or binary trace
+    :return: generator of TracePoint
+    """
+    if is_binary_trace(path):
+        return read_binary_trace(path)
+    return read_csv_trace(path)
+
+
+class TraceWriter(object):
+    """
+        Streams trace points into the binary trace format
+    """
+
+    def __init__(self, path, cores=0):
+        """
+        :param path: str
+        :param cores: int per core loads of every point
+        """
+        self.cores = cores
+        self.record = record_struct(cores)
+        self.trace = open(path, 'wb')
+        self.trace.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION,
+                                            cores))
+
+    def write(self, timestamp, load, per_core=()):
+        """
+        Missing per core loads are written as 0
+        :param timestamp: float
+        :param load: float
+        :param per_core: iterable of float
+        """
+        per_core = tuple(per_core)[:self.cores]
+        per_core += (0.0,) * (self.cores - len(per_core))
+        self.trace.write(self.record.pack(timestamp, load, *per_core))
+
+    def close(self):
+        self.trace.close()
+
+
+class TraceProfile(Profile):
+    """
+        Replays a trace as a profile, reading it as a stream, so only the
+        current and the next point are ever held in memory
+        The elapsed time may only move forward
+    """
+    # traces are recorded cpu loads
+    limits = PERCENT
+
+    def __init__(self, points, speed=1.0):
+        """
+        :param points: iterable of TracePoint
+        :param speed: float, 2 replays twice as fast as recorded
+        :raise ValueError: empty trace
+        """
+        self.points = iter(points)
+        self.current = next(self.points, None)
+        if self.current is None:
+            raise ValueError('Trace has no points!')
+        self.next = next(self.points, None)
+        self.start = self.current.timestamp
+        self.speed = speed
+
+    @classmethod
+    def from_file(cls, path, speed=1.0):
+        """
+        :param path: str csv or binary trace
+        :param speed: float
+        :return: TraceProfile
+        """
+        return cls(read_trace(path), speed=speed)
+
+    @property
+    def cores(self):
+        """
+        Number of per core loads of the trace
+        :return: int
+        """
+        return len(self.current.per_core)
+
+    def advance(self, elapsed):
+        """
+        Move to the point that is current at elapsed seconds of replay
+        :param elapsed: float seconds
+        :return: float trace timestamp
+        """
+        timestamp = self.start + elapsed * self.speed
+        while self.next is not None and self.next.timestamp <= timestamp:
+            self.current, self.next = self.next, next(self.points, None)
+        return timestamp
+
+    def setpoint(self, elapsed):
+        self.advance(elapsed)
+        return clamp_load(self.current.load, self.limits)
+
+    def core_setpoint(self, elapsed, core):
+        """
+        :param elapsed: float seconds
+        :param core: int
+        :return: float
+        """
+        self.advance(elapsed)
+        return clamp_load(self.current.per_core[core], self.limits)
+
+    def finished(self, elapsed):
+        timestamp = self.advance(elapsed)
+        return self.next is None and timestamp > self.current.timestamp